@@ -2,20 +2,21 @@
 import os
 import re
 import json
-import subprocess
 import urllib.parse
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from pathlib import Path
-from youtube_transcript_api import YouTubeTranscriptApi
 import requests
 from dotenv import load_dotenv
-import cv2
-import numpy as np
-from deepface import DeepFace
-import base64
 from io import BytesIO
-from PIL import Image
+from monitor.transcripts import load_transcript, get_transcript_text
+from monitor.retrieval import retrieve_context
+from monitor.singleflight import single_flight, RESULT_SHARE_SECONDS
+from monitor.video_metadata import get_video_duration
+from monitor import jobs
+from monitor import mood
+from monitor import engagement
+from monitor import frame_hints
+from monitor import vision
 
 # Optional docx export for notes
 try:
@@ -46,10 +47,6 @@ CORS(app, resources={
     }
 })
 
-
-TRANSCRIPTS_DIR = Path("./transcripts")
-TRANSCRIPTS_DIR.mkdir(exist_ok=True)
-
 # --- Helper Functions ---
 
 def mistral_chat(prompt, temperature=0.25, max_tokens=400):
@@ -76,83 +73,78 @@ def mistral_chat(prompt, temperature=0.25, max_tokens=400):
         print(f"Mistral call failed: {exc}")
         return ""
 
-def analyze_learner_mood(frame_data):
+def build_mood_result(analysis):
+    """Turn one mood engine result into the engagement response used by the frontend."""
+    emotions = analysis.get('emotion', {})
+    dominant_emotion = analysis.get('dominant_emotion', 'unknown')
+
+    # Calculate engagement score based on emotions
+    engagement_score = calculate_engagement_score(emotions, dominant_emotion)
+
+    # Determine engagement status
+    engagement_status = determine_engagement_status(engagement_score, dominant_emotion)
+
+    # Generate recommendations
+    recommendations = generate_engagement_recommendations(engagement_status, dominant_emotion)
+
+    return {
+        'success': True,
+        'dominant_emotion': dominant_emotion,
+        'emotions': emotions,
+        'engagement_score': engagement_score,
+        'engagement_status': engagement_status,
+        'recommendations': recommendations,
+        'age': analysis.get('age', 'unknown'),
+        'gender': analysis.get('dominant_gender', 'unknown'),
+        'face_detected': analysis.get('face_detected', False),
+        'timestamp': None  # Will be set by caller if needed
+    }
+
+def mood_failure(error):
+    return {
+        'success': False,
+        'error': str(error),
+        'message': 'Could not analyze mood. Please ensure face is visible and well-lit.'
+    }
+
+def analyze_learner_mood(frame_data, actions=('emotion', 'age', 'gender'), hint=None):
     """
     Analyze learner's mood and engagement from webcam frame.
     Returns emotion analysis and engagement status.
     
     Args:
         frame_data: Base64 encoded image or image bytes
+        actions: Mood engine actions to run ('emotion' is always needed)
+        hint: Optional frame_hints.FrameHint; its face crop is analysed directly
     
     Returns:
         dict: Analysis results including emotion, engagement level, and recommendations
     """
     try:
-        # Decode base64 image if necessary
-        if isinstance(frame_data, str):
-            # Remove data URL prefix if present
-            if ',' in frame_data:
-                frame_data = frame_data.split(',')[1]
-            img_bytes = base64.b64decode(frame_data)
-            img = Image.open(BytesIO(img_bytes))
-            img_array = np.array(img)
-        else:
-            img_array = frame_data
-        
-        # Convert RGB to BGR for OpenCV compatibility
-        if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-            frame_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        else:
-            frame_bgr = img_array
-        
-        # Perform emotion analysis using DeepFace
-        analysis = DeepFace.analyze(
-            frame_bgr, 
-            actions=['emotion', 'age', 'gender'],
-            enforce_detection=False,
-            detector_backend='opencv'
-        )
-        
-        # Handle both single face and multiple faces
-        if isinstance(analysis, list):
-            analysis = analysis[0]
-        
-        # Extract emotion data
-        emotions = analysis.get('emotion', {})
-        dominant_emotion = analysis.get('dominant_emotion', 'unknown')
-        age = analysis.get('age', 'unknown')
-        gender = analysis.get('dominant_gender', 'unknown')
-        
-        # Calculate engagement score based on emotions
-        engagement_score = calculate_engagement_score(emotions, dominant_emotion)
-        
-        # Determine engagement status
-        engagement_status = determine_engagement_status(engagement_score, dominant_emotion)
-        
-        # Generate recommendations
-        recommendations = generate_engagement_recommendations(engagement_status, dominant_emotion)
-        
-        result = {
-            'success': True,
-            'dominant_emotion': dominant_emotion,
-            'emotions': emotions,
-            'engagement_score': engagement_score,
-            'engagement_status': engagement_status,
-            'recommendations': recommendations,
-            'age': age,
-            'gender': gender,
-            'timestamp': None  # Will be set by caller if needed
-        }
-        
-        return result
+        analysis = mood.analyze_frame(frame_data, actions, hint)
+        if not analysis.get('success'):
+            print(f"Mood analysis error: {analysis.get('error')}")
+            return mood_failure(analysis.get('error'))
+        return build_mood_result(analysis)
         
     except Exception as e:
         print(f"Mood analysis error: {str(e)}")
-        return {
-            'success': False,
-            'error': str(e),
-            'message': 'Could not analyze mood. Please ensure face is visible and well-lit.'
-        }
+        return mood_failure(e)
+
+def analyze_learner_moods(frames_data, actions=None, hints=None):
+    """
+    Batch version of analyze_learner_mood: faces are detected once per frame and
+    each requested model runs once over all face crops. Returns one result per frame.
+    """
+    actions = mood.normalize_actions(actions)
+    if 'emotion' not in actions:
+        actions = ['emotion'] + actions  # engagement score is built from emotions
+    try:
+        analyses = mood.analyze_frames(frames_data, actions, hints)
+    except Exception as e:
+        print(f"Batch mood analysis error: {str(e)}")
+        return [mood_failure(e) for _ in frames_data]
+    return [build_mood_result(a) if a.get('success') else mood_failure(a.get('error')) for a in analyses]
 
 def calculate_engagement_score(emotions, dominant_emotion):
     """
@@ -260,116 +252,6 @@ def extract_youtube_id(url):
         return parsed.path[1:]
     return None
 
-def get_video_duration(video_id):
-    """Get video duration in seconds using yt-dlp"""
-    try:
-        result = subprocess.run([
-            "yt-dlp",
-            "--print", "duration",
-            f"https://www.youtube.com/watch?v={video_id}"
-        ], capture_output=True, text=True, check=True)
-        
-        duration = float(result.stdout.strip())
-        return int(duration)
-    except Exception as e:
-        print(f"Could not get video duration: {e}")
-        return 3600
-
-def get_transcript_with_timestamps(video_id):
-    """Get transcript with timestamps."""
-    transcript_json_path = TRANSCRIPTS_DIR / f"{video_id}_timestamps.json"
-    
-    if transcript_json_path.exists():
-        with open(transcript_json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    
-    try:
-        transcript_list = None
-
-        if hasattr(YouTubeTranscriptApi, "get_transcript"):
-            try:
-                transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
-            except Exception as inner:
-                print(f"YouTubeTranscriptApi.get_transcript failed: {inner}")
-
-        if transcript_list is None and hasattr(YouTubeTranscriptApi, "list_transcripts"):
-            try:
-                transcript_list = YouTubeTranscriptApi.list_transcripts(video_id).find_transcript(['en']).fetch()
-            except Exception as inner:
-                print(f"YouTubeTranscriptApi.list_transcripts failed: {inner}")
-
-        # Fallback to yt-dlp if YouTubeTranscriptApi is unavailable
-        if transcript_list is None:
-            print(f"Falling back to yt-dlp for {video_id}...")
-            try:
-                subprocess.run([
-                    "yt-dlp", "--write-auto-subs", "--sub-lang", "en", "--skip-download",
-                    "-o", str(TRANSCRIPTS_DIR / f"{video_id}"),
-                    f"https://www.youtube.com/watch?v={video_id}"
-                ], check=True, capture_output=True, text=True, timeout=60)
-                
-                vtt_files = list(TRANSCRIPTS_DIR.glob(f"{video_id}*.vtt"))
-                if vtt_files:
-                    vtt_file = vtt_files[0]
-                    lines = vtt_file.read_text(encoding="utf-8").splitlines()
-                    transcript_list = [
-                        {"text": line, "start": 0, "duration": 0}
-                        for line in lines
-                        if line.strip() and "-->" not in line and not line.strip().isdigit() and "WEBVTT" not in line and not line.startswith("NOTE")
-                    ]
-                    vtt_file.unlink()
-            except Exception as fallback_err:
-                print(f"yt-dlp fallback failed: {fallback_err}")
-
-        if transcript_list is None:
-            print(f"No transcript available for {video_id}; using mock")
-            return [{"text": f"Content for video {video_id}", "start": 0, "duration": 0}]
-
-        with open(transcript_json_path, 'w', encoding='utf-8') as f:
-            json.dump(transcript_list, f)
-        return transcript_list
-    except Exception as e:
-        print(f"get_transcript_with_timestamps failed: {e}")
-        return [{"text": f"Content for video {video_id}", "start": 0, "duration": 0}]
-
-def get_transcript_text(video_id):
-    """Get plain text transcript (fallback)"""
-    transcript_path = TRANSCRIPTS_DIR / f"{video_id}.txt"
-    
-    if transcript_path.exists():
-        return transcript_path.read_text(encoding="utf-8")
-
-    try:
-        subprocess.run([
-            "yt-dlp",
-            "--write-auto-subs",
-            "--sub-lang", "en",
-            "--skip-download",
-            "-o", str(TRANSCRIPTS_DIR / f"{video_id}"),
-            f"https://www.youtube.com/watch?v={video_id}"
-        ], check=True, capture_output=True, text=True)
-
-        vtt_files = list(TRANSCRIPTS_DIR.glob(f"{video_id}*.vtt"))
-        if vtt_files:
-            vtt_file = vtt_files[0]
-            lines = vtt_file.read_text(encoding="utf-8").splitlines()
-            full_text = " ".join(
-                re.sub(r'<[^>]+>', '', line) 
-                for line in lines 
-                if line.strip() 
-                and "-->" not in line 
-                and not line.strip().isdigit() 
-                and "WEBVTT" not in line
-                and not line.startswith("NOTE")
-            )
-            transcript_path.write_text(full_text, encoding="utf-8")
-            vtt_file.unlink()
-            return full_text
-    except Exception as e:
-        print(f"yt-dlp failed: {e}")
-    
-    raise Exception("Could not fetch transcript")
-
 def generate_course_overview(full_transcript_text, course_title):
     """Generate 2-4 line overview of the entire course."""
     try:
@@ -435,8 +317,8 @@ def extract_key_points(module_text):
         sentences = [s.strip() for s in module_text.split('.') if 30 < len(s.strip()) < 150]
         return sentences[:5] if sentences else ["Understanding core concepts", "Practical implementation", "Best practices", "Common pitfalls", "Next steps"]
 
-def split_transcript_with_timestamps(transcript_list, daily_study_minutes, video_duration, course_title):
-    """Split transcript into modules with time-based AI summaries."""
+def split_transcript_with_timestamps(transcript, daily_study_minutes, video_duration, course_title):
+    """Split a `Transcript` into modules with time-based AI summaries."""
     # 85% for video, 15% for quiz (applies to any daily study time)
     VIDEO_TIME_RATIO = 0.85
     QUIZ_TIME_RATIO = 0.15
@@ -455,8 +337,7 @@ def split_transcript_with_timestamps(transcript_list, daily_study_minutes, video
     print(f"     Quiz time: {quiz_seconds/3600:.2f} hours (15%)")
     
     # Generate course overview from full transcript
-    full_text = " ".join(seg['text'] for seg in transcript_list)
-    course_overview = generate_course_overview(full_text, course_title)
+    course_overview = generate_course_overview(transcript.text, course_title)
     print(f"\n✓ Course Overview: {course_overview[:100]}...")
     
     modules = []
@@ -466,12 +347,7 @@ def split_transcript_with_timestamps(transcript_list, daily_study_minutes, video
         end_time = int(min((module_idx + 1) * seconds_per_module, video_duration))
         
         # Get transcript segments for this time range
-        module_segments = [
-            seg for seg in transcript_list 
-            if start_time <= seg['start'] < end_time
-        ]
-        
-        module_text = " ".join(seg['text'] for seg in module_segments)
+        module_text = transcript.text_between(start_time, end_time)
         
         print(f"\n  📝 Module {module_idx + 1}: {start_time}s - {end_time}s")
         print(f"     Generating time-based summary...")
@@ -620,64 +496,79 @@ Return ONLY valid JSON (no markdown):
                 }]
 
 
-# Lightweight face detector for attention tracking
-_FACE_DETECTOR = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+def analyze_frame_basic(frame):
+    """Return simple attention metrics from a single webcam frame (base64 or BGR array)."""
+    frame, results = vision.analyze(frame, vision.PROFILES['attention'])
+    return vision.attention_report(frame, results)
+
+def build_course_plan(video_id, course_title, daily_hours, job=None):
+    """Run the full plan pipeline (duration, transcript, AI summaries) for one video."""
+    if job:
+        job.progress(0.05, "Looking up video")
+    video_duration = get_video_duration(video_id)
+    print(f"✓ Video duration: {video_duration}s ({video_duration/60:.1f} minutes)")
+
+    if job:
+        job.progress(0.15, "Fetching transcript")
+    transcript_with_timestamps = load_transcript(video_id)
+
+    if job:
+        job.progress(0.3, "Generating modules")
+    if transcript_with_timestamps:
+        print(f"✓ Got transcript with timestamps: {len(transcript_with_timestamps)} segments")
+        daily_plan, course_overview = split_transcript_with_timestamps(
+            transcript_with_timestamps, 
+            daily_hours * 60,
+            video_duration,
+            course_title
+        )
+    else:
+        print("⚠ Using word-based splitting")
+        transcript_text = get_transcript_text(video_id)
+        print(f"✓ Got transcript: {len(transcript_text.split())} words")
+        daily_plan, course_overview = split_transcript_without_timestamps(
+            transcript_text,
+            daily_hours * 60,
+            video_duration,
+            course_title
+        )
 
-
-def decode_image_b64(image_b64):
-    """Decode a base64 image (data URI allowed) into a BGR numpy array."""
-    try:
-        if not isinstance(image_b64, str):
-            return None
-        if image_b64.startswith('data:'):
-            image_b64 = image_b64.split(',', 1)[1]
-        raw = base64.b64decode(image_b64)
-        np_arr = np.frombuffer(raw, dtype=np.uint8)
-        return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-    except Exception:
-        return None
-
-
-def analyze_frame_basic(img_bgr):
-    """Return simple attention metrics from a single webcam frame."""
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    faces = _FACE_DETECTOR.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5, minSize=(60, 60))
-
-    face_present = len(faces) > 0
-    faces_count = int(len(faces))
-    center_offset = 1.0
-
-    if face_present:
-        x, y, fw, fh = max(faces, key=lambda f: f[2] * f[3])
-        face_cx = x + fw / 2.0
-        face_cy = y + fh / 2.0
-        img_cx = img_bgr.shape[1] / 2.0
-        img_cy = img_bgr.shape[0] / 2.0
-        dx = abs(face_cx - img_cx) / (img_bgr.shape[1] / 2.0)
-        dy = abs(face_cy - img_cy) / (img_bgr.shape[0] / 2.0)
-        center_offset = min(1.0, float(np.hypot(dx, dy)))
-
-    blur_var = float(cv2.Laplacian(gray, cv2.CV_64F).var())
-    brightness = float(gray.mean())
-
-    attention_score = max(0.0, 1.0 - center_offset) if face_present else 0.0
-    distracted = (not face_present) or center_offset > 0.35
-    bored = face_present and (not distracted) and blur_var < 30.0
+    print(f"\n✓ Created {len(daily_plan)} modules\n")
 
     return {
-        "face_present": bool(face_present),
-        "multiple_faces": faces_count > 1,
-        "attention_score": round(attention_score, 3),
-        "distracted": bool(distracted),
-        "bored": bool(bored),
-        "metrics": {
-            "faces_count": faces_count,
-            "center_offset": round(center_offset, 3),
-            "blur_var": round(blur_var, 3),
-            "brightness": round(brightness, 3)
-        }
+        "courseTitle": course_title,
+        "courseDescription": course_overview,
+        "videoID": video_id,
+        "dailyPlan": daily_plan,
+        "streak": 0,
+        "progress": 0
     }
 
+
+def generate_plan_job(payload, job):
+    """Background job handler for /generate-plan (see monitor.jobs)."""
+    video_id = payload["video_id"]
+    course_title = payload["course_title"]
+    daily_hours = payload["daily_hours"]
+    # Students opening the same course link at once share one pipeline run
+    return single_flight(
+        f"generate-plan:{video_id}:{daily_hours}:{course_title}",
+        lambda: build_course_plan(video_id, course_title, daily_hours, job),
+        share_seconds=RESULT_SHARE_SECONDS,
+    )
+
+
+def job_response(job_id):
+    """202 response pointing the client at the job status endpoint."""
+    response = jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}"
+    })
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response, 202
+
 # --- Routes ---
 
 @app.route("/generate-plan", methods=["POST", "OPTIONS"])
@@ -700,53 +591,18 @@ def generate_plan():
             return jsonify({"error": "Invalid YouTube link"}), 400
 
         print(f"\n{'='*60}")
-        print(f"📚 Processing: {course_title}")
+        print(f"📚 Queueing plan: {course_title}")
         print(f"🎥 Video ID: {video_id}")
         print(f"⏱️  Daily study time: {daily_hours} hours")
-        print(f"   ├─ Video watching: {daily_hours * 0.85:.2f} hours (85%)")
-        print(f"   └─ Quiz time: {daily_hours * 0.15:.2f} hours (15%)")
         print(f"{'='*60}\n")
-        
-        video_duration = get_video_duration(video_id)
-        print(f"✓ Video duration: {video_duration}s ({video_duration/60:.1f} minutes)")
-        
-        transcript_with_timestamps = get_transcript_with_timestamps(video_id)
-        
-        if transcript_with_timestamps:
-            print(f"✓ Got transcript with timestamps: {len(transcript_with_timestamps)} segments")
-            daily_plan, course_overview = split_transcript_with_timestamps(
-                transcript_with_timestamps, 
-                daily_hours * 60,
-                video_duration,
-                course_title
-            )
-        else:
-            print("⚠ Using word-based splitting")
-            transcript_text = get_transcript_text(video_id)
-            print(f"✓ Got transcript: {len(transcript_text.split())} words")
-            daily_plan, course_overview = split_transcript_without_timestamps(
-                transcript_text,
-                daily_hours * 60,
-                video_duration,
-                course_title
-            )
-
-        print(f"\n✓ Created {len(daily_plan)} modules\n")
-
-        response_data = {
-            "courseTitle": course_title,
-            "courseDescription": course_overview,
-            "videoID": video_id,
-            "dailyPlan": daily_plan,
-            "streak": 0,
-            "progress": 0
-        }
-        
-        print(f"✅ Plan generated successfully!\n")
-        
-        response = jsonify(response_data)
-        response.headers.add("Access-Control-Allow-Origin", "*")
-        return response
+
+        # The pipeline takes minutes; run it on a job worker and let the client poll
+        job_id = jobs.submit(
+            "flask.generate_plan",
+            {"video_id": video_id, "course_title": course_title, "daily_hours": daily_hours},
+            dedupe_key=f"generate-plan:{video_id}:{daily_hours}:{course_title}",
+        )
+        return job_response(job_id)
         
     except Exception as e:
         print(f"\n❌ Error: {str(e)}")
@@ -756,6 +612,35 @@ def generate_plan():
         response.headers.add("Access-Control-Allow-Origin", "*")
         return response, 500
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+    status = jobs.job_status(job_id)
+    if status is None:
+        response = jsonify({"error": "Job not found"})
+        response.headers.add("Access-Control-Allow-Origin", "*")
+        return response, 404
+    response = jsonify(status)
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST", "OPTIONS"])
+def cancel_job(job_id):
+    if request.method == "OPTIONS":
+        response = jsonify({"status": "ok"})
+        response.headers.add("Access-Control-Allow-Origin", "*")
+        response.headers.add("Access-Control-Allow-Headers", "Content-Type")
+        response.headers.add("Access-Control-Allow-Methods", "POST, OPTIONS")
+        return response
+
+    status = jobs.cancel(job_id)
+    if status is None:
+        response = jsonify({"error": "Job not found"})
+        response.headers.add("Access-Control-Allow-Origin", "*")
+        return response, 404
+    response = jsonify({"job_id": job_id, "status": status})
+    response.headers.add("Access-Control-Allow-Origin", "*")
+    return response
+
 @app.route("/generate-quiz", methods=["POST", "OPTIONS"])
 def generate_quiz_route():
     if request.method == "OPTIONS":
@@ -830,21 +715,11 @@ def ask_question():
         if not question or not video_id:
             return jsonify({"error": "Missing question or videoId"}), 400
 
-        transcript_list = get_transcript_with_timestamps(video_id)
-        if transcript_list:
-            full_transcript = " ".join(entry['text'] for entry in transcript_list)
+        transcript = load_transcript(video_id)
+        if transcript:
+            context_text = retrieve_context(video_id, question, current_time=current_time, k=4)
         else:
             full_transcript = get_transcript_text(video_id)
-
-        if transcript_list:
-            context_start = max(0, current_time - 120)
-            context_end = current_time + 120
-            context_entries = [
-                entry for entry in transcript_list
-                if context_start <= entry['start'] <= context_end
-            ]
-            context_text = " ".join(entry['text'] for entry in context_entries)
-        else:
             video_duration = get_video_duration(video_id)
             chars_per_second = len(full_transcript) / max(video_duration, 1)
             context_start = max(0, int((current_time - 120) * chars_per_second))
@@ -894,11 +769,15 @@ def analyze_face_basic():
         if not frame_b64:
             return jsonify({"error": "No frame provided"}), 400
 
-        img = decode_image_b64(frame_b64)
-        if img is None:
+        try:
+            result = analyze_frame_basic(frame_b64)
+        except vision.VisionError:
             return jsonify({"error": "Invalid frame data"}), 400
-
-        result = analyze_frame_basic(img)
+        except vision.VisionUnavailable as e:
+            response = jsonify({"error": f"Face detection is unavailable on this server: {e}"})
+            response.headers.add("Access-Control-Allow-Origin", "*")
+            return response, 503
+        engagement.record_for_request(data, 'attention', [(None, result['attention_score'] * 100, None)])
         response = jsonify(result)
         response.headers.add("Access-Control-Allow-Origin", "*")
         return response
@@ -1083,33 +962,20 @@ def detect_faces():
         timestamp = data.get('timestamp', None)
         exam_id = data.get('exam_id', None)
         
-        # Decode base64 image
-        if isinstance(image_data, str):
-            # Remove data URL prefix if present
-            if ',' in image_data:
-                image_data = image_data.split(',')[1]
-            img_bytes = base64.b64decode(image_data)
-            img = Image.open(BytesIO(img_bytes))
-            img_array = np.array(img)
-        else:
-            img_array = image_data
-        
-        # Convert RGB to BGR for OpenCV compatibility
-        if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-            frame_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        else:
-            frame_bgr = img_array
+        # Decode once; the frame (and its face boxes) are shared with the other vision endpoints
+        try:
+            frame = vision.load_frame(image_data)
+        except vision.VisionError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
         
-        # Detect faces using DeepFace
+        # Detect faces
         try:
-            faces = DeepFace.extract_faces(
-                frame_bgr,
-                detector_backend='opencv',
-                enforce_detection=False,
-                align=True
-            )
+            faces = vision.analyze(frame, vision.PROFILES['presence'])[1]['faces']['boxes']
             
-            face_count = len(faces) if faces else 0
+            face_count = len(faces)
             
             # Determine status
             if face_count == 0:
@@ -1141,6 +1007,16 @@ def detect_faces():
             response.headers.add("Access-Control-Allow-Origin", "*")
             return response
             
+        except vision.VisionUnavailable as e:
+            # No detector on this server: don't report it as "no face"
+            print(f"Face detection unavailable: {e}")
+            response = jsonify({
+                "success": False,
+                "error": str(e),
+                "message": "Face detection is unavailable on this server"
+            })
+            response.headers.add("Access-Control-Allow-Origin", "*")
+            return response, 503
         except Exception as face_error:
             print(f"Face detection error: {str(face_error)}")
             # If detection fails, assume no face detected
@@ -1185,7 +1061,8 @@ def analyze_mood():
     try:
         data = request.get_json()
         
-        if not data or 'image' not in data:
+        # Either a frame, or a client-side face crop (face_crop / face_box, see monitor/frame_hints.py)
+        if not data or not (data.get('image') or data.get('face_crop')):
             return jsonify({
                 "success": False,
                 "error": "No image data provided"
@@ -1193,14 +1070,16 @@ def analyze_mood():
         
         image_data = data.get('image')
         timestamp = data.get('timestamp', None)
+        hint = frame_hints.read_hint(data)
         
         print(f"📸 Analyzing learner mood at timestamp: {timestamp}")
         
         # Analyze mood
-        result = analyze_learner_mood(image_data)
+        result = analyze_learner_mood(image_data, hint=hint)
         
         if result.get('success'):
             result['timestamp'] = timestamp
+            engagement.record_for_request(data, 'engagement', [(None, result['engagement_score'], result['dominant_emotion'])])
             print(f"✓ Emotion: {result['dominant_emotion']}, Status: {result['engagement_status']}, Score: {result['engagement_score']}")
         else:
             print(f"❌ Analysis failed: {result.get('error')}")
@@ -1224,7 +1103,8 @@ def analyze_mood():
 def batch_analyze_mood():
     """
     Endpoint to analyze multiple frames for engagement tracking over time.
-    Expects JSON with 'frames' array containing objects with 'image' and 'timestamp'.
+    Expects JSON with 'frames' array containing objects with 'image' and 'timestamp',
+    and optionally 'actions' (default ['emotion']; 'age' and 'gender' cost extra models).
     """
     if request.method == "OPTIONS":
         response = jsonify({"status": "ok"})
@@ -1250,26 +1130,41 @@ def batch_analyze_mood():
                 "error": "Empty frames array"
             }), 400
         
-        print(f"📸 Analyzing {len(frames)} frames for mood tracking")
+        try:
+            actions = mood.normalize_actions(data.get('actions'))
+        except mood.MoodError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        print(f"📸 Analyzing {len(frames)} frames for mood tracking (actions: {', '.join(actions)})")
         
         results = []
         engagement_timeline = []
         
-        for idx, frame_data in enumerate(frames):
-            image = frame_data.get('image')
-            timestamp = frame_data.get('timestamp', idx)
-            
-            if image:
-                analysis = analyze_learner_mood(image)
-                if analysis.get('success'):
-                    analysis['timestamp'] = timestamp
-                    results.append(analysis)
-                    engagement_timeline.append({
-                        'timestamp': timestamp,
-                        'score': analysis['engagement_score'],
-                        'status': analysis['engagement_status'],
-                        'emotion': analysis['dominant_emotion']
-                    })
+        # Keep frame order and timestamps; frames without an image or face crop are skipped
+        batch = [
+            (frame_data.get('timestamp', idx), frame_data.get('image'), frame_hints.read_hint(frame_data))
+            for idx, frame_data in enumerate(frames)
+            if frame_data.get('image') or frame_data.get('face_crop')
+        ]
+        analyses = analyze_learner_moods(
+            [image for _, image, _ in batch], actions, [hint for _, _, hint in batch]
+        )
+        
+        for (timestamp, _, _), analysis in zip(batch, analyses):
+            if analysis.get('success'):
+                analysis['timestamp'] = timestamp
+                results.append(analysis)
+                engagement_timeline.append({
+                    'timestamp': timestamp,
+                    'score': analysis['engagement_score'],
+                    'status': analysis['engagement_status'],
+                    'emotion': analysis['dominant_emotion']
+                })
+        
+        engagement.record_for_request(data, 'engagement', [(None, r['engagement_score'], r['dominant_emotion']) for r in results])
         
         # Calculate overall statistics
         if results:
@@ -1319,5 +1214,6 @@ if __name__ == "__main__":
     print("="*60)
     print(f"Mistral Model: {MISTRAL_MODEL}")
     print(f"Server: http://127.0.0.1:5000")
+    print(f"Job queue: {jobs.JOBS_DB_PATH} (process with: python manage.py run_jobs)")
     print("="*60 + "\n")
     app.run(debug=True, host='127.0.0.1', port=5000)
\ No newline at end of file
@@ -2,7 +2,6 @@
 import os
 import re
 import json
-import subprocess
 import urllib.parse
 import datetime
 from pathlib import Path
@@ -10,18 +9,27 @@ from django.shortcuts import render
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from youtube_transcript_api import YouTubeTranscriptApi
 import requests
 from dotenv import load_dotenv
-import base64
-import numpy as np
-import cv2
 from io import BytesIO
 try:
     from docx import Document
 except Exception:
     Document = None
 
+from monitor.transcripts import (
+    TRANSCRIPTS_DIR,
+    load_transcript,
+    get_transcript_text,
+    get_segment_transcript,
+)
+from monitor.retrieval import retrieve_context
+from monitor.singleflight import single_flight, RESULT_SHARE_SECONDS
+from monitor.video_metadata import get_video_duration
+from monitor import jobs
+from monitor import engagement
+from monitor import vision
+
 # Load environment variables
 load_dotenv()
 
@@ -38,9 +46,6 @@ print(f"✓ Loaded Mistral Key: {MISTRAL_API_KEY[:10]}...")
 # Paths
 BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
 SPARKLESS_ROOT = BASE_DIR.parent.parent  # Go up to d:\sparkless 1
-TRANSCRIPTS_DIR = BASE_DIR / "transcripts"
-TRANSCRIPTS_DIR.mkdir(exist_ok=True)
-
 AUDIO_DIR = BASE_DIR / "audio"
 AUDIO_DIR.mkdir(exist_ok=True)
 
@@ -82,116 +87,6 @@ def extract_youtube_id(url):
         return parsed.path[1:]
     return None
 
-def get_video_duration(video_id):
-    """Get video duration in seconds using yt-dlp"""
-    try:
-        result = subprocess.run([
-            "yt-dlp",
-            "--print", "duration",
-            f"https://www.youtube.com/watch?v={video_id}"
-        ], capture_output=True, text=True, check=True)
-        
-        duration = float(result.stdout.strip())
-        return int(duration)
-    except Exception as e:
-        print(f"Could not get video duration: {e}")
-        return 3600
-
-def get_transcript_with_timestamps(video_id):
-    """Get transcript with timestamps."""
-    transcript_json_path = TRANSCRIPTS_DIR / f"{video_id}_timestamps.json"
-    
-    if transcript_json_path.exists():
-        with open(transcript_json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    
-    try:
-        transcript_list = None
-
-        if hasattr(YouTubeTranscriptApi, "get_transcript"):
-            try:
-                transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
-            except Exception as inner:
-                print(f"YouTubeTranscriptApi.get_transcript failed: {inner}")
-
-        if transcript_list is None and hasattr(YouTubeTranscriptApi, "list_transcripts"):
-            try:
-                transcript_list = YouTubeTranscriptApi.list_transcripts(video_id).find_transcript(['en']).fetch()
-            except Exception as inner:
-                print(f"YouTubeTranscriptApi.list_transcripts failed: {inner}")
-
-        # Fallback to yt-dlp if YouTubeTranscriptApi is unavailable
-        if transcript_list is None:
-            print(f"Falling back to yt-dlp for {video_id}...")
-            try:
-                subprocess.run([
-                    "yt-dlp", "--write-auto-subs", "--sub-lang", "en", "--skip-download",
-                    "-o", str(TRANSCRIPTS_DIR / f"{video_id}"),
-                    f"https://www.youtube.com/watch?v={video_id}"
-                ], check=True, capture_output=True, text=True, timeout=60)
-                
-                vtt_files = list(TRANSCRIPTS_DIR.glob(f"{video_id}*.vtt"))
-                if vtt_files:
-                    vtt_file = vtt_files[0]
-                    lines = vtt_file.read_text(encoding="utf-8").splitlines()
-                    transcript_list = [
-                        {"text": line, "start": 0, "duration": 0}
-                        for line in lines
-                        if line.strip() and "-->" not in line and not line.strip().isdigit() and "WEBVTT" not in line and not line.startswith("NOTE")
-                    ]
-                    vtt_file.unlink()
-            except Exception as fallback_err:
-                print(f"yt-dlp fallback failed: {fallback_err}")
-
-        if transcript_list is None:
-            print(f"No transcript available for {video_id}; using mock")
-            return [{"text": f"Content for video {video_id}", "start": 0, "duration": 0}]
-
-        with open(transcript_json_path, 'w', encoding='utf-8') as f:
-            json.dump(transcript_list, f)
-        return transcript_list
-    except Exception as e:
-        print(f"get_transcript_with_timestamps failed: {e}")
-        return [{"text": f"Content for video {video_id}", "start": 0, "duration": 0}]
-
-def get_transcript_text(video_id):
-    """Get plain text transcript (fallback)"""
-    transcript_path = TRANSCRIPTS_DIR / f"{video_id}.txt"
-    
-    if transcript_path.exists():
-        return transcript_path.read_text(encoding="utf-8")
-
-    try:
-        subprocess.run([
-            "yt-dlp",
-            "--write-auto-subs",
-            "--sub-lang", "en",
-            "--skip-download",
-            "-o", str(TRANSCRIPTS_DIR / f"{video_id}"),
-            f"https://www.youtube.com/watch?v={video_id}"
-        ], check=True, capture_output=True, text=True)
-
-        vtt_files = list(TRANSCRIPTS_DIR.glob(f"{video_id}*.vtt"))
-        if vtt_files:
-            vtt_file = vtt_files[0]
-            lines = vtt_file.read_text(encoding="utf-8").splitlines()
-            full_text = " ".join(
-                re.sub(r'<[^>]+>', '', line) 
-                for line in lines 
-                if line.strip() 
-                and "-->" not in line 
-                and not line.strip().isdigit() 
-                and "WEBVTT" not in line
-                and not line.startswith("NOTE")
-            )
-            transcript_path.write_text(full_text, encoding="utf-8")
-            vtt_file.unlink()
-            return full_text
-    except Exception as e:
-        print(f"yt-dlp failed: {e}")
-    
-    raise Exception("Could not fetch transcript")
-
 def generate_course_overview(full_transcript_text, course_title):
     """Generate 2-4 line overview of the entire course."""
     try:
@@ -226,19 +121,6 @@ def create_segments(video_id, video_duration):
     
     return segments
 
-def get_segment_transcript(transcript_list, start_time, end_time):
-    """Extract transcript for a specific segment."""
-    if not transcript_list:
-        return ""
-    
-    segment_texts = [
-        entry['text'] 
-        for entry in transcript_list 
-        if start_time <= entry['start'] < end_time
-    ]
-    
-    return " ".join(segment_texts)
-
 def generate_segment_explanation(segment_text, segment_index, course_title):
     """Generate explanation for a segment."""
     try:
@@ -308,10 +190,101 @@ def serve_js(request):
             return HttpResponse(f.read(), content_type='application/javascript')
     return HttpResponse("", status=404, content_type='application/javascript')
 
+def build_course(video_id, course_title, job=None):
+    """Build the segmented course (overview + per-segment explanations) for a video."""
+    # Get video duration
+    if job:
+        job.progress(0.05, "Looking up video")
+    video_duration = get_video_duration(video_id)
+    print(f"   Duration: {video_duration} seconds")
+
+    # Get transcript with timestamps
+    if job:
+        job.progress(0.1, "Fetching transcript")
+    transcript_list = load_transcript(video_id)
+
+    # Get full transcript text
+    if transcript_list:
+        full_transcript = transcript_list.text
+    else:
+        full_transcript = get_transcript_text(video_id)
+
+    # Generate course overview
+    print("   Generating course overview...")
+    if job:
+        job.progress(0.15, "Generating course overview")
+    course_overview = generate_course_overview(full_transcript, course_title)
+
+    # Create segments
+    segments = create_segments(video_id, video_duration)
+    print(f"   Created {len(segments)} segments")
+
+    # Generate explanations for each segment
+    print("   Generating segment explanations...")
+    for done, segment in enumerate(segments):
+        if job:
+            job.progress(0.2 + 0.8 * done / len(segments), f"Explaining segment {done + 1} of {len(segments)}")
+        segment_text = get_segment_transcript(
+            transcript_list, 
+            segment['start'], 
+            segment['end']
+        )
+
+        if not segment_text and full_transcript:
+            chars_per_second = len(full_transcript) / video_duration
+            start_char = int(segment['start'] * chars_per_second)
+            end_char = int(segment['end'] * chars_per_second)
+            segment_text = full_transcript[start_char:end_char]
+
+        explanation = generate_segment_explanation(
+            segment_text, 
+            segment['index'],
+            course_title
+        )
+
+        segment['explanation'] = explanation
+        print(f"      Segment {segment['index']}: ✓")
+
+    return {
+        "success": True,
+        "videoId": video_id,
+        "courseTitle": course_title,
+        "courseOverview": course_overview,
+        "duration": video_duration,
+        "segments": segments,
+        "totalSegments": len(segments)
+    }
+
+
+def process_video_job(payload, job):
+    """Background job handler for api/process (see monitor.jobs)."""
+    video_id = payload["video_id"]
+    course_title = payload["course_title"]
+    # Students opening the same course link at once share one pipeline run
+    result = single_flight(
+        f"process-video:{video_id}:{course_title}",
+        lambda: build_course(video_id, course_title, job),
+        share_seconds=RESULT_SHARE_SECONDS,
+    )
+    print(f"✅ Successfully processed: {course_title}\n")
+    return result
+
+
+def _job_response(job_id):
+    """202 response pointing the client at the job status endpoint."""
+    response = JsonResponse({
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}/"
+    }, status=202)
+    response["Access-Control-Allow-Origin"] = "*"
+    return response
+
 @csrf_exempt
 @require_http_methods(["POST", "OPTIONS"])
 def process_video(request):
-    """Process YouTube video and create course structure"""
+    """Queue processing of a YouTube video into a course structure"""
     if request.method == "OPTIONS":
         response = HttpResponse("")
         response["Access-Control-Allow-Origin"] = "*"
@@ -331,69 +304,15 @@ def process_video(request):
         if not video_id:
             return JsonResponse({"error": "Invalid YouTube URL"}, status=400)
         
-        print(f"\n📹 Processing video: {video_id}")
+        print(f"\n📹 Queueing video: {video_id}")
         print(f"   Title: {course_title}")
-        
-        # Get video duration
-        video_duration = get_video_duration(video_id)
-        print(f"   Duration: {video_duration} seconds")
-        
-        # Get transcript with timestamps
-        transcript_list = get_transcript_with_timestamps(video_id)
-        
-        # Get full transcript text
-        if transcript_list:
-            full_transcript = " ".join([entry['text'] for entry in transcript_list])
-        else:
-            full_transcript = get_transcript_text(video_id)
-        
-        # Generate course overview
-        print("   Generating course overview...")
-        course_overview = generate_course_overview(full_transcript, course_title)
-        
-        # Create segments
-        segments = create_segments(video_id, video_duration)
-        print(f"   Created {len(segments)} segments")
-        
-        # Generate explanations for each segment
-        print("   Generating segment explanations...")
-        for segment in segments:
-            segment_text = get_segment_transcript(
-                transcript_list, 
-                segment['start'], 
-                segment['end']
-            )
-            
-            if not segment_text and full_transcript:
-                chars_per_second = len(full_transcript) / video_duration
-                start_char = int(segment['start'] * chars_per_second)
-                end_char = int(segment['end'] * chars_per_second)
-                segment_text = full_transcript[start_char:end_char]
-            
-            explanation = generate_segment_explanation(
-                segment_text, 
-                segment['index'],
-                course_title
-            )
-            
-            segment['explanation'] = explanation
-            print(f"      Segment {segment['index']}: ✓")
-        
-        response_data = {
-            "success": True,
-            "videoId": video_id,
-            "courseTitle": course_title,
-            "courseOverview": course_overview,
-            "duration": video_duration,
-            "segments": segments,
-            "totalSegments": len(segments)
-        }
-        
-        print(f"✅ Successfully processed: {course_title}\n")
-        
-        response = JsonResponse(response_data)
-        response["Access-Control-Allow-Origin"] = "*"
-        return response
+
+        job_id = jobs.submit(
+            "courses.process_video",
+            {"video_id": video_id, "course_title": course_title},
+            dedupe_key=f"process-video:{video_id}:{course_title}",
+        )
+        return _job_response(job_id)
     
     except Exception as e:
         print(f"❌ Error: {str(e)}")
@@ -429,10 +348,10 @@ def ask_question(request):
         print(f"   Video: {video_id} at {current_time}s")
         
         # Get transcript
-        transcript_list = get_transcript_with_timestamps(video_id)
+        transcript_list = load_transcript(video_id)
         
         if transcript_list:
-            full_transcript = " ".join([entry['text'] for entry in transcript_list])
+            full_transcript = transcript_list.text
         else:
             transcript_path = TRANSCRIPTS_DIR / f"{video_id}.txt"
             if transcript_path.exists():
@@ -440,17 +359,9 @@ def ask_question(request):
             else:
                 return JsonResponse({"error": "Transcript not found"}, status=404)
         
-        # Get context around current time
+        # Get the transcript chunks most relevant to the question
         if transcript_list:
-            context_start = max(0, current_time - 120)
-            context_end = current_time + 120
-            
-            context_entries = [
-                entry for entry in transcript_list
-                if context_start <= entry['start'] <= context_end
-            ]
-            
-            context_text = " ".join([entry['text'] for entry in context_entries])
+            context_text = retrieve_context(video_id, question, current_time=current_time, k=4)
         else:
             video_duration = get_video_duration(video_id)
             chars_per_second = len(full_transcript) / video_duration
@@ -462,7 +373,7 @@ def ask_question(request):
 
     Student's Question: {question}
 
-    Relevant Course Content (around timestamp {current_time}s):
+    Relevant Course Content (student is at {current_time}s):
     {context_text}
 
     Provide a clear, concise answer based on the course content. If the answer isn't directly in the provided content, use your knowledge to explain the concept while noting it may not be explicitly covered in this part of the course.
@@ -491,10 +402,81 @@ def ask_question(request):
         response["Access-Control-Allow-Origin"] = "*"
         return response
 
+TRANSCRIBE_TIMEOUT = 600  # give up on an AssemblyAI transcription after 10 minutes
+
+
+def _assemblyai_transcribe(audio_path, job):
+    """Upload a clip to AssemblyAI and poll until the transcript is ready."""
+    import time
+
+    headers = {"authorization": ASSEMBLYAI_API_KEY}
+    job.progress(0.1, "Uploading audio")
+    with open(audio_path, 'rb') as f:
+        upload_response = requests.post(
+            "https://api.assemblyai.com/v2/upload",
+            headers=headers,
+            files={'file': f},
+            timeout=120
+        )
+    if upload_response.status_code != 200:
+        raise Exception("Failed to upload audio")
+
+    upload_url = upload_response.json()['upload_url']
+    print(f"   Uploaded to AssemblyAI")
+
+    # Request transcription
+    transcript_response = requests.post(
+        "https://api.assemblyai.com/v2/transcript",
+        headers=headers,
+        json={"audio_url": upload_url},
+        timeout=30
+    )
+    if transcript_response.status_code != 200:
+        raise Exception("Failed to request transcription")
+
+    transcript_id = transcript_response.json()['id']
+    print(f"   Transcription ID: {transcript_id}")
+
+    # Poll for completion (cancellable, bounded)
+    deadline = time.time() + TRANSCRIBE_TIMEOUT
+    while time.time() < deadline:
+        job.progress(0.3, "Transcribing")
+        status_data = requests.get(
+            f"https://api.assemblyai.com/v2/transcript/{transcript_id}",
+            headers=headers,
+            timeout=30
+        ).json()
+        status = status_data['status']
+
+        if status == 'completed':
+            transcription_text = status_data['text']
+            print(f"✅ Transcription complete: {(transcription_text or '')[:100]}...\n")
+            return {"success": True, "text": transcription_text}
+        elif status == 'error':
+            raise Exception("Transcription failed")
+
+        time.sleep(2)
+    raise Exception("Transcription timed out")
+
+
+def transcribe_audio_job(payload, job):
+    """Background job handler for api/transcribe (see monitor.jobs)."""
+    audio_path = Path(payload["audio_path"])
+    try:
+        result = _assemblyai_transcribe(audio_path, job)
+    except Exception as e:
+        # Keep the upload while a retry is pending; drop it once the job is over
+        if isinstance(e, jobs.JobCancelled) or job.is_final_attempt():
+            audio_path.unlink(missing_ok=True)
+        raise
+    audio_path.unlink(missing_ok=True)
+    return result
+
+
 @csrf_exempt
 @require_http_methods(["POST", "OPTIONS"])
 def transcribe_audio(request):
-    """Transcribe audio using AssemblyAI"""
+    """Queue transcription of an uploaded audio clip using AssemblyAI"""
     if request.method == "OPTIONS":
         response = HttpResponse("")
         response["Access-Control-Allow-Origin"] = "*"
@@ -511,75 +493,18 @@ def transcribe_audio(request):
         if not audio_file:
             return JsonResponse({"error": "No audio file provided"}, status=400)
         
-        print("\n🎤 Transcribing audio...")
+        print("\n🎤 Queueing transcription...")
         
-        # Save audio file temporarily
+        # Save audio file for the worker
         audio_path = AUDIO_DIR / f"temp_{datetime.datetime.now().timestamp()}.webm"
         with open(audio_path, 'wb') as f:
             for chunk in audio_file.chunks():
                 f.write(chunk)
         
         print(f"   Saved audio: {audio_path}")
-        
-        # Upload to AssemblyAI
-        headers = {"authorization": ASSEMBLYAI_API_KEY}
-        
-        with open(audio_path, 'rb') as f:
-            upload_response = requests.post(
-                "https://api.assemblyai.com/v2/upload",
-                headers=headers,
-                files={'file': f}
-            )
-        
-        if upload_response.status_code != 200:
-            audio_path.unlink()
-            return JsonResponse({"error": "Failed to upload audio"}, status=500)
-        
-        upload_url = upload_response.json()['upload_url']
-        print(f"   Uploaded to AssemblyAI")
-        
-        # Request transcription
-        transcript_response = requests.post(
-            "https://api.assemblyai.com/v2/transcript",
-            headers=headers,
-            json={"audio_url": upload_url}
-        )
-        
-        if transcript_response.status_code != 200:
-            audio_path.unlink()
-            return JsonResponse({"error": "Failed to request transcription"}, status=500)
-        
-        transcript_id = transcript_response.json()['id']
-        print(f"   Transcription ID: {transcript_id}")
-        
-        # Poll for completion
-        import time
-        while True:
-            status_response = requests.get(
-                f"https://api.assemblyai.com/v2/transcript/{transcript_id}",
-                headers=headers
-            )
-            
-            status_data = status_response.json()
-            status = status_data['status']
-            
-            if status == 'completed':
-                transcription_text = status_data['text']
-                print(f"✅ Transcription complete: {transcription_text[:100]}...\n")
-                audio_path.unlink()
-                
-                response = JsonResponse({
-                    "success": True,
-                    "text": transcription_text
-                })
-                response["Access-Control-Allow-Origin"] = "*"
-                return response
-            
-            elif status == 'error':
-                audio_path.unlink()
-                return JsonResponse({"error": "Transcription failed"}, status=500)
-            
-            time.sleep(2)
+
+        job_id = jobs.submit("courses.transcribe_audio", {"audio_path": str(audio_path)})
+        return _job_response(job_id)
     
     except Exception as e:
         print(f"❌ Error: {str(e)}")
@@ -604,118 +529,10 @@ def health(request):
 # 🎥 Face Detection / Attention
 # =============================
 
-# Initialize a basic face detector (Haar cascade)
-_FACE_DETECTOR = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-
-def _decode_image_b64(image_b64: str):
-    """Decode a base64 image (optionally data URI) into a BGR numpy array."""
-    try:
-        if image_b64.startswith('data:'):
-            # Strip data URI header
-            image_b64 = image_b64.split(',', 1)[1]
-        raw = base64.b64decode(image_b64)
-        np_arr = np.frombuffer(raw, dtype=np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        return img
-    except Exception:
-        return None
-
-
-def _detect_phone_like_regions(gray_img):
-    """
-    Naive phone detector based on rectangular, high-contrast regions.
-    It is intentionally lightweight (no ML weights) and biased toward
-    catching obvious handheld rectangles near the camera.
-    """
-    edges = cv2.Canny(gray_img, 50, 150)
-    edges = cv2.dilate(edges, None, iterations=1)
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    phone_boxes = []
-    for cnt in contours:
-        x, y, w, h = cv2.boundingRect(cnt)
-        area = w * h
-        # Rough size and aspect ratio filters for a phone shape
-        if area < 1200 or area > 45000:
-            continue
-        aspect = w / float(h)
-        if aspect < 0.35 or aspect > 0.85:
-            continue
-
-        # Prefer near-rectangular contours
-        perimeter = cv2.arcLength(cnt, True)
-        approx = cv2.approxPolyDP(cnt, 0.04 * perimeter, True)
-        if len(approx) < 4 or len(approx) > 8:
-            continue
-
-        fill_ratio = cv2.contourArea(cnt) / float(area)
-        if fill_ratio < 0.45:
-            continue
-
-        phone_boxes.append((x, y, w, h))
-
-    return {
-        "phone_detected": len(phone_boxes) > 0,
-        "phone_candidates": len(phone_boxes),
-        "phone_boxes": phone_boxes,
-    }
-
-def _analyze_frame(img_bgr):
-    """Return simple attention metrics from a single frame using heuristics."""
-    h, w = img_bgr.shape[:2]
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    faces = _FACE_DETECTOR.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=5, minSize=(60, 60))
-
-    face_present = len(faces) > 0
-    center_offset = 1.0
-    faces_count = int(len(faces))
-
-    if face_present:
-        # Pick largest face
-        x, y, fw, fh = max(faces, key=lambda f: f[2] * f[3])
-        face_cx = x + fw / 2.0
-        face_cy = y + fh / 2.0
-        img_cx = w / 2.0
-        img_cy = h / 2.0
-
-        # Normalized center distance (0 = centered, ~1 = off-screen)
-        dx = abs(face_cx - img_cx) / (w / 2.0)
-        dy = abs(face_cy - img_cy) / (h / 2.0)
-        center_offset = min(1.0, np.hypot(dx, dy))
-
-    # Blur measure (variance of Laplacian); lower means blur/still
-    blur_var = float(cv2.Laplacian(gray, cv2.CV_64F).var())
-    brightness = float(gray.mean())
-
-    phone_data = _detect_phone_like_regions(gray)
-    multiple_faces = faces_count > 1
-
-    # Heuristic attention score: face present and relatively centered
-    attention_score = 0.0
-    if face_present:
-        attention_score = max(0.0, 1.0 - center_offset)
-
-    distracted = (not face_present) or (center_offset > 0.35)
-    # Heuristic boredom: face present, not distracted, but very low visual change (blur_var small)
-    bored = face_present and (not distracted) and (blur_var < 30.0)
-
-    return {
-        "face_present": face_present,
-        "multiple_faces": multiple_faces,
-        "phone_detected": bool(phone_data["phone_detected"]),
-        "phone_candidates": int(phone_data["phone_candidates"]),
-        "attention_score": round(attention_score, 3),
-        "distracted": bool(distracted),
-        "bored": bool(bored),
-        "metrics": {
-            "center_offset": round(float(center_offset), 3),
-            "blur_var": round(float(blur_var), 3),
-            "brightness": round(float(brightness), 3),
-            "faces_count": faces_count,
-            "phone_boxes": phone_data["phone_boxes"],
-            "frame_size": [int(w), int(h)]
-        }
-    }
+def _analyze_frame(frame):
+    """Attention metrics plus the phone-like region heuristic for one frame (see monitor/vision.py)."""
+    frame, results = vision.analyze(frame, vision.PROFILES["study"])
+    return vision.attention_report(frame, results)
 
 @csrf_exempt
 @require_http_methods(["POST", "OPTIONS"])
@@ -734,11 +551,13 @@ def analyze_face(request):
         if not image_b64:
             return JsonResponse({"error": "Missing 'frame' base64 image"}, status=400)
 
-        img = _decode_image_b64(image_b64)
-        if img is None:
+        try:
+            result = _analyze_frame(image_b64)
+        except vision.VisionError:
             return JsonResponse({"error": "Invalid image data"}, status=400)
-
-        result = _analyze_frame(img)
+        except vision.VisionUnavailable as e:
+            return JsonResponse({"error": f"Face detection is unavailable on this server: {e}"}, status=503)
+        engagement.record_for_request(data, "attention", [(None, result["attention_score"] * 100, None)], user=request.user)
         response = JsonResponse(result)
         response["Access-Control-Allow-Origin"] = "*"
         return response
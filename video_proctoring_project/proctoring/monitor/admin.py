@@ -36,6 +36,7 @@ class CandidateAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if obj.photo:
             try:
+                from deepface import DeepFace
                 img_path = obj.photo.path
                 embedding = DeepFace.represent(
                     img_path=img_path,
@@ -3,13 +3,14 @@ import re
 import json
 import subprocess
 import urllib.parse
-from pathlib import Path
 import requests 
-from pytubefix import YouTube 
 import datetime
 from urllib.parse import urlparse, parse_qs
 from typing import List, Dict, Tuple, Any
 
+from .singleflight import atomic_write_text
+from .transcripts import TRANSCRIPTS_DIR
+
 # --- Configuration (Load API Key and define URL) ---
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY") 
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
@@ -18,9 +19,6 @@ GEMINI_URL = f"https://generativelanguage.googleapis.com/v1/models/{GEMINI_MODEL
 if not GEMINI_API_KEY:
     print("WARNING: GEMINI_API_KEY is not set. API calls will fail.")
 
-TRANSCRIPTS_DIR = Path("./transcripts")
-TRANSCRIPTS_DIR.mkdir(exist_ok=True)
-
 # --- Core API Call Function ---
 def call_gemini_api(prompt: str) -> str:
     """Handles the direct HTTP POST call to the Gemini API."""
@@ -83,19 +81,6 @@ def extract_youtube_id(url: str) -> str | None:
     return None
 
 
-
-def get_video_duration(video_id: str) -> int:
-    """Get video duration in seconds using pytube."""
-    try:
-        video_url = f"https://www.youtube.com/watch?v={video_id}"
-        # Using pytubefix for stability
-        yt = YouTube(video_url) 
-        if yt and yt.length:
-            return yt.length
-    except Exception as e:
-        print(f"Pytube failed to get video duration: {e}. Defaulting to 3600s.")
-    return 3600 # Default to 1 hour (3600 seconds) if duration fails
-
 def get_transcript_text(video_id: str) -> str:
     """
     Attempts to get the plain text transcript, or uses Gemini as a fail-safe.
@@ -108,7 +93,7 @@ def get_transcript_text(video_id: str) -> str:
         # Fallback: Ask the AI based on the video ID/topic.
         prompt = f"The transcript API failed for the video ID {video_id}. Generate a detailed, technical 3000-word transcript about 'Python Fundamentals for Beginners' to allow the course planner to continue."
         synthetic_transcript = call_gemini_api(prompt)
-        transcript_path.write_text(synthetic_transcript, encoding="utf-8")
+        atomic_write_text(transcript_path, synthetic_transcript)
         return synthetic_transcript
 
     except Exception as e:
@@ -213,8 +198,8 @@ Return ONLY valid JSON (no markdown):
 
 # --- Module Splitting Logic (Crucial for the analysis API) ---
 
-def split_transcript_with_timestamps(transcript_list, daily_study_minutes, video_duration, course_title):
-    """Split transcript into modules with time-based AI summaries."""
+def split_transcript_with_timestamps(transcript, daily_study_minutes, video_duration, course_title):
+    """Split a `Transcript` into modules with time-based AI summaries."""
     VIDEO_TIME_RATIO = 0.85
     QUIZ_TIME_RATIO = 0.15
     
@@ -225,8 +210,7 @@ def split_transcript_with_timestamps(transcript_list, daily_study_minutes, video
     num_modules = max(1, int(video_duration / video_watch_seconds))
     seconds_per_module = video_duration / num_modules
     
-    full_text = " ".join(seg['text'] for seg in transcript_list)
-    course_overview = generate_course_overview(full_text, course_title)
+    course_overview = generate_course_overview(transcript.text, course_title)
     
     modules = []
     
@@ -234,12 +218,7 @@ def split_transcript_with_timestamps(transcript_list, daily_study_minutes, video
         start_time = int(module_idx * seconds_per_module)
         end_time = int(min((module_idx + 1) * seconds_per_module, video_duration))
         
-        module_segments = [
-            seg for seg in transcript_list 
-            if start_time <= seg['start'] < end_time
-        ]
-        
-        module_text = " ".join(seg['text'] for seg in module_segments)
+        module_text = transcript.text_between(start_time, end_time)
         
         summary = generate_module_summary(module_text, module_idx + 1, start_time, end_time)
         key_points = extract_key_points(module_text)
@@ -0,0 +1,153 @@
+"""
+Faculty dashboard analytics from grouped SQL and a per-exam rollup table.
+
+Each exam has one `ExamAnalytics` row. It holds sums and counts (attempts,
+marks, percentage, violations, tab switches, time taken, passes,
+assignments), computed with one GROUP BY query over attempts and one over
+assignments.
+
+A row is refreshed when something changes that exam's numbers: a
+submission, judging, a re-grade, or new assignments. Faculty-wide figures
+are sums over that faculty's rows, so dashboard cost depends on the number
+of exams, not students.
+"""
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Exam, ExamAnalytics, ExamAssignment, ExamAttempt, StudentProfile
+
+COMPLETED_STATUSES = ['submitted', 'evaluated']
+
+_ROLLUP_FIELDS = [
+    'assignment_count', 'attempt_count', 'passed_count', 'sum_marks_obtained', 'sum_percentage',
+    'sum_violations', 'sum_tab_switches', 'timed_attempts', 'sum_time_seconds',
+]
+
+
+def _attempt_stats(exam_ids):
+    """exam_id -> attempt aggregates for completed attempts (one grouped query)."""
+    timed = Q(submitted_at__isnull=False, started_at__isnull=False)
+    duration = ExpressionWrapper(F('submitted_at') - F('started_at'), output_field=DurationField())
+    rows = (
+        ExamAttempt.objects.filter(exam_id__in=exam_ids, status__in=COMPLETED_STATUSES)
+        .values('exam_id')
+        .annotate(
+            attempt_count=Count('id'),
+            passed_count=Count('id', filter=Q(passed=True)),
+            sum_marks_obtained=Sum('total_marks_obtained'),
+            sum_percentage=Sum('percentage'),
+            sum_violations=Sum('suspicious_activities'),
+            sum_tab_switches=Sum('tab_switches'),
+            timed_attempts=Count('id', filter=timed),
+            sum_time=Sum(duration, filter=timed),
+        )
+        .order_by()
+    )
+    return {row.pop('exam_id'): row for row in rows}
+
+
+def _assignment_counts(exam_ids):
+    rows = (
+        ExamAssignment.objects.filter(exam_id__in=exam_ids)
+        .values('exam_id').annotate(n=Count('id')).order_by()
+    )
+    return {row['exam_id']: row['n'] for row in rows}
+
+
+def refresh_exam_rollups(exam_ids):
+    """Recompute the rollup rows for the given exams (4 queries regardless of count)."""
+    exam_ids = list(exam_ids)
+    if not exam_ids:
+        return []
+    faculty_ids = dict(Exam.objects.filter(id__in=exam_ids).values_list('id', 'faculty_id'))
+    stats = _attempt_stats(exam_ids)
+    assignments = _assignment_counts(exam_ids)
+
+    rollups = []
+    for exam_id, faculty_id in faculty_ids.items():
+        row = stats.get(exam_id, {})
+        sum_time = row.get('sum_time')
+        rollups.append(ExamAnalytics(
+            exam_id=exam_id,
+            faculty_id=faculty_id,
+            assignment_count=assignments.get(exam_id, 0),
+            attempt_count=row.get('attempt_count', 0),
+            passed_count=row.get('passed_count', 0),
+            sum_marks_obtained=row.get('sum_marks_obtained') or 0,
+            sum_percentage=row.get('sum_percentage') or 0,
+            sum_violations=row.get('sum_violations') or 0,
+            sum_tab_switches=row.get('sum_tab_switches') or 0,
+            timed_attempts=row.get('timed_attempts', 0),
+            sum_time_seconds=sum_time.total_seconds() if sum_time else 0,
+        ))
+
+    with transaction.atomic():
+        ExamAnalytics.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=['exam'],
+            update_fields=['faculty'] + _ROLLUP_FIELDS + ['updated_at'],
+        )
+    return rollups
+
+
+def refresh_exam_rollup(exam_id):
+    """Refresh one exam's rollup once the current transaction commits."""
+    transaction.on_commit(lambda: refresh_exam_rollups([exam_id]))
+
+
+def _averages(row):
+    attempts = row['attempt_count'] or 0
+    timed = row['timed_attempts'] or 0
+    assignments = row['assignment_count'] or 0
+    avg_violations = row['sum_violations'] / attempts if attempts else 0
+    avg_tab_switches = row['sum_tab_switches'] / attempts if attempts else 0
+    return {
+        'avg_marks_obtained': round(row['sum_marks_obtained'] / attempts, 2) if attempts else 0,
+        'avg_percentage': round(row['sum_percentage'] / attempts, 2) if attempts else 0,
+        'avg_time_seconds': round(row['sum_time_seconds'] / timed, 2) if timed else 0,
+        'avg_violations': round(avg_violations, 2),
+        'avg_tab_switches': round(avg_tab_switches, 2),
+        'completion_rate': round(attempts / assignments * 100, 2) if assignments else 0,
+        # Lower violations / tab switches -> higher score
+        'concentration_score': round(max(0, min(100, 100 - (avg_violations * 10 + avg_tab_switches * 5))), 2),
+        'pass_rate': round(row['passed_count'] / attempts * 100, 2) if attempts else 0,
+        'attempt_count': attempts,
+        'assignment_count': assignments,
+    }
+
+
+def faculty_analytics(faculty):
+    """Dashboard figures for a faculty member: overall totals plus a per-exam breakdown."""
+    missing = Exam.objects.filter(faculty=faculty, analytics__isnull=True).values_list('id', flat=True)
+    refresh_exam_rollups(missing)  # first visit / exams created before the rollup existed
+
+    rollups = list(
+        ExamAnalytics.objects.filter(faculty=faculty)
+        .select_related('exam')
+        .only('exam__title', *_ROLLUP_FIELDS)
+        .order_by('-exam__created_at')
+    )
+    totals = {field: sum(getattr(r, field) for r in rollups) for field in _ROLLUP_FIELDS}
+
+    result = _averages(totals)
+    result['exams'] = [
+        dict(_averages({field: getattr(r, field) for field in _ROLLUP_FIELDS}), exam_id=r.exam_id, title=r.exam.title)
+        for r in rollups
+    ]
+    return result
+
+
+def students_with_enrollment_stats(students=None):
+    """StudentProfile queryset annotated with enrolled_count / avg_progress (one query)."""
+    students = students if students is not None else StudentProfile.objects.all()
+    return students.annotate(
+        enrolled_count=Count('enrollments'),
+        avg_progress=Coalesce(Avg('enrollments__progress'), Value(0.0), output_field=FloatField()),
+    )
+
+
+def courses_with_enrollment_counts(courses):
+    """Course queryset annotated with enrolled_students (avoids a COUNT per course in templates)."""
+    return courses.annotate(enrolled_students=Count('enrollments'))
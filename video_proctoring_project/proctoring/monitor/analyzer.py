@@ -1,47 +1,8 @@
-import cv2
 import numpy as np
-from ultralytics import YOLO
 from .models import Event
-import speech_recognition as sr
-from pydub import AudioSegment
+from . import vision
 import json
 
-SIM_THRESHOLD = 0.6  # face similarity threshold
-
-# Load YOLOv8 model (pretrained on COCO)
-yolo_model = YOLO("yolov8n.pt")  # small, fast version
-
-# Expanded gadget synonyms for detection
-GADGET_SYNONYMS = [
-    "cell phone", "cellphone", "mobile", "phone", "laptop", "notebook",
-    "book", "keyboard", "mouse", "remote", "tv remote",
-    "headphones", "earphones", "earbuds", "headset", "watch", "smartwatch", "tablet"
-]
-GADGET_NAMES = set(n.lower() for n in GADGET_SYNONYMS)
-
-# ------------------------------
-# Cosine similarity for face embeddings
-# ------------------------------
-def cosine_similarity(a, b):
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
-# ------------------------------
-# Load DeepFace embedding
-# ------------------------------
-def get_embedding_from_frame(face_img):
-    from deepface import DeepFace
-    try:
-        face_resized = cv2.resize(face_img, (160, 160))
-        rgb_face = cv2.cvtColor(face_resized, cv2.COLOR_BGR2RGB)
-        embedding = DeepFace.represent(rgb_face, model_name='Facenet')[0]["embedding"]
-        emb_array = np.array(embedding, dtype=np.float32)
-        norm = np.linalg.norm(emb_array)
-        if norm > 0:
-            emb_array /= norm
-        return emb_array
-    except:
-        return None
-
 # ------------------------------
 # Robustly read candidate embedding
 # ------------------------------
@@ -72,14 +33,20 @@ def read_candidate_embedding(candidate):
 # ------------------------------
 # Analyze video frame
 # ------------------------------
-def analyze_frame(frame_bgr, session):
+def analyze_frame(frame, session, hint=None):
+    """
+    Proctoring events for one frame (BGR array, base64 or vision.Frame).
+    `hint` is an optional frame_hints.FrameHint; its high-res face crop is used
+    for verification when it matches a detected face.
+    """
     events = []
-
-    # Face detection
-    gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(40, 40))
-    hF, wF = frame_bgr.shape[:2]
+    candidate_embedding = read_candidate_embedding(session.candidate)
+    frame, results = vision.analyze(
+        frame, vision.PROFILES['proctoring'], hint=hint, candidate_embedding=candidate_embedding
+    )
+    frame_bgr = frame.image
+    faces = results['faces']['boxes']
+    wF = frame.width
 
     if len(faces) == 0:
         events.append({
@@ -100,25 +67,21 @@ def analyze_frame(frame_bgr, session):
             'box_coords': [int(faces[0][0]), int(faces[0][1]), int(faces[0][0]+faces[0][2]), int(faces[0][1]+faces[0][3])]
         })
 
-    candidate_embedding = read_candidate_embedding(session.candidate)
-
     # Face verification & gaze
-    for (x, y, w, h) in faces:
-        face = frame_bgr[y:y+h, x:x+w]
-        emb = get_embedding_from_frame(face)
+    for face in results['identity']['faces']:
+        x, y, w, h = face['box']
         box_coords = [int(x), int(y), int(x+w), int(y+h)]
 
-        if emb is not None and candidate_embedding is not None:
-            sim = cosine_similarity(emb, candidate_embedding)
-            if sim < SIM_THRESHOLD:
+        if face['similarity'] is not None:
+            if not face['match']:
                 events.append({
                     'type': 'face_mismatch',
-                    'details': f'sim={sim:.2f}',
+                    'details': f"sim={face['similarity']:.2f}",
                     'score': 0.8,
                     'frame': frame_bgr,
                     'box_coords': box_coords
                 })
-        elif emb is None:
+        elif not face['embedding_ok']:
             events.append({
                 'type': 'face_unknown',
                 'details': 'embedding failed',
@@ -129,7 +92,7 @@ def analyze_frame(frame_bgr, session):
 
         # Gaze offscreen
         cx = x + w / 2
-        if cx < 0.15 * wF or cx > 0.85 * wF:
+        if cx < vision.GAZE_EDGE * wF or cx > (1 - vision.GAZE_EDGE) * wF:
             events.append({
                 'type': 'gaze_offscreen',
                 'details': 'face center offscreen',
@@ -138,22 +101,15 @@ def analyze_frame(frame_bgr, session):
                 'box_coords': box_coords
             })
 
-    # Gadget detection using YOLO
-    results = yolo_model.predict(frame_bgr, imgsz=640, conf=0.25, verbose=False)
-    for r in results:
-        if r.boxes is None or len(r.boxes) == 0:
-            continue
-        for box, cls_id, conf in zip(r.boxes.xyxy, r.boxes.cls, r.boxes.conf):
-            label = yolo_model.model.names[int(cls_id)].lower()
-            if label in GADGET_NAMES:
-                x1, y1, x2, y2 = [int(coord) for coord in box]
-                events.append({
-                    'type': 'device_detected',
-                    'details': f'{label} detected ({float(conf):.2f})',
-                    'score': 0.5,
-                    'frame': frame_bgr,
-                    'box_coords': [x1, y1, x2, y2]
-                })
+    # Gadget detection using YOLO, flagged only once seen in k of the session's last n frames
+    for gadget in vision.confirm_gadgets(session.pk, results['devices']['gadgets']):
+        events.append({
+            'type': 'device_detected',
+            'details': f"{gadget['label']} detected ({gadget['confidence']:.2f})",
+            'score': 0.5,
+            'frame': frame_bgr,
+            'box_coords': gadget['box']
+        })
 
     # Session blocking logic
     suspicious_count = session.events.filter(event_type__in=[
@@ -176,6 +132,9 @@ def analyze_frame(frame_bgr, session):
 # Analyze audio for suspicious events
 # ------------------------------
 def analyze_audio(audio_file, session):
+    import speech_recognition as sr  # imported here to keep Django startup light
+    from pydub import AudioSegment
+
     events = []
 
     try:
@@ -0,0 +1,326 @@
+"""
+Micro-benchmarks for the per-call hot paths of the frame and course pipelines.
+
+Every case times one call on fixed synthetic inputs. The inputs are seeded,
+with no files and no network; the LLM and Facenet calls are stubbed. Results are compared
+with the committed baselines in benchmark_baselines.json:
+
+    python manage.py run_benchmarks                     # compare with the baselines
+    python manage.py run_benchmarks --update-baselines  # rewrite them (commit the diff)
+
+Baselines are machine-specific. Regenerate them on the reference machine
+when a change is meant to move a number, so the move is visible in review.
+The reference environment must run every case: a case whose dependency is
+unavailable (no face detector, app.py without MISTRAL_API_KEY) is reported
+as skipped. Skipping a case that has a baseline fails
+`run_benchmarks --fail-on-regression`; the unit tests only skip it.
+"""
+import base64
+import json
+import os
+import platform
+import statistics
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from .lazy_imports import lazy_module
+
+cv2 = lazy_module("cv2")
+
+SEED = 1234
+BASELINES_PATH = Path(__file__).resolve().with_name("benchmark_baselines.json")
+DEFAULT_ROUNDS = 7
+DEFAULT_MIN_ROUND_TIME = 0.02     # seconds; enough calls per round to swamp timer overhead
+DEFAULT_TOLERANCE = 25.0          # percent slower than baseline before a case counts as regressed
+
+CASES = {}   # name -> setup(); setup returns the zero-argument callable to time
+
+
+class BenchmarkSkipped(Exception):
+    """The case cannot run in this environment."""
+
+
+def benchmark(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+# ------------------------------
+# Synthetic inputs
+# ------------------------------
+def synthetic_frame(width=640, height=480):
+    """A webcam-like BGR frame: noisy background, a face-like ellipse and a phone-like rectangle."""
+    rng = np.random.default_rng(SEED)
+    frame = rng.integers(60, 120, (height, width, 3), dtype=np.uint8)
+    cv2.ellipse(frame, (width // 2, height // 3), (60, 80), 0, 0, 360, (150, 170, 200), -1)
+    cv2.circle(frame, (width // 2 - 22, height // 3 - 15), 8, (40, 40, 40), -1)
+    cv2.circle(frame, (width // 2 + 22, height // 3 - 15), 8, (40, 40, 40), -1)
+    cv2.rectangle(frame, (width // 5, height // 2), (width // 5 + 60, height // 2 + 110), (20, 20, 20), -1)
+    return frame
+
+
+def synthetic_jpeg_b64(width=640, height=480):
+    ok, jpeg = cv2.imencode('.jpg', synthetic_frame(width, height), [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return 'data:image/jpeg;base64,' + base64.b64encode(jpeg.tobytes()).decode()
+
+
+def synthetic_segments(duration=7200, step=5.0):
+    """Transcript segments every `step` seconds with deterministic text."""
+    words = ("variable function loop recursion array pointer class object method module "
+             "compile runtime memory stack queue graph tree hash sort search").split()
+    rng = np.random.default_rng(SEED)
+    return [
+        {'text': " ".join(rng.choice(words, 12)), 'start': i * step, 'duration': step}
+        for i in range(int(duration / step))
+    ]
+
+
+# ------------------------------
+# Cases
+# ------------------------------
+@benchmark('cosine_similarity')
+def _cosine_similarity():
+    from . import vision
+    rng = np.random.default_rng(SEED)
+    a, b = rng.standard_normal(128).astype(np.float32), rng.standard_normal(128).astype(np.float32)
+    return lambda: vision.cosine_similarity(a, b)
+
+
+@benchmark('read_candidate_embedding')
+def _read_candidate_embedding():
+    from . import analyzer
+    rng = np.random.default_rng(SEED)
+    candidate = SimpleNamespace(authorized_embedding=json.dumps(rng.standard_normal(512).round(6).tolist()))
+    return lambda: analyzer.read_candidate_embedding(candidate)
+
+
+@benchmark('embedding_preprocess')
+def _embedding_preprocess():
+    # The CPU side of a frame's face embedding (crop -> Facenet input); the network itself is excluded
+    from . import inference
+    frame = synthetic_frame()
+    crop = frame[80:240, 260:380]
+    return lambda: inference.facenet_input(crop)
+
+
+class _StubFacenet:
+    """Stands in for the Facenet network: fixed rows, so only the code around the call is timed."""
+
+    def __init__(self, dims=128):
+        self.row = np.random.default_rng(SEED).standard_normal(dims).astype(np.float32)
+
+    def predict(self, batch):
+        return np.tile(self.row, (len(batch), 1))
+
+
+@benchmark('get_embedding_from_frame')
+def _get_embedding_from_frame():
+    # One face's embedding: crop from the frame, Facenet input, predict (stubbed), L2-normalise
+    from . import frame_hints, inference, vision
+    frame = synthetic_frame()
+    box = (260, 80, 120, 160)
+    model = _StubFacenet()
+
+    def run():
+        with mock.patch.object(inference, 'load', lambda name: model):
+            return vision.get_embedding(frame_hints.crop_for_face(frame, box))
+    return run
+
+
+@benchmark('analyze_frame_basic')
+def _analyze_frame_basic():
+    from . import face_detectors, vision
+    try:
+        face_detectors.default_detector()
+    except face_detectors.DetectorUnavailable as e:
+        raise BenchmarkSkipped(str(e))
+    frame = synthetic_frame()
+
+    def run():
+        # A fresh Frame each call: nothing cached from the previous iteration
+        f, results = vision.analyze(vision.Frame(frame), vision.PROFILES['attention'])
+        return vision.attention_report(f, results)
+    return run
+
+
+@benchmark('phone_regions')
+def _phone_regions():
+    from . import vision
+    frame = synthetic_frame()
+    return lambda: vision.run_stage(vision.Frame(frame), 'phone_regions')
+
+
+@benchmark('calculate_engagement_score')
+def _calculate_engagement_score():
+    try:
+        import app
+    except Exception as e:  # app.py refuses to import without MISTRAL_API_KEY
+        raise BenchmarkSkipped(f"app.py not importable: {e}")
+    emotions = {'angry': 2.1, 'disgust': 0.3, 'fear': 4.2, 'happy': 31.5, 'sad': 6.8, 'surprise': 5.1, 'neutral': 50.0}
+    return lambda: app.calculate_engagement_score(emotions, 'neutral')
+
+
+@benchmark('decode_b64')
+def _decode_b64():
+    from . import frame_hints
+    data = synthetic_jpeg_b64()
+    return lambda: frame_hints.decode_b64(data)
+
+
+@benchmark('mood_decode_frame')
+def _mood_decode_frame():
+    from . import mood
+    data = synthetic_jpeg_b64()
+    return lambda: mood.decode_frame(data)
+
+
+@benchmark('load_frame_cold')
+def _load_frame_cold():
+    from . import vision
+    data = synthetic_jpeg_b64()
+
+    def run():
+        vision._frame_cache.clear()
+        return vision.load_frame(data)
+    return run
+
+
+@benchmark('load_frame_cached')
+def _load_frame_cached():
+    from . import vision
+    data = synthetic_jpeg_b64()
+    vision.load_frame(data)
+    return lambda: vision.load_frame(data)
+
+
+@benchmark('split_transcript_with_timestamps')
+def _split_transcript_with_timestamps():
+    from . import analysis_helpers
+    from .transcripts import Transcript
+    transcript = Transcript.from_segments('benchmark', synthetic_segments())
+
+    def fake_llm(prompt):
+        if 'JSON array' in prompt:
+            return '```json\n["Loops", "Functions", "Recursion", "Arrays", "Classes"]\n```'
+        return "This module covers the core ideas.\nIt builds on the previous one."
+
+    def run():
+        with mock.patch.object(analysis_helpers, 'call_gemini_api', side_effect=fake_llm):
+            return analysis_helpers.split_transcript_with_timestamps(transcript, 30, 7200, 'Benchmark Course')
+    return run
+
+
+@benchmark('generate_questions_local')
+def _generate_questions_local():
+    import random
+    from . import views
+
+    def run():
+        random.seed(SEED)
+        return views._generate_questions_local('python', 10, 2, 'medium', 'python', 1, 5)
+    return run
+
+
+# ------------------------------
+# Runner
+# ------------------------------
+def _time_case(func, rounds, min_round_time):
+    func()  # warm-up: imports, lazy models, caches
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time:
+            break
+        calls *= 2 if elapsed < min_round_time / 4 else 1 + int(min_round_time / max(elapsed, 1e-9))
+    samples = [elapsed / calls]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        samples.append((time.perf_counter() - start) / calls)
+    samples_us = [s * 1e6 for s in samples]
+    return {
+        'median_us': round(statistics.median(samples_us), 3),
+        'min_us': round(min(samples_us), 3),
+        'mean_us': round(statistics.fmean(samples_us), 3),
+        'stdev_us': round(statistics.stdev(samples_us), 3) if len(samples_us) > 1 else 0.0,
+        'rounds': rounds,
+        'calls_per_round': calls,
+    }
+
+
+def run(names=None, rounds=DEFAULT_ROUNDS, min_round_time=DEFAULT_MIN_ROUND_TIME):
+    """{name: timing dict} for the selected cases, or {name: {'skipped': reason}}."""
+    unknown = [n for n in (names or []) if n not in CASES]
+    if unknown:
+        raise KeyError(f"Unknown benchmarks: {', '.join(unknown)}")
+    results = {}
+    for name in names or CASES:
+        try:
+            func = CASES[name]()
+        except BenchmarkSkipped as e:
+            results[name] = {'skipped': str(e)}
+            continue
+        results[name] = _time_case(func, max(2, rounds), min_round_time)
+    return results
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(terse=True),
+        'processor': platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+
+def load_baselines(path=BASELINES_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'machine': None, 'results': {}}
+
+
+def save_baselines(results, path=BASELINES_PATH):
+    """Write the timed (not skipped) results as the new baselines; skipped cases keep their old entry."""
+    baselines = load_baselines(path)
+    merged = dict(baselines.get('results', {}))
+    for name, result in results.items():
+        if 'skipped' not in result:
+            merged[name] = {'median_us': result['median_us'], 'min_us': result['min_us']}
+    with open(path, 'w') as f:
+        json.dump({'machine': machine_info(), 'results': dict(sorted(merged.items()))}, f, indent=2)
+        f.write('\n')
+
+
+def skipped_with_baseline(results, baselines):
+    """Names of cases that were skipped although they have a committed baseline."""
+    return [name for name, result in results.items() if 'skipped' in result and name in baselines.get('results', {})]
+
+
+def compare(results, baselines, tolerance=DEFAULT_TOLERANCE):
+    """
+    Rows of (name, baseline_us, min_us, change_pct, regressed) for cases that
+    have a baseline. The fastest round is compared: it is the least disturbed
+    by other load on the machine.
+    """
+    rows = []
+    for name, result in results.items():
+        base = baselines.get('results', {}).get(name)
+        if not base or 'skipped' in result:
+            continue
+        change = (result['min_us'] - base['min_us']) / base['min_us'] * 100
+        rows.append((name, base['min_us'], result['min_us'], round(change, 1), change > tolerance))
+    return rows
@@ -0,0 +1,472 @@
+"""
+Per-learner engagement time series.
+
+Mood (`/analyze-mood`) and attention (`/analyze-face`) results used to be
+returned to the browser and thrown away, so any summary meant re-running
+vision over raw frames. Samples are now recorded server side, one series per
+(student, course, module, metric). The metric is 'engagement' (0-100 mood
+score) or 'attention' (0-100 face attention score).
+
+Storage is a SQLite file (stdlib `sqlite3`, WAL), like the job queue, so the
+Flask app and the Django views share it without the ORM:
+
+- `engagement_series` has one row per series. The last RING_SIZE samples are
+  kept in fixed-size array columns (timestamps float64, scores float32,
+  emotion codes uint8) used as a ring buffer. Alongside them are the running
+  window sum, a time-decayed EMA, lifetime count/sum and emotion counts.
+  Each sample updates these in O(1).
+- `engagement_rollup` holds downsampled buckets per series: count, sum,
+  min and max at each resolution in RESOLUTIONS. Dashboards read these and
+  the series rows, never raw frames.
+
+Samples are only attributed to a verified learner: the logged-in Django user,
+or, for the Flask app (which has no session), a short-lived signed token from
+`GET /api/engagement/token/` sent as "engagement_token". A roll number in the
+request body is never trusted.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
+ENGAGEMENT_DB_PATH = Path(os.getenv("ENGAGEMENT_DB_PATH", str(BASE_DIR / "engagement.sqlite3")))
+
+RING_SIZE = 120              # samples kept per series for the rolling window
+EMA_HALF_LIFE = 60.0         # seconds; a sample's EMA weight halves over this time
+MIN_SAMPLE_GAP = 1.0         # samples closer than this (e.g. one batch) still move the EMA
+RESOLUTIONS = (60, 3600)     # rollup bucket sizes in seconds (minute, hour)
+RETENTION = {60: 7 * 86400}  # rollups older than this are pruned; hourly buckets are kept
+PRUNE_INTERVAL = 3600
+# Shared by Django (issues) and the Flask app (verifies); tokens are disabled when unset
+TOKEN_SECRET = os.getenv("ENGAGEMENT_TOKEN_SECRET", "")
+TOKEN_TTL = 12 * 3600
+
+METRICS = ("engagement", "attention")
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+NO_EMOTION = 255
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS engagement_series (
+    student TEXT NOT NULL,
+    course TEXT NOT NULL,
+    module TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    head INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    timestamps BLOB NOT NULL,
+    scores BLOB NOT NULL,
+    emotions BLOB NOT NULL,
+    window_sum REAL NOT NULL,
+    ema REAL NOT NULL,
+    sample_count INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    emotion_counts TEXT NOT NULL,
+    first_ts REAL NOT NULL,
+    last_ts REAL NOT NULL,
+    last_score REAL NOT NULL,
+    PRIMARY KEY (student, course, module, metric)
+);
+CREATE INDEX IF NOT EXISTS engagement_series_course ON engagement_series (course, metric);
+CREATE TABLE IF NOT EXISTS engagement_rollup (
+    student TEXT NOT NULL,
+    course TEXT NOT NULL,
+    module TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket REAL NOT NULL,
+    sample_count INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    score_min REAL NOT NULL,
+    score_max REAL NOT NULL,
+    PRIMARY KEY (student, course, module, metric, resolution, bucket)
+);
+CREATE INDEX IF NOT EXISTS engagement_rollup_bucket ON engagement_rollup (resolution, bucket);
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def _connect():
+    global _schema_ready
+    conn = sqlite3.connect(str(ENGAGEMENT_DB_PATH), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                _schema_ready = True
+    return conn
+
+
+def _key(student, course, module, metric):
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    return str(student), str(course), str(module or ""), metric
+
+
+# ------------------------------
+# Ring buffer state
+# ------------------------------
+class _Series:
+    """In-memory view of one engagement_series row while it is being updated."""
+
+    def __init__(self, row=None):
+        if row is None:
+            self.head = self.size = 0
+            self.timestamps = np.zeros(RING_SIZE, dtype=np.float64)
+            self.scores = np.zeros(RING_SIZE, dtype=np.float32)
+            self.emotions = np.full(RING_SIZE, NO_EMOTION, dtype=np.uint8)
+            self.window_sum = self.ema = self.score_sum = 0.0
+            self.sample_count = 0
+            self.emotion_counts = {}
+            self.first_ts = self.last_ts = self.last_score = 0.0
+            return
+        self.head, self.size = row["head"], row["size"]
+        self.timestamps = np.frombuffer(row["timestamps"], dtype=np.float64).copy()
+        self.scores = np.frombuffer(row["scores"], dtype=np.float32).copy()
+        self.emotions = np.frombuffer(row["emotions"], dtype=np.uint8).copy()
+        self.window_sum, self.ema = row["window_sum"], row["ema"]
+        self.sample_count, self.score_sum = row["sample_count"], row["score_sum"]
+        self.emotion_counts = json.loads(row["emotion_counts"])
+        self.first_ts, self.last_ts, self.last_score = row["first_ts"], row["last_ts"], row["last_score"]
+        if len(self.scores) != RING_SIZE:
+            self._resize()
+
+    def _resize(self):
+        # RING_SIZE changed since the row was written: keep the newest samples
+        ts, scores, emotions = self.ordered()
+        keep = min(len(scores), RING_SIZE)
+        self.timestamps = np.zeros(RING_SIZE, dtype=np.float64)
+        self.scores = np.zeros(RING_SIZE, dtype=np.float32)
+        self.emotions = np.full(RING_SIZE, NO_EMOTION, dtype=np.uint8)
+        self.timestamps[:keep] = ts[len(ts) - keep:]
+        self.scores[:keep] = scores[len(scores) - keep:]
+        self.emotions[:keep] = emotions[len(emotions) - keep:]
+        self.size, self.head = keep, keep % RING_SIZE
+        self.window_sum = float(self.scores[:keep].sum())
+
+    def add(self, ts, score, emotion):
+        if self.size == RING_SIZE:
+            self.window_sum -= float(self.scores[self.head])  # evict the oldest sample
+        else:
+            self.size += 1
+        self.timestamps[self.head] = ts
+        self.scores[self.head] = score
+        self.emotions[self.head] = EMOTIONS.index(emotion) if emotion in EMOTIONS else NO_EMOTION
+        self.window_sum += score
+        self.head = (self.head + 1) % RING_SIZE
+        if self.head == 0:
+            self.window_sum = float(self.scores[:self.size].sum())  # re-anchor float drift once per lap
+
+        if self.sample_count == 0:
+            self.ema, self.first_ts = score, ts
+        else:
+            gap = max(ts - self.last_ts, MIN_SAMPLE_GAP)
+            alpha = 1.0 - math.pow(0.5, gap / EMA_HALF_LIFE)
+            self.ema += alpha * (score - self.ema)
+        self.sample_count += 1
+        self.score_sum += score
+        if emotion:
+            self.emotion_counts[emotion] = self.emotion_counts.get(emotion, 0) + 1
+        self.last_ts, self.last_score = max(self.last_ts, ts), score
+
+    def ordered(self):
+        """Ring contents oldest -> newest."""
+        start = (self.head - self.size) % max(len(self.scores), 1)
+        idx = (np.arange(self.size) + start) % max(len(self.scores), 1)
+        return self.timestamps[idx], self.scores[idx], self.emotions[idx]
+
+    def row_values(self):
+        return (
+            self.head, self.size, self.timestamps.tobytes(), self.scores.tobytes(), self.emotions.tobytes(),
+            self.window_sum, self.ema, self.sample_count, self.score_sum, json.dumps(self.emotion_counts),
+            self.first_ts, self.last_ts, self.last_score,
+        )
+
+
+# ------------------------------
+# Writing
+# ------------------------------
+def record_many(student, course, module, metric, samples):
+    """
+    Append samples to one series. `samples` is a list of
+    (timestamp or None, score 0-100, dominant emotion or None); a None
+    timestamp means now. All samples are written in one transaction.
+    """
+    key = _key(student, course, module, metric)
+    now = time.time()
+    samples = [(now if ts is None else float(ts), float(score), emotion) for ts, score, emotion in samples]
+    if not samples:
+        return
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM engagement_series WHERE student = ? AND course = ? AND module = ? AND metric = ?", key
+        ).fetchone()
+        series = _Series(row)
+        for ts, score, emotion in samples:
+            series.add(ts, score, emotion)
+        conn.execute(
+            "INSERT OR REPLACE INTO engagement_series (student, course, module, metric, head, size, timestamps, "
+            "scores, emotions, window_sum, ema, sample_count, score_sum, emotion_counts, first_ts, last_ts, "
+            "last_score) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            key + series.row_values(),
+        )
+        conn.executemany(
+            "INSERT INTO engagement_rollup (student, course, module, metric, resolution, bucket, sample_count, "
+            "score_sum, score_min, score_max) VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?) "
+            "ON CONFLICT (student, course, module, metric, resolution, bucket) DO UPDATE SET "
+            "sample_count = sample_count + 1, score_sum = score_sum + excluded.score_sum, "
+            "score_min = MIN(score_min, excluded.score_min), score_max = MAX(score_max, excluded.score_max)",
+            [
+                key + (resolution, ts - ts % resolution, score, score, score)
+                for ts, score, _ in samples
+                for resolution in RESOLUTIONS
+            ],
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    _maybe_prune()
+
+
+def record(student, course, module, metric, score, emotion=None, timestamp=None):
+    record_many(student, course, module, metric, [(timestamp, score, emotion)])
+
+
+def record_for_request(data, metric, samples, user=None):
+    """
+    Record samples for an analysis request if it identifies a learner and a
+    course. The student is the logged-in user's roll number (Django views
+    pass `user`), else the one in a valid 'engagement_token' from the body;
+    the course and module are 'course_id' / 'module_id'. Failures are
+    logged, never raised, so recording cannot break the analysis response.
+    """
+    try:
+        student = None
+        if user is not None and user.is_authenticated:
+            from monitor.models import StudentProfile
+            student = StudentProfile.objects.filter(user=user).values_list('roll_number', flat=True).first()
+        student = student or verify_token(data.get('engagement_token'))
+        course_id = data.get('course_id')
+        if not student or not course_id or not samples:
+            return False
+        record_many(student, course_id, data.get('module_id'), metric, samples)
+        return True
+    except Exception as e:
+        print(f"Engagement record failed: {e}")
+        return False
+
+
+# ------------------------------
+# Learner tokens
+# ------------------------------
+def _signature(payload):
+    return hmac.new(TOKEN_SECRET.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def issue_token(student, now=None):
+    """Signed, expiring learner id for the Flask endpoints (None if no TOKEN_SECRET is configured)."""
+    if not TOKEN_SECRET:
+        return None
+    payload = f"{student}:{int((now or time.time()) + TOKEN_TTL)}"
+    encoded = base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{encoded}.{_signature(payload)}"
+
+
+def verify_token(token, now=None):
+    """Roll number from an `issue_token` token, or None if it is missing, forged or expired."""
+    if not TOKEN_SECRET or not isinstance(token, str) or "." not in token:
+        return None
+    encoded, signature = token.rsplit(".", 1)
+    try:
+        payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+        student, expires = payload.rsplit(":", 1)
+        expires = int(expires)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _signature(payload)) or expires < (now or time.time()):
+        return None
+    return student
+
+
+def prune(now=None):
+    """Drop rollup buckets past their RETENTION; returns rows deleted."""
+    now = now or time.time()
+    conn = _connect()
+    try:
+        deleted = 0
+        for resolution, keep_seconds in RETENTION.items():
+            cur = conn.execute(
+                "DELETE FROM engagement_rollup WHERE resolution = ? AND bucket < ?", (resolution, now - keep_seconds)
+            )
+            deleted += cur.rowcount
+        return deleted
+    finally:
+        conn.close()
+
+
+def _maybe_prune():
+    global _last_prune
+    now = time.time()
+    if now - _last_prune < PRUNE_INTERVAL:
+        return
+    _last_prune = now
+    try:
+        prune(now)
+    except sqlite3.Error as e:
+        print(f"Engagement rollup prune failed: {e}")
+
+
+# ------------------------------
+# Reading
+# ------------------------------
+def _summary(row):
+    size = row["size"]
+    count = row["sample_count"]
+    return {
+        "student": row["student"],
+        "course": row["course"],
+        "module": row["module"],
+        "metric": row["metric"],
+        "rolling_mean": round(row["window_sum"] / size, 2) if size else None,
+        "rolling_window": size,
+        "ema": round(row["ema"], 2) if count else None,
+        "average": round(row["score_sum"] / count, 2) if count else None,
+        "sample_count": count,
+        "last_score": round(row["last_score"], 2) if count else None,
+        "emotion_distribution": json.loads(row["emotion_counts"]),
+        "first_seen": row["first_ts"],
+        "last_seen": row["last_ts"],
+    }
+
+
+def get_series(student, course, module="", metric="engagement", include_samples=False):
+    """Summary of one series (None if nothing was recorded), optionally with the ring contents."""
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT * FROM engagement_series WHERE student = ? AND course = ? AND module = ? AND metric = ?",
+            _key(student, course, module, metric),
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    summary = _summary(row)
+    if include_samples:
+        timestamps, scores, emotions = _Series(row).ordered()
+        summary["samples"] = [
+            {
+                "timestamp": float(ts),
+                "score": round(float(score), 2),
+                "emotion": EMOTIONS[code] if code < len(EMOTIONS) else None,
+            }
+            for ts, score, code in zip(timestamps, scores, emotions)
+        ]
+    return summary
+
+
+def _series_rows(course, metric, student=None, module=None):
+    sql = ("SELECT student, course, module, metric, size, window_sum, ema, sample_count, score_sum, emotion_counts, "
+           "first_ts, last_ts, last_score FROM engagement_series WHERE course = ? AND metric = ?")
+    params = [str(course), metric]
+    if student is not None:
+        sql += " AND student = ?"
+        params.append(str(student))
+    if module is not None:
+        sql += " AND module = ?"
+        params.append(str(module))
+    conn = _connect()
+    try:
+        return conn.execute(sql + " ORDER BY student, module", params).fetchall()
+    finally:
+        conn.close()
+
+
+def list_series(course, metric="engagement", student=None, module=None):
+    """Summaries for every series of a course (optionally one student / module); one query."""
+    return [_summary(row) for row in _series_rows(course, metric, student, module)]
+
+
+def get_rollups(course, metric="engagement", resolution=RESOLUTIONS[0], since=None, student=None, module=None):
+    """
+    Downsampled buckets for a course, merged across whichever of student /
+    module is not given: [{"bucket", "count", "average", "min", "max"}].
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unsupported resolution: {resolution}")
+    sql = ("SELECT bucket, SUM(sample_count) AS n, SUM(score_sum) AS total, MIN(score_min) AS lo, "
+           "MAX(score_max) AS hi FROM engagement_rollup WHERE course = ? AND metric = ? AND resolution = ?")
+    params = [str(course), metric, resolution]
+    if since is not None:
+        sql += " AND bucket >= ?"
+        params.append(since - since % resolution)
+    if student is not None:
+        sql += " AND student = ?"
+        params.append(str(student))
+    if module is not None:
+        sql += " AND module = ?"
+        params.append(str(module))
+    conn = _connect()
+    try:
+        rows = conn.execute(sql + " GROUP BY bucket ORDER BY bucket", params).fetchall()
+    finally:
+        conn.close()
+    return [
+        {
+            "bucket": row["bucket"],
+            "count": row["n"],
+            "average": round(row["total"] / row["n"], 2),
+            "min": round(row["lo"], 2),
+            "max": round(row["hi"], 2),
+        }
+        for row in rows
+    ]
+
+
+def course_overview(course, metric="engagement"):
+    """Course-wide figures plus per-module and per-student breakdowns from the series rows."""
+    rows = _series_rows(course, metric)
+
+    def combine(items):
+        count = sum(row["sample_count"] for row in items)
+        current = [row["ema"] for row in items if row["sample_count"]]
+        emotions = {}
+        for row in items:
+            for emotion, n in json.loads(row["emotion_counts"]).items():
+                emotions[emotion] = emotions.get(emotion, 0) + n
+        return {
+            "sample_count": count,
+            "average": round(sum(row["score_sum"] for row in items) / count, 2) if count else None,
+            "current": round(sum(current) / len(current), 2) if current else None,  # mean of per-series EMAs
+            "emotion_distribution": emotions,
+            "last_seen": max((row["last_ts"] for row in items), default=None),
+        }
+
+    by_module, by_student = {}, {}
+    for row in rows:
+        by_module.setdefault(row["module"], []).append(row)
+        by_student.setdefault(row["student"], []).append(row)
+
+    overview = combine(rows)
+    overview["modules"] = [dict(combine(items), module=module) for module, items in sorted(by_module.items())]
+    overview["students"] = [dict(combine(items), student=student) for student, items in sorted(by_student.items())]
+    return overview
@@ -0,0 +1,66 @@
+"""
+Set-based bulk enrollment and exam assignment.
+
+Instead of a `get_or_create` per student (two queries each), the missing
+(student, course/exam) pairs are computed with one query and inserted with
+`bulk_create(ignore_conflicts=True)` in chunks inside a transaction. Created
+counts are taken from the table itself, so they stay accurate when a
+concurrent request inserts some of the same rows.
+"""
+from django.db import transaction
+
+from .analytics import refresh_exam_rollup
+from .models import StudentProfile, Enrollment, ExamAssignment
+
+BULK_CHUNK_SIZE = 1000
+
+
+def cohort_filters(request, data=None):
+    """Read cohort filters (department, roll_prefix) from the JSON body or query string."""
+    data = data or {}
+    return {
+        'department': data.get('department') or request.GET.get('department'),
+        'roll_prefix': data.get('roll_prefix') or request.GET.get('roll_prefix'),
+    }
+
+
+def cohort_queryset(student_ids=None, department=None, roll_prefix=None, base=None):
+    """StudentProfile queryset narrowed by explicit ids and/or cohort filters."""
+    qs = base if base is not None else StudentProfile.objects.all()
+    if student_ids:
+        qs = qs.filter(id__in=student_ids)
+    if department:
+        qs = qs.filter(department__iexact=department)
+    if roll_prefix:
+        qs = qs.filter(roll_number__istartswith=roll_prefix)
+    return qs
+
+
+def _bulk_link(model, target_field, target, students, chunk_size=BULK_CHUNK_SIZE):
+    """Link every student in `students` to `target`; returns (created, total_linked)."""
+    links = model.objects.filter(**{target_field: target})
+    with transaction.atomic():
+        before = links.count()
+        missing = list(
+            students.exclude(id__in=links.values('student_id')).values_list('id', flat=True).distinct()
+        )
+        for start in range(0, len(missing), chunk_size):
+            model.objects.bulk_create(
+                [model(student_id=sid, **{target_field: target}) for sid in missing[start:start + chunk_size]],
+                ignore_conflicts=True,
+            )
+        total = links.count() if missing else before
+    return total - before, total
+
+
+def enroll_students(course, students, chunk_size=BULK_CHUNK_SIZE):
+    """Enroll a StudentProfile queryset in a course; returns (created, total_enrolled)."""
+    return _bulk_link(Enrollment, 'course', course, students, chunk_size)
+
+
+def assign_exam(exam, students, chunk_size=BULK_CHUNK_SIZE):
+    """Assign an exam to a StudentProfile queryset; returns (created, total_assigned)."""
+    created, total = _bulk_link(ExamAssignment, 'exam', exam, students, chunk_size)
+    if created:
+        refresh_exam_rollup(exam.id)
+    return created, total
@@ -0,0 +1,157 @@
+"""
+Pre-built exam paper snapshots.
+
+The student-facing `Exam -> Question -> TestCase` tree is serialised once per
+exam version into an immutable snapshot (JSON + gzip + ETag). It is stored in
+`exam_papers/{exam_id}.json.gz` and kept in a per-process memory cache. At exam
+start every student fetch is then a cache hit plus a conditional-GET check.
+
+Snapshots are dropped and rebuilt by the signals in `monitor.signals` whenever
+an exam, one of its questions or a test case changes. Question JSON fragments
+are kept separately, so per-student shuffling is a string join in a seeded
+order rather than a re-serialisation.
+"""
+import gzip
+import hashlib
+import json
+import random
+import threading
+from pathlib import Path
+
+from .models import Exam, Question
+from .singleflight import atomic_write_bytes, single_flight
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
+PAPERS_DIR = BASE_DIR / "exam_papers"
+PAPERS_DIR.mkdir(exist_ok=True)
+
+_cache = {}  # exam_id -> (file mtime_ns, ExamPaper)
+_cache_lock = threading.Lock()
+
+
+def student_question_payload(q):
+    """Question as shown to a student: no answer key, only sample test cases."""
+    question_data = {
+        'id': q.id,
+        'question_type': q.question_type,
+        'question_text': q.question_text,
+        'marks': q.marks,
+        'order': q.order,
+    }
+
+    if q.question_type == 'mcq':
+        question_data['options'] = [q.option_a, q.option_b, q.option_c, q.option_d]
+    elif q.question_type == 'coding':
+        question_data['programming_language'] = q.programming_language
+        question_data['starter_code'] = q.starter_code
+        question_data['test_cases'] = [
+            {
+                'input_data': tc.input_data,
+                'expected_output': tc.expected_output,
+                'is_sample': tc.is_sample
+            }
+            for tc in q.test_cases.all()
+            if tc.is_sample
+        ]
+    return question_data
+
+
+class ExamPaper:
+    """Immutable, pre-serialised student view of one exam version."""
+    __slots__ = ("exam_id", "shuffle", "header", "fragments", "body", "gzipped", "etag")
+
+    def __init__(self, exam_id, shuffle, header, fragments):
+        self.exam_id = exam_id
+        self.shuffle = shuffle
+        self.header = header            # JSON object text without the closing brace
+        self.fragments = fragments      # one JSON text per question, in paper order
+        self.body = self._assemble(fragments)
+        self.gzipped = gzip.compress(self.body, compresslevel=6)
+        self.etag = '"%s"' % hashlib.sha256(self.body).hexdigest()[:32]
+
+    def _assemble(self, fragments):
+        return (self.header + ', "questions": [' + ", ".join(fragments) + "]}").encode("utf-8")
+
+    def to_file_dict(self):
+        return {"exam_id": self.exam_id, "shuffle": self.shuffle, "header": self.header, "fragments": self.fragments}
+
+    @classmethod
+    def from_file_dict(cls, data):
+        return cls(data["exam_id"], data["shuffle"], data["header"], data["fragments"])
+
+    def for_student(self, roll_number):
+        """(body bytes, etag) for a student; shuffled deterministically per student if enabled."""
+        if not self.shuffle or len(self.fragments) < 2:
+            return self.body, self.etag
+        seed = int(hashlib.sha256(f"{self.etag}:{roll_number}".encode("utf-8")).hexdigest()[:16], 16)
+        order = list(range(len(self.fragments)))
+        random.Random(seed).shuffle(order)
+        body = self._assemble([self.fragments[i] for i in order])
+        return body, '"%s-%x"' % (self.etag.strip('"'), seed & 0xFFFFFFFF)
+
+
+def _paper_path(exam_id):
+    return PAPERS_DIR / f"{exam_id}.json.gz"
+
+
+def build_paper(exam_id):
+    """Serialise an exam (3 queries) into an ExamPaper and persist it."""
+    exam = Exam.objects.get(id=exam_id)
+    questions = Question.objects.filter(exam_id=exam_id).prefetch_related('test_cases')
+    header = json.dumps({
+        'exam_id': exam.id,
+        'title': exam.title,
+        'duration_minutes': exam.duration_minutes,
+        'total_marks': exam.total_marks,
+        'shuffle_questions': exam.shuffle_questions,
+    })[:-1]
+    fragments = [json.dumps(student_question_payload(q)) for q in questions]
+    paper = ExamPaper(exam.id, exam.shuffle_questions, header, fragments)
+
+    atomic_write_bytes(_paper_path(exam_id), gzip.compress(json.dumps(paper.to_file_dict()).encode("utf-8")))
+    return paper
+
+
+def _read_paper(path):
+    return ExamPaper.from_file_dict(json.loads(gzip.decompress(path.read_bytes())))
+
+
+def get_paper(exam_id):
+    """Cached ExamPaper; built at most once per exam version across workers."""
+    path = _paper_path(exam_id)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    paper = None
+    if mtime is not None:
+        with _cache_lock:
+            cached = _cache.get(exam_id)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            paper = _read_paper(path)
+        except Exception as e:
+            print(f"Rebuilding unreadable exam paper {exam_id}: {e}")
+
+    if paper is None:
+        def recheck():
+            return _read_paper(path) if path.exists() else None
+
+        paper = single_flight(f"exam-paper:{exam_id}", lambda: build_paper(exam_id), recheck=recheck)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:  # invalidated while building; serve it but don't cache
+            return paper
+
+    with _cache_lock:
+        _cache[exam_id] = (mtime, paper)
+    return paper
+
+
+def invalidate_paper(exam_id):
+    """Drop the snapshot for an exam; the next fetch (or a publish) rebuilds it."""
+    with _cache_lock:
+        _cache.pop(exam_id, None)
+    _paper_path(exam_id).unlink(missing_ok=True)
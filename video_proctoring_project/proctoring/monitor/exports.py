@@ -0,0 +1,255 @@
+"""
+Streaming exam result exports (CSV, gzipped CSV, XLSX).
+
+Rows come from one joined query over assignments -> student -> attempt,
+read with `iterator(chunk_size=...)` (a server-side cursor on PostgreSQL).
+Per-question answers come from a second cursor in the same student order and
+are merged in as rows stream. Nothing holds the whole cohort in memory.
+
+The XLSX writer is a minimal SpreadsheetML package written through `zipfile`
+into a non-seekable sink that is drained after every batch of rows, so it
+streams in constant memory with no extra dependency.
+"""
+import csv
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from django.db.models import Count, FilteredRelation, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Event, ExamAssignment, Question, StudentAnswer
+
+CHUNK_SIZE = 2000        # rows fetched per cursor round trip
+FLUSH_ROWS = 500         # rows buffered before a chunk is yielded
+COMPLETED_STATUSES = ['submitted', 'evaluated']
+
+BASE_HEADER = ['Student Name', 'Roll Number', 'Status', 'Score', 'Percentage', 'Passed', 'Submitted At']
+PROCTORING_HEADER = ['Time Taken (min)', 'Tab Switches', 'Violations', 'Proctoring Events']
+
+
+# ------------------------------
+# Rows
+# ------------------------------
+def _assignment_rows(exam, include_proctoring):
+    qs = (
+        ExamAssignment.objects.filter(exam=exam)
+        .annotate(attempt=FilteredRelation('student__exam_attempts', condition=Q(student__exam_attempts__exam=exam)))
+        .order_by('student_id')
+    )
+    fields = [
+        'student_id', 'student__full_name', 'student__roll_number', 'attempt__status', 'attempt__score',
+        'attempt__percentage', 'attempt__passed', 'attempt__submitted_at',
+    ]
+    if include_proctoring:
+        # Live-monitoring events are recorded against the Candidate with the same roll number
+        events = (
+            Event.objects.filter(session__candidate__roll_number=OuterRef('student__roll_number'))
+            .order_by().values('session__candidate__roll_number').annotate(n=Count('id')).values('n')
+        )
+        qs = qs.annotate(event_count=Coalesce(Subquery(events), 0))
+        fields += ['attempt__started_at', 'attempt__tab_switches', 'attempt__suspicious_activities', 'event_count']
+    return qs.values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _answer_rows(exam):
+    """(student_id, {question_id: (answer text, marks)}) per student, in student order."""
+    answers = (
+        StudentAnswer.objects.filter(attempt__exam=exam, attempt__status__in=COMPLETED_STATUSES)
+        .order_by('attempt__student_id')
+        .values_list(
+            'attempt__student_id', 'question_id', 'question__question_type', 'selected_option',
+            'test_cases_passed', 'total_test_cases', 'marks_obtained',
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    current, bucket = None, {}
+    for student_id, question_id, question_type, selected, passed, total, marks in answers:
+        if student_id != current:
+            if current is not None:
+                yield current, bucket
+            current, bucket = student_id, {}
+        if question_type == 'mcq':
+            text = selected or ''
+        else:
+            text = f"{passed}/{total} tests" if total else ''
+        bucket[question_id] = (text, marks)
+    if current is not None:
+        yield current, bucket
+
+
+def result_rows(exam, include_answers=False, include_proctoring=False):
+    """(header, row iterator) for an exam's results; rows keep the original CSV formatting."""
+    header = list(BASE_HEADER)
+    questions = []
+    if include_proctoring:
+        header += PROCTORING_HEADER
+    if include_answers:
+        questions = list(Question.objects.filter(exam=exam).order_by('order', 'id').values_list('id', 'order'))
+        for _, order in questions:
+            header += [f'Q{order} Answer', f'Q{order} Marks']
+
+    def rows():
+        answers = _answer_rows(exam) if include_answers else iter(())
+        pending = next(answers, None)
+        for row in _assignment_rows(exam, include_proctoring):
+            student_id, name, roll, status, score, percentage, passed, submitted_at = row[:8]
+            completed = status in COMPLETED_STATUSES
+            if completed:
+                out = [
+                    name,
+                    roll,
+                    'Completed',
+                    score or 'N/A',
+                    f"{percentage}%" if percentage else 'N/A',
+                    'Yes' if passed else 'No' if passed is not None else 'N/A',
+                    submitted_at.strftime('%Y-%m-%d %H:%M:%S') if submitted_at else '',
+                ]
+            else:
+                out = [name, roll, 'Not Completed', 'N/A', 'N/A', 'N/A', '']
+
+            if include_proctoring:
+                started_at, tab_switches, violations, events = row[8:]
+                minutes = ''
+                if completed and started_at and submitted_at:
+                    minutes = round((submitted_at - started_at).total_seconds() / 60, 1)
+                out += [minutes, tab_switches or 0, violations or 0, events]
+
+            if include_answers:
+                # Answer stream is ordered by student id too: advance it to this student
+                while pending is not None and pending[0] < student_id:
+                    pending = next(answers, None)
+                bucket = pending[1] if pending is not None and pending[0] == student_id else {}
+                for question_id, _ in questions:
+                    text, marks = bucket.get(question_id, ('', ''))
+                    out += [text, marks]
+            yield out
+
+    return header, rows()
+
+
+# ------------------------------
+# CSV
+# ------------------------------
+class _Buffer:
+    """Write target that just collects what csv.writer / zipfile give it."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        self.parts.append(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self):  # zipfile bookkeeping; no seek() so it streams with data descriptors
+        return self.size
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.parts = self.parts, []
+        return data
+
+
+def stream_csv(header, rows, compress=False):
+    """Yield CSV bytes (gzip-compressed if `compress`) in batches of FLUSH_ROWS rows."""
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31 -> gzip container
+
+    def encode(parts):
+        data = "".join(parts).encode("utf-8")
+        return gzip.compress(data) if gzip else data
+
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % FLUSH_ROWS == 0:
+            chunk = encode(buffer.drain())
+            if chunk:
+                yield chunk
+    chunk = encode(buffer.drain())
+    if gzip:
+        chunk += gzip.flush()
+    if chunk:
+        yield chunk
+
+
+# ------------------------------
+# XLSX
+# ------------------------------
+_XLSX_STATIC = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+
+# XML 1.0 forbids most control characters; drop them rather than emit a broken sheet
+_XML_ILLEGAL = dict.fromkeys(c for c in range(32) if c not in (9, 10, 13))
+
+
+def _xlsx_cell(value):
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(str(value).translate(_XML_ILLEGAL))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(row):
+    return "<row>" + "".join(_xlsx_cell(value) for value in row) + "</row>"
+
+
+def stream_xlsx(header, rows, sheet_name="Results"):
+    """Yield a single-sheet .xlsx workbook as bytes, FLUSH_ROWS rows at a time."""
+    sink = _Buffer()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as package:
+        for name, content in _XLSX_STATIC.items():
+            package.writestr(name, content)
+        package.writestr("xl/workbook.xml", _WORKBOOK.format(name=escape(sheet_name[:31], {'"': "&quot;"})))
+
+        with package.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(header).encode("utf-8"))
+            for count, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row(row).encode("utf-8"))
+                if count % FLUSH_ROWS == 0:
+                    yield b"".join(sink.drain())
+            sheet.write(b"</sheetData></worksheet>")
+    yield b"".join(sink.drain())
@@ -0,0 +1,226 @@
+"""
+Pluggable face detectors.
+
+A detector is any object with `name` and
+`detect(image, gray=None, scale=1.0) -> [(x, y, w, h)]`, where `image` is
+BGR and `gray` an optional precomputed grayscale copy. `scale` says how much
+the image was already shrunk, so minimum face sizes given in original frame
+pixels still mean the same thing.
+
+Detectors are chosen by a spec string, NAME[@MAX_SIDE]:
+    haar          OpenCV Haar cascade (frontal faces only)
+    yunet         OpenCV's YuNet CNN via cv2.FaceDetectorYN (needs the ONNX model,
+                  see YUNET_MODEL_PATH); also finds turned / partly profile faces
+    NAME@480      run NAME on a copy with the long side at most 480 px and map
+                  the boxes back (@0 = full resolution)
+
+FACE_DETECTOR (env) picks the detector used by the vision pipeline; the
+default is Haar at frame_hints.DETECT_MAX_SIDE. If it cannot be built (no
+CascadeClassifier in this OpenCV build, missing YuNet model) the other
+detector is tried; if none works, face stages raise and the endpoints answer
+503. Compare detectors on real frames with `manage.py benchmark_face_detectors`
+before changing it.
+"""
+import os
+import threading
+from pathlib import Path
+
+from . import frame_hints
+from .lazy_imports import lazy_module
+
+cv2 = lazy_module("cv2")
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
+YUNET_MODEL_PATH = Path(os.getenv(
+    "YUNET_MODEL_PATH", str(BASE_DIR / "models" / "face_detection_yunet_2023mar.onnx")
+))
+YUNET_MODEL_URL = (
+    "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx"
+)
+
+# Shared detection settings (min sizes are in original frame pixels)
+HAAR_SCALE_FACTOR = 1.1
+HAAR_MIN_NEIGHBORS = 5
+FACE_MIN_SIZE = (40, 40)
+YUNET_SCORE_THRESHOLD = 0.7
+YUNET_NMS_THRESHOLD = 0.3
+
+DEFAULT_SPEC = os.getenv("FACE_DETECTOR", f"haar@{frame_hints.DETECT_MAX_SIDE}")
+
+_default = None
+_default_error = None  # why no detector could be built; not retried per frame
+_default_lock = threading.Lock()
+
+
+class DetectorUnavailable(ValueError):
+    """Unknown detector name, or its model file / OpenCV support is missing."""
+
+
+def _scaled(size, scale):
+    return max(1, int(size[0] * scale)), max(1, int(size[1] * scale))
+
+
+# ------------------------------
+# Detectors
+# ------------------------------
+class HaarDetector:
+    name = "haar"
+
+    def __init__(self, scale_factor=HAAR_SCALE_FACTOR, min_neighbors=HAAR_MIN_NEIGHBORS, min_size=FACE_MIN_SIZE,
+                 cascade="haarcascade_frontalface_default.xml"):
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise DetectorUnavailable("This OpenCV build has no CascadeClassifier")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.cascade_path = cv2.data.haarcascades + cascade
+        self._local = threading.local()  # CascadeClassifier is not safe to share across threads
+
+    def _cascade(self):
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = self._local.cascade = cv2.CascadeClassifier(self.cascade_path)
+        return cascade
+
+    def detect(self, image, gray=None, scale=1.0):
+        if gray is None:
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        faces = self._cascade().detectMultiScale(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+            minSize=_scaled(self.min_size, scale),
+        )
+        return [tuple(int(v) for v in face) for face in faces]
+
+
+class YuNetDetector:
+    name = "yunet"
+
+    def __init__(self, model_path=None, score_threshold=YUNET_SCORE_THRESHOLD,
+                 nms_threshold=YUNET_NMS_THRESHOLD, top_k=50, min_size=FACE_MIN_SIZE):
+        self.model_path = Path(model_path or YUNET_MODEL_PATH)
+        if not hasattr(cv2, "FaceDetectorYN"):
+            raise DetectorUnavailable("YuNet needs OpenCV >= 4.5.4 (cv2.FaceDetectorYN)")
+        if not self.model_path.exists():
+            raise DetectorUnavailable(f"YuNet model not found at {self.model_path}; download it from {YUNET_MODEL_URL}")
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.top_k = top_k
+        self.min_size = min_size
+        self._local = threading.local()  # setInputSize mutates the net, so one per thread
+
+    def _net(self):
+        net = getattr(self._local, "net", None)
+        if net is None:
+            net = self._local.net = cv2.FaceDetectorYN.create(
+                str(self.model_path), "", (320, 320), self.score_threshold, self.nms_threshold, self.top_k
+            )
+        return net
+
+    def detect(self, image, gray=None, scale=1.0):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        h, w = image.shape[:2]
+        net = self._net()
+        net.setInputSize((w, h))
+        _, faces = net.detect(image)
+        if faces is None:
+            return []
+        min_w, min_h = _scaled(self.min_size, scale)
+        boxes = []
+        for face in faces:
+            x, y = max(0, int(face[0])), max(0, int(face[1]))
+            bw, bh = min(int(face[2]), w - x), min(int(face[3]), h - y)
+            if bw >= min_w and bh >= min_h:
+                boxes.append((x, y, bw, bh))
+        return boxes
+
+
+class DownscaledDetector:
+    """Runs `inner` on a copy whose long side is at most `max_side`, boxes mapped back."""
+
+    def __init__(self, inner, max_side):
+        self.inner = inner
+        self.max_side = max_side
+        self.name = f"{inner.name}@{max_side}"
+
+    def detect(self, image, gray=None, scale=1.0):
+        small, factor = frame_hints.downscale(image, self.max_side)
+        small_gray = None
+        if gray is not None:
+            small_gray = gray if factor == 1.0 else cv2.resize(
+                gray, (small.shape[1], small.shape[0]), interpolation=cv2.INTER_AREA
+            )
+        boxes = self.inner.detect(small, small_gray, scale * factor)
+        return [(int(x / factor), int(y / factor), int(w / factor), int(h / factor)) for x, y, w, h in boxes]
+
+
+DETECTORS = {"haar": HaarDetector, "yunet": YuNetDetector}
+
+
+def get_detector(spec, **options):
+    """Build a detector from a spec like 'haar', 'yunet@320'; options go to the base detector."""
+    name, _, max_side = spec.strip().lower().partition("@")
+    if name not in DETECTORS:
+        raise DetectorUnavailable(f"Unknown face detector '{name}' (choose from {', '.join(DETECTORS)})")
+    detector = DETECTORS[name](**options)
+    if max_side:
+        try:
+            max_side = int(max_side)
+        except ValueError:
+            raise DetectorUnavailable(f"Invalid max side in '{spec}'")
+        if max_side > 0:
+            detector = DownscaledDetector(detector, max_side)
+    return detector
+
+
+def default_detector():
+    """
+    The detector named by FACE_DETECTOR, falling back to the other detectors
+    (same max side) if it is unavailable.
+    Raises DetectorUnavailable if no detector can run on this server.
+    """
+    global _default, _default_error
+    with _default_lock:
+        if _default is None and _default_error is None:
+            name, _, max_side = DEFAULT_SPEC.strip().lower().partition("@")
+            max_side = max_side if max_side.isdigit() else str(frame_hints.DETECT_MAX_SIDE)
+            specs = [DEFAULT_SPEC] + [f"{other}@{max_side}" for other in DETECTORS if other != name]
+            errors = []
+            for spec in specs:
+                try:
+                    _default = get_detector(spec)
+                    break
+                except DetectorUnavailable as e:
+                    errors.append((spec, str(e)))
+            else:
+                _default_error = "No face detector available (" + "; ".join(f"{spec}: {e}" for spec, e in errors) + ")"
+                print(_default_error)
+            if _default is not None and errors:
+                print(f"Face detector '{errors[0][0]}' unavailable ({errors[0][1]}); using '{_default.name}'")
+        if _default is None:
+            raise DetectorUnavailable(_default_error)
+        return _default
+
+
+# ------------------------------
+# Scoring helpers (benchmarks)
+# ------------------------------
+def match_boxes(detected, reference, min_iou=0.5):
+    """Number of reference boxes matched one-to-one by a detected box (greedy by IoU)."""
+    pairs = sorted(
+        ((frame_hints.iou(d, r), i, j) for i, d in enumerate(detected) for j, r in enumerate(reference)),
+        reverse=True,
+    )
+    used_d, used_r = set(), set()
+    for overlap, i, j in pairs:
+        if overlap < min_iou:
+            break
+        if i not in used_d and j not in used_r:
+            used_d.add(i)
+            used_r.add(j)
+    return len(used_r)
+
+
+def count_bucket(boxes):
+    """Face count as the proctoring checks see it: 0, 1 or 2 (= several)."""
+    return min(len(boxes), 2)
@@ -0,0 +1,122 @@
+"""
+Client-hinted frames and reduced-resolution detection.
+
+Webcam endpoints accept an optional hint next to the (downscaled) frame:
+
+    face_crop  base64 JPEG/PNG of the face at the camera's full resolution
+    face_box   [x, y, w, h] of that crop, normalised to 0-1 of the frame
+
+The browser sends a small frame for detection, plus a sharp crop for the
+models that need detail (emotion, face embedding). Detectors always run on
+the frame, never trusting the box alone, at no more than DETECT_MAX_SIDE
+pixels on the long side (see face_detectors). Boxes are mapped back to
+frame coordinates.
+Proctoring checks only use a crop when its box overlaps a face the server
+found itself.
+"""
+import base64
+import json
+import os
+
+import numpy as np
+
+from .lazy_imports import lazy_module
+
+cv2 = lazy_module("cv2")
+
+DETECT_MAX_SIDE = int(os.getenv("VISION_DETECT_MAX_SIDE", 480))  # long side for face detection
+YOLO_IMGSZ = int(os.getenv("VISION_YOLO_IMGSZ", 416))            # YOLO input size (multiple of 32)
+MIN_CROP_IOU = 0.3        # client crop must overlap a detected face this much to be used for identity
+
+
+# ------------------------------
+# Decoding
+# ------------------------------
+def decode_b64(image_b64):
+    """Decode a base64 image (data URI allowed) into a BGR array, or None."""
+    try:
+        if not isinstance(image_b64, str) or not image_b64:
+            return None
+        if ',' in image_b64:
+            image_b64 = image_b64.split(',', 1)[1]
+        raw = base64.b64decode(image_b64)
+        return cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except Exception:
+        return None
+
+
+def parse_box(value):
+    """Normalised (x, y, w, h) from a list, {"x", "y", "w", "h"} dict or JSON string; None if invalid."""
+    try:
+        if isinstance(value, str):
+            value = json.loads(value)
+        if isinstance(value, dict):
+            value = [value.get('x'), value.get('y'), value.get('w', value.get('width')), value.get('h', value.get('height'))]
+        x, y, w, h = (float(v) for v in value)
+    except (TypeError, ValueError):
+        return None
+    if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > 1.001 or y + h > 1.001:
+        return None
+    return x, y, w, h
+
+
+class FrameHint:
+    """A client-supplied face crop and/or its normalised box."""
+
+    def __init__(self, crop=None, box=None):
+        self.crop = crop
+        self.box = box
+
+    def pixel_box(self, shape):
+        """The hint box in pixels of a frame with the given shape, or None."""
+        if self.box is None:
+            return None
+        h, w = shape[:2]
+        x, y, bw, bh = self.box
+        return int(x * w), int(y * h), max(1, int(bw * w)), max(1, int(bh * h))
+
+
+def read_hint(data):
+    """FrameHint from request data (JSON dict or QueryDict), or None when the client sent no hint."""
+    crop = decode_b64(data.get('face_crop')) if data.get('face_crop') else None
+    box = parse_box(data.get('face_box')) if data.get('face_box') else None
+    if crop is None and box is None:
+        return None
+    return FrameHint(crop, box)
+
+
+# ------------------------------
+# Detection
+# ------------------------------
+def downscale(img, max_side=None):
+    """(resized image, scale) with the long side at most `max_side`; scale <= 1."""
+    max_side = max_side or DETECT_MAX_SIDE
+    h, w = img.shape[:2]
+    scale = min(1.0, max_side / float(max(h, w)))
+    if scale >= 1.0:
+        return img, 1.0
+    return cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA), scale
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def crop_for_face(frame, face, hint=None):
+    """
+    Image to use for embedding/emotion of a detected `face`: the client's
+    high-res crop if its box overlaps that face, otherwise the face cut out of
+    the frame.
+    """
+    if hint is not None and hint.crop is not None:
+        box = hint.pixel_box(frame.shape)
+        if box is not None and iou(box, face) >= MIN_CROP_IOU:
+            return hint.crop
+    x, y, w, h = face
+    return frame[y:y + h, x:x + w]
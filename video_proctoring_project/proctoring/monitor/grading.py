@@ -0,0 +1,269 @@
+"""
+Bulk exam grading against a cached answer key.
+
+`submit_exam_attempt` used to run a get_or_create + save per question (and a
+test-case count per coding question). Grading is now done in memory against
+an answer key cached per exam (validated by a stamp file, so every worker sees
+invalidations from `monitor.signals`) and the StudentAnswer rows are written
+with one bulk_create and one bulk_update inside a transaction.
+
+Coding answers are judged out of band: submission queues a
+`monitor.judge_attempt` job that runs the code against every test case with
+`monitor.judge` and folds the marks into the attempt totals.
+"""
+import json
+import threading
+from pathlib import Path
+
+from django.db import transaction
+from django.db.models import Count
+
+from .analytics import refresh_exam_rollup
+from .models import ExamAttempt, Question, StudentAnswer, TestCase
+from .singleflight import atomic_write_json
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
+KEYS_DIR = BASE_DIR / "exam_papers"
+KEYS_DIR.mkdir(exist_ok=True)
+
+BULK_CHUNK_SIZE = 500
+
+_cache = {}  # exam_id -> (file mtime_ns, answer key)
+_cache_lock = threading.Lock()
+
+
+# ------------------------------
+# Answer key
+# ------------------------------
+def _key_path(exam_id):
+    return KEYS_DIR / f"{exam_id}.key.json"
+
+
+def build_answer_key(exam_id):
+    """List of {id, type, marks, correct, test_cases} for an exam (one query)."""
+    questions = (
+        Question.objects.filter(exam_id=exam_id)
+        .annotate(test_case_total=Count('test_cases'))
+        .values('id', 'question_type', 'marks', 'correct_option', 'test_case_total')
+    )
+    key = [
+        {
+            'id': q['id'],
+            'type': q['question_type'],
+            'marks': q['marks'] or 0,
+            'correct': (q['correct_option'] or '').strip().upper() or None,
+            'test_cases': q['test_case_total'],
+        }
+        for q in questions
+    ]
+    atomic_write_json(_key_path(exam_id), key)
+    return key
+
+
+def get_answer_key(exam_id):
+    """Answer key for an exam, cached per process and rebuilt after invalidation."""
+    path = _key_path(exam_id)
+    try:
+        mtime = path.stat().st_mtime_ns
+        with _cache_lock:
+            cached = _cache.get(exam_id)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'r', encoding='utf-8') as f:
+            key = json.load(f)
+    except FileNotFoundError:
+        key = build_answer_key(exam_id)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:  # invalidated meanwhile; use it once without caching
+            return key
+
+    with _cache_lock:
+        _cache[exam_id] = (mtime, key)
+    return key
+
+
+def invalidate_answer_key(exam_id):
+    with _cache_lock:
+        _cache.pop(exam_id, None)
+    _key_path(exam_id).unlink(missing_ok=True)
+
+
+# ------------------------------
+# Grading
+# ------------------------------
+def _lookup(answers, question_id):
+    return answers.get(str(question_id)) or answers.get(question_id)
+
+
+def grade_mcq(entry, selected_option):
+    if selected_option and entry['correct']:
+        is_correct = selected_option.strip().upper() == entry['correct']
+    else:
+        is_correct = False
+    return is_correct, (entry['marks'] if is_correct else 0)
+
+
+def save_graded_answers(attempt, key, mcq_answers, coding_answers):
+    """
+    Grade a submission in memory and upsert its StudentAnswer rows in bulk.
+    Returns (total_marks_obtained, total_possible_marks).
+    """
+    existing = {answer.question_id: answer for answer in StudentAnswer.objects.filter(attempt=attempt)}
+    to_create, to_update = [], []
+    total_marks_obtained = 0
+    total_possible_marks = 0
+
+    for entry in key:
+        total_possible_marks += entry['marks']
+        answer_obj = existing.get(entry['id'])
+        if answer_obj is None:
+            answer_obj = StudentAnswer(attempt=attempt, question_id=entry['id'])
+            to_create.append(answer_obj)
+        else:
+            to_update.append(answer_obj)
+
+        if entry['type'] == 'mcq':
+            selected_option = _lookup(mcq_answers, entry['id'])
+            answer_obj.selected_option = selected_option
+            answer_obj.is_correct, answer_obj.marks_obtained = grade_mcq(entry, selected_option)
+            total_marks_obtained += answer_obj.marks_obtained
+        else:
+            submitted_code = _lookup(coding_answers, entry['id'])
+            answer_obj.submitted_code = submitted_code
+            # Judged later by the judge_attempt job; pending until then
+            answer_obj.is_correct = None if submitted_code else False
+            answer_obj.marks_obtained = 0
+            # Store test case counts for UI clarity
+            answer_obj.total_test_cases = entry['test_cases']
+            answer_obj.test_cases_passed = 0
+
+    with transaction.atomic():
+        StudentAnswer.objects.bulk_create(to_create, batch_size=BULK_CHUNK_SIZE)
+        StudentAnswer.objects.bulk_update(
+            to_update,
+            ['selected_option', 'submitted_code', 'is_correct', 'marks_obtained', 'total_test_cases', 'test_cases_passed'],
+            batch_size=BULK_CHUNK_SIZE,
+        )
+    return total_marks_obtained, total_possible_marks
+
+
+def apply_attempt_totals(attempt, exam, total_marks_obtained):
+    attempt.total_marks_obtained = total_marks_obtained
+    attempt.score = total_marks_obtained
+    attempt.percentage = (total_marks_obtained / exam.total_marks * 100) if exam.total_marks else 0
+    attempt.passed = total_marks_obtained >= exam.passing_marks if exam.passing_marks is not None else None
+
+
+def regrade_exam(exam):
+    """
+    Re-grade every submitted attempt of an exam against the current answer key
+    (after a key change). Returns (attempts_regraded, answers_changed).
+    """
+    invalidate_answer_key(exam.id)
+    key = {entry['id']: entry for entry in get_answer_key(exam.id)}
+
+    attempts = {
+        attempt.id: attempt
+        for attempt in ExamAttempt.objects.filter(exam=exam, status__in=['submitted', 'evaluated'])
+    }
+    totals = dict.fromkeys(attempts, 0)
+    changed = []
+
+    answers = StudentAnswer.objects.filter(
+        attempt__exam=exam, attempt__status__in=['submitted', 'evaluated']
+    ).only(
+        'id', 'attempt_id', 'question_id', 'selected_option', 'is_correct', 'marks_obtained'
+    )
+    for answer in answers.iterator(chunk_size=2000):
+        entry = key.get(answer.question_id)
+        if entry is None:
+            continue
+        if entry['type'] != 'mcq':
+            # Coding marks come from the judge and are kept as they are
+            totals[answer.attempt_id] += answer.marks_obtained or 0
+            continue
+        is_correct, marks = grade_mcq(entry, answer.selected_option)
+        totals[answer.attempt_id] += marks
+        if answer.is_correct != is_correct or answer.marks_obtained != marks:
+            answer.is_correct, answer.marks_obtained = is_correct, marks
+            changed.append(answer)
+
+    for attempt_id, attempt in attempts.items():
+        apply_attempt_totals(attempt, exam, totals[attempt_id])
+
+    with transaction.atomic():
+        StudentAnswer.objects.bulk_update(changed, ['is_correct', 'marks_obtained'], batch_size=BULK_CHUNK_SIZE)
+        ExamAttempt.objects.bulk_update(
+            list(attempts.values()),
+            ['total_marks_obtained', 'score', 'percentage', 'passed'],
+            batch_size=BULK_CHUNK_SIZE,
+        )
+    refresh_exam_rollup(exam.id)
+    return len(attempts), len(changed)
+
+
+# ------------------------------
+# Coding answers
+# ------------------------------
+def queue_judging(attempt):
+    """Queue judging of an attempt's coding answers; returns the job id (or None if nothing to judge)."""
+    from . import jobs
+
+    if not StudentAnswer.objects.filter(
+        attempt=attempt, question__question_type='coding', submitted_code__gt=''
+    ).exists():
+        return None
+    return jobs.submit("monitor.judge_attempt", {"attempt_id": attempt.id}, dedupe_key=f"judge:{attempt.id}")
+
+
+def judge_attempt(attempt_id, job=None):
+    """
+    Run every submitted coding answer of an attempt against its test cases,
+    store passed counts and proportional marks, and refresh the attempt totals.
+    Returns {"answers_judged", "marks_obtained"}.
+    """
+    from .judge import judge_many
+
+    attempt = ExamAttempt.objects.select_related('exam').get(id=attempt_id)
+    answers = list(
+        StudentAnswer.objects.filter(attempt=attempt, question__question_type='coding', submitted_code__gt='')
+        .select_related('question')
+    )
+    test_cases = {}
+    for tc in TestCase.objects.filter(question_id__in=[a.question_id for a in answers]).order_by('question_id', 'order'):
+        test_cases.setdefault(tc.question_id, []).append(
+            {'id': tc.id, 'input': tc.input_data, 'expected': tc.expected_output}
+        )
+
+    judged = [a for a in answers if test_cases.get(a.question_id)]
+    if job:
+        job.progress(0.1, f"Judging {len(judged)} coding answers")
+    results = judge_many([
+        (a.question.programming_language, a.submitted_code, test_cases[a.question_id]) for a in judged
+    ])
+
+    for answer, tests in zip(judged, results):
+        if any(t['status'] == 'unsupported' for t in tests):
+            print(f"Skipping answer {answer.id}: {tests[0]['stderr']}")
+            continue  # left pending for manual marking
+        passed = sum(1 for t in tests if t['passed'])
+        answer.total_test_cases = len(tests)
+        answer.test_cases_passed = passed
+        answer.is_correct = passed == len(tests)
+        answer.marks_obtained = round((answer.question.marks or 0) * passed / len(tests), 2)
+
+    with transaction.atomic():
+        StudentAnswer.objects.bulk_update(
+            judged, ['is_correct', 'marks_obtained', 'total_test_cases', 'test_cases_passed'], batch_size=BULK_CHUNK_SIZE
+        )
+        total = sum(StudentAnswer.objects.filter(attempt=attempt).values_list('marks_obtained', flat=True))
+        apply_attempt_totals(attempt, attempt.exam, total)
+        attempt.save(update_fields=['total_marks_obtained', 'score', 'percentage', 'passed'])
+        refresh_exam_rollup(attempt.exam_id)
+    return {"answers_judged": len(judged), "marks_obtained": total}
+
+
+def judge_attempt_job(payload, job):
+    """jobs.py handler for "monitor.judge_attempt"."""
+    return judge_attempt(payload["attempt_id"], job)
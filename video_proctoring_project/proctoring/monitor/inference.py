@@ -0,0 +1,264 @@
+"""
+Inference backends for the vision models.
+
+    native  YOLO through ultralytics (PyTorch); Facenet and the emotion, age
+            and gender networks through DeepFace's Keras models (TensorFlow)
+    onnx    the same networks exported to ONNX (`manage.py export_onnx_models`)
+            and run by onnxruntime on CPU. Neither torch nor tensorflow is
+            imported. INFERENCE_QUANTIZED=1 loads the int8 `*.int8.onnx` files.
+
+INFERENCE_BACKEND (env) picks the backend. Both backends take the same
+preprocessed input and return the same output, so callers never branch:
+
+    load('emotion' | 'age' | 'gender' | 'facenet').predict(batch) -> ndarray
+        `batch` is a float32 NHWC array built with the preprocessing helpers below
+    load('yolo').detect(image_bgr, imgsz, conf, classes=None) -> [(label, confidence, [x1, y1, x2, y2])]
+        `classes` optionally restricts detection to these labels (e.g. 'cell phone')
+
+Models are loaded on first use and shared by every thread in the process.
+monitor/tests.py compares the two backends on the stored evidence frames.
+"""
+import ast
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .lazy_imports import lazy_module
+
+cv2 = lazy_module("cv2")
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
+BACKEND = os.getenv("INFERENCE_BACKEND", "native").lower()
+QUANTIZED = os.getenv("INFERENCE_QUANTIZED", "0") == "1"
+ONNX_MODEL_DIR = Path(os.getenv("ONNX_MODEL_DIR", str(BASE_DIR / "models")))
+ORT_THREADS = int(os.getenv("ORT_THREADS", 0))     # 0 = onnxruntime's default
+YOLO_MODEL_PATH = os.getenv("YOLO_MODEL_PATH", "yolov8n.pt")
+YOLO_IOU = 0.7                                     # ultralytics' default NMS threshold
+YOLO_MAX_DET = 300
+
+BACKENDS = ('native', 'onnx')
+KERAS_MODELS = {  # name -> (DeepFace model name, DeepFace task)
+    'facenet': ('Facenet', 'facial_recognition'),
+    'emotion': ('Emotion', 'facial_attribute'),
+    'age': ('Age', 'facial_attribute'),
+    'gender': ('Gender', 'facial_attribute'),
+}
+MODELS = ('yolo',) + tuple(KERAS_MODELS)
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+class BackendUnavailable(RuntimeError):
+    """Unknown backend, or the runtime / exported model file is missing."""
+
+
+def onnx_path(name, quantized=None):
+    quantized = QUANTIZED if quantized is None else quantized
+    stem = Path(YOLO_MODEL_PATH).stem if name == 'yolo' else name
+    return ONNX_MODEL_DIR / (f"{stem}.int8.onnx" if quantized else f"{stem}.onnx")
+
+
+# ------------------------------
+# Preprocessing (shared by both backends)
+# ------------------------------
+def resize_with_pad(img, size):
+    """Fit `img` inside size x size keeping aspect ratio, zero padded (DeepFace style)."""
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    resized = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))))
+    pad_h, pad_w = size - resized.shape[0], size - resized.shape[1]
+    top, left = pad_h // 2, pad_w // 2
+    return cv2.copyMakeBorder(resized, top, pad_h - top, left, pad_w - left, cv2.BORDER_CONSTANT, value=0)
+
+
+def emotion_input(crop_bgr):
+    gray = cv2.cvtColor(crop_bgr, cv2.COLOR_BGR2GRAY)
+    return (cv2.resize(gray, (48, 48)).astype(np.float32) / 255.0)[:, :, np.newaxis]
+
+
+def face_input(crop_bgr, size=224):
+    """RGB, padded to size x size, 0-1: VGG-Face (age, gender) at 224, Facenet at 160."""
+    rgb = cv2.cvtColor(resize_with_pad(crop_bgr, size), cv2.COLOR_BGR2RGB)
+    return rgb.astype(np.float32) / 255.0
+
+
+def facenet_input(crop_bgr):
+    return face_input(crop_bgr, 160)
+
+
+def letterbox(image, size):
+    """
+    Resize + pad a BGR image to `size` (h, w) the way ultralytics does.
+    Returns the NCHW float32 RGB tensor, the scale and the (left, top) padding.
+    """
+    h, w = image.shape[:2]
+    scale = min(size[0] / h, size[1] / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (w, h) else image
+    left, top = (size[1] - new_w) // 2, (size[0] - new_h) // 2
+    padded = cv2.copyMakeBorder(resized, top, size[0] - new_h - top, left, size[1] - new_w - left,
+                                cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    tensor = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[np.newaxis].astype(np.float32) / 255.0
+    return tensor, scale, (left, top)
+
+
+def class_ids(names, labels):
+    """Class ids in a {id: label} map for the given labels; None means every class."""
+    if labels is None:
+        return None
+    wanted = {label.lower() for label in labels}
+    return sorted(i for i, name in names.items() if name.lower() in wanted)
+
+
+# ------------------------------
+# Native backend
+# ------------------------------
+class KerasModel:
+    def __init__(self, name):
+        from deepface import DeepFace
+        model_name, task = KERAS_MODELS[name]
+        try:
+            client = DeepFace.build_model(model_name=model_name, task=task)
+        except TypeError:  # deepface < 0.0.93
+            client = DeepFace.build_model(model_name)
+        # Newer releases wrap the Keras model in a client object; batch through the Keras model
+        self.model = getattr(client, 'model', client)
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict(np.asarray(batch, dtype=np.float32), verbose=0))
+
+
+class UltralyticsDetector:
+    def __init__(self):
+        from ultralytics import YOLO
+        self.model = YOLO(YOLO_MODEL_PATH)  # YOLOv8n pretrained on COCO: small, fast version
+
+    @property
+    def names(self):
+        return self.model.model.names
+
+    def detect(self, image, imgsz, conf, classes=None):
+        ids = class_ids(self.names, classes)
+        if ids == []:
+            return []
+        detections = []
+        for r in self.model.predict(image, imgsz=imgsz, conf=conf, classes=ids, verbose=False):
+            if r.boxes is None or len(r.boxes) == 0:
+                continue
+            for box, cls_id, score in zip(r.boxes.xyxy, r.boxes.cls, r.boxes.conf):
+                detections.append((
+                    self.names[int(cls_id)].lower(), float(score), [int(c) for c in box]
+                ))
+        return detections
+
+
+# ------------------------------
+# ONNX backend
+# ------------------------------
+def _onnx_session(name, quantized=None):
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise BackendUnavailable("onnxruntime is not installed (pip install onnxruntime)")
+    path = onnx_path(name, quantized)
+    if not path.exists():
+        raise BackendUnavailable(f"{path} not found; run `manage.py export_onnx_models`")
+    options = ort.SessionOptions()
+    if ORT_THREADS:
+        options.intra_op_num_threads = ORT_THREADS
+    return ort.InferenceSession(str(path), sess_options=options, providers=["CPUExecutionProvider"])
+
+
+class OnnxModel:
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self.input_name: np.asarray(batch, dtype=np.float32)})[0]
+
+
+class OnnxDetector:
+    """YOLOv8 exported by ultralytics: one (1, 4 + classes, anchors) output in letterboxed pixels."""
+
+    def __init__(self, session, names=None):
+        self.session = session
+        model_input = session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Static exports fix the input size; dynamic ones take the caller's imgsz
+        shape = model_input.shape
+        self.fixed_size = (shape[2], shape[3]) if all(isinstance(d, int) for d in shape[2:4]) else None
+        if names is None:
+            meta = session.get_modelmeta().custom_metadata_map
+            if 'names' not in meta:
+                raise BackendUnavailable("YOLO ONNX model has no class names; re-export it with ultralytics")
+            names = ast.literal_eval(meta['names'])
+        self.names = {int(k): v.lower() for k, v in dict(names).items()}
+
+    def detect(self, image, imgsz, conf, classes=None):
+        size = self.fixed_size or (imgsz, imgsz)
+        tensor, scale, (left, top) = letterbox(image, size)
+        output = self.session.run(None, {self.input_name: tensor})[0][0].T  # (anchors, 4 + classes)
+
+        scores = output[:, 4:]
+        ids = class_ids(self.names, classes)
+        if ids is not None:
+            if not ids:
+                return []
+            scores = scores[:, ids]  # only score the wanted classes
+        best = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), best]
+        keep = confidences >= conf
+        if not keep.any():
+            return []
+        labels = best[keep] if ids is None else np.asarray(ids)[best[keep]]
+        boxes, confidences = output[keep, :4], confidences[keep]
+
+        # cx, cy, w, h in letterboxed pixels -> x1, y1, x2, y2 in image pixels
+        h, w = image.shape[:2]
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - left) / scale
+        xyxy[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - top) / scale
+        xyxy[:, 2] = (boxes[:, 0] + boxes[:, 2] / 2 - left) / scale
+        xyxy[:, 3] = (boxes[:, 1] + boxes[:, 3] / 2 - top) / scale
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+
+        # Per-class NMS: shift each class into its own region so boxes of different classes never overlap
+        offset = labels[:, None].astype(np.float32) * (max(h, w) + 1)
+        shifted = xyxy + offset
+        rects = np.column_stack([shifted[:, 0], shifted[:, 1], shifted[:, 2] - shifted[:, 0], shifted[:, 3] - shifted[:, 1]])
+        kept = cv2.dnn.NMSBoxes(rects.tolist(), confidences.tolist(), conf, YOLO_IOU)
+        kept = np.array(kept).reshape(-1)[:YOLO_MAX_DET]
+        return [
+            (self.names.get(int(labels[i]), str(int(labels[i]))), float(confidences[i]), [int(c) for c in xyxy[i]])
+            for i in sorted(kept, key=lambda i: -confidences[i])
+        ]
+
+
+# ------------------------------
+# Loading
+# ------------------------------
+def _build(name, backend, quantized):
+    if backend == 'native':
+        return UltralyticsDetector() if name == 'yolo' else KerasModel(name)
+    session = _onnx_session(name, quantized)
+    return OnnxDetector(session) if name == 'yolo' else OnnxModel(session)
+
+
+def load(name, backend=None, quantized=None):
+    """The model `name` (see MODELS) on `backend` (default INFERENCE_BACKEND), loaded once per process."""
+    backend = (backend or BACKEND).lower()
+    if backend not in BACKENDS:
+        raise BackendUnavailable(f"Unknown inference backend '{backend}' (choose from {', '.join(BACKENDS)})")
+    if name not in MODELS:
+        raise BackendUnavailable(f"Unknown model '{name}' (choose from {', '.join(MODELS)})")
+    quantized = QUANTIZED if quantized is None else quantized
+    key = (name, backend, bool(quantized) and backend == 'onnx')
+    with _models_lock:
+        if key not in _models:
+            _models[key] = _build(name, backend, quantized)
+        return _models[key]
@@ -0,0 +1,340 @@
+"""
+Warm interpreter pool for the "Run" button.
+
+`execute_code` used to write a temp file and cold-start `node` on every click.
+This module keeps a few long-lived runner processes per language and per web
+worker. Each runner reads one JSON request per line on stdin and answers with
+one JSON line on stdout, so a run costs a pipe round trip instead of an
+interpreter start.
+
+- Python runner: a fork server. It imports the common stdlib once, then
+  forks a fresh child per request. The child gets rlimits (CPU, memory, file
+  size), stdin/stdout wired to buffers and its own globals, so runs can't see
+  each other. The server kills the child at the wall budget.
+- JavaScript runner: one node process that starts a fresh worker thread per
+  request. The worker runs the snippet in a new `vm` context with a timeout,
+  with string code generation disabled, and with no host objects inside.
+  The context defines its own console and hands back only strings.
+
+Runners are confined by `monitor.sandbox` (scratch directory only, no network,
+an unprivileged uid when the worker is root) and get a stripped environment.
+They are recycled after MAX_RUNS requests or after any violation (timeout,
+crash, protocol error).
+"""
+import atexit
+import json
+import os
+import queue
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from . import sandbox
+from .judge import normalize_language
+
+POOL_SIZE = int(os.getenv("INTERPRETER_POOL_SIZE", os.cpu_count() or 2))  # runners per language per process
+MAX_RUNS = int(os.getenv("INTERPRETER_MAX_RUNS", 200))                     # recycle a runner after this many runs
+WALL_TIMEOUT = 5           # seconds per run
+CPU_LIMIT = 4              # CPU seconds per run (Python children)
+MEMORY_LIMIT = 256 * 1024 * 1024
+OUTPUT_LIMIT = 64 * 1024   # characters of output kept
+ACQUIRE_TIMEOUT = 10       # max wait for a free runner before reporting busy
+GRACE = 2                  # extra seconds before the pool gives up on a runner
+
+# Fork server: never runs user code itself, so it stays clean between runs.
+_PYTHON_SERVER = r'''
+import io, json, os, resource, select, signal, sys, time, traceback
+import bisect, collections, functools, heapq, itertools, math, random, re, string  # warm for user code
+
+CPU_LIMIT, MEMORY_LIMIT, OUTPUT_LIMIT = map(int, sys.argv[1:4])
+
+
+def child(request, w):
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    resource.setrlimit(resource.RLIMIT_CPU, (CPU_LIMIT, CPU_LIMIT + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (MEMORY_LIMIT, MEMORY_LIMIT))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    out = io.StringIO()
+    sys.stdout = sys.stderr = out
+    sys.stdin = io.StringIO(request.get("stdin") or "")
+    sys.argv = ["main.py"]
+    status = "ok"
+    try:
+        exec(compile(request["code"], "main.py", "exec"), {"__name__": "__main__"})
+    except SystemExit:
+        pass
+    except BaseException as e:
+        status = "error"
+        out.write("".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next)))
+    data = json.dumps({"status": status, "output": out.getvalue()[:OUTPUT_LIMIT]}).encode("utf-8")
+    while data:
+        data = data[os.write(w, data):]
+    os._exit(0)
+
+
+for line in sys.stdin.buffer:
+    request = json.loads(line)
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        child(request, w)
+    os.close(w)
+    deadline = time.monotonic() + request["timeout"]
+    chunks, timed_out = [], False
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            os.kill(pid, signal.SIGKILL)
+            timed_out = True
+            break
+        if select.select([r], [], [], left)[0]:
+            data = os.read(r, 65536)
+            if not data:
+                break
+            chunks.append(data)
+    os.close(r)
+    _, wait_status = os.waitpid(pid, 0)
+    killed = os.WIFSIGNALED(wait_status) and os.WTERMSIG(wait_status) in (signal.SIGXCPU, signal.SIGKILL)
+    if timed_out or killed:
+        response = {"status": "timeout", "output": ""}
+    else:
+        try:
+            response = json.loads(b"".join(chunks))
+        except ValueError:
+            response = {"status": "crashed", "output": "Process exited unexpectedly (memory limit?)"}
+    sys.stdout.write(json.dumps(response) + "\n")
+    sys.stdout.flush()
+'''
+
+# Each request runs in a fresh worker thread (own isolate, own heap), inside a
+# vm context that holds no host objects: console and input are defined by a
+# prelude in the context itself, and only strings come back. Nothing one run
+# does to its realm can reach the runner or the next run.
+_NODE_SERVER = r'''
+const { Worker } = require('worker_threads');
+const readline = require('readline');
+const OUTPUT_LIMIT = Number(process.argv[1]);
+
+function job() {
+  const vm = require('vm');
+  const { parentPort, workerData } = require('worker_threads');
+  const { code, stdin, timeout, limit } = workerData;
+  const prelude = `(() => {
+    let output = '';
+    const log = (...args) => {
+      output += args.join(' ') + '\\n';
+      if (output.length > ${limit}) throw new Error('Output limit exceeded');
+    };
+    globalThis.console = { log, info: log, warn: log, error: log };
+    globalThis.input = ${JSON.stringify(stdin)};
+    Object.defineProperty(globalThis, '__output', { value: () => output });
+  })();`;
+
+  let script;
+  try {
+    script = new vm.Script(code, { filename: 'main.js' });
+  } catch (e) {
+    parentPort.postMessage({ status: 'error', output: String(e) });
+    return;
+  }
+  const context = vm.createContext({}, { codeGeneration: { strings: false, wasm: false } });
+  new vm.Script(prelude).runInContext(context);
+  let status = 'ok';
+  let error = '';
+  try {
+    script.runInContext(context, { timeout: timeout * 1000 });
+  } catch (e) {
+    if (e && e.code === 'ERR_SCRIPT_EXECUTION_TIMEOUT') status = 'timeout';
+    else error = 'Error: ' + String(e && e.message !== undefined ? e.message : e);
+  }
+  const output = vm.runInContext('__output()', context, { timeout: 1000 });
+  parentPort.postMessage({ status, output: ((typeof output === 'string' ? output : '') + error).slice(0, limit) });
+}
+
+const JOB = '(' + job.toString() + ')()';
+
+function run(request) {
+  return new Promise((resolve) => {
+    const worker = new Worker(JOB, {
+      eval: true,
+      workerData: { code: request.code, stdin: request.stdin || '', timeout: request.timeout, limit: OUTPUT_LIMIT },
+      resourceLimits: { maxOldGenerationSizeMb: 64 },
+      stdout: true,
+      stderr: true,
+      env: {},
+    });
+    let done = false;
+    const finish = (result) => {
+      if (done) return;
+      done = true;
+      clearTimeout(watchdog);
+      worker.terminate();
+      resolve(result);
+    };
+    // vm's timeout does not cover host code the snippet can trigger (getters on a thrown value)
+    const watchdog = setTimeout(() => finish({ status: 'timeout', output: '' }), request.timeout * 1000 + 1000);
+    worker.once('message', finish);
+    worker.once('error', (e) => finish({
+      status: 'crashed',
+      output: e && e.code === 'ERR_WORKER_OUT_OF_MEMORY' ? 'Memory limit exceeded' : 'Process exited unexpectedly',
+    }));
+    worker.once('exit', () => finish({ status: 'crashed', output: 'Process exited unexpectedly' }));
+  });
+}
+
+let pending = Promise.resolve();
+readline.createInterface({ input: process.stdin }).on('line', (line) => {
+  const request = JSON.parse(line);
+  pending = pending.then(() => run(request)).then((result) => {
+    process.stdout.write(JSON.stringify(result) + '\n');
+  });
+});
+'''
+
+RUNNER_COMMANDS = {
+    'python': [sys.executable, '-I', '-S', '-c', _PYTHON_SERVER, str(CPU_LIMIT), str(MEMORY_LIMIT), str(OUTPUT_LIMIT)],
+    # Defence in depth: no eval/Function anywhere in the process, workers included
+    'javascript': ['node', '--max-old-space-size=128', '--disallow-code-generation-from-strings',
+                   '-e', _NODE_SERVER, str(OUTPUT_LIMIT)],
+}
+# Applied by the sandbox launcher before the runner starts
+RUNNER_RLIMITS = {"RLIMIT_CORE": (0, 0), "RLIMIT_NOFILE": (256, 256)}
+
+
+class RunnerError(Exception):
+    """A runner timed out, died or broke the protocol; it must be discarded."""
+
+    def __init__(self, message, status="crashed"):
+        super().__init__(message)
+        self.status = status
+
+
+class Runner:
+    """One long-lived interpreter process speaking line-delimited JSON."""
+
+    def __init__(self, language):
+        self.language = language
+        self.runs = 0
+        self.workdir = tempfile.mkdtemp(prefix=f"runner_{language}_")
+        try:
+            self.process = sandbox.popen(
+                RUNNER_COMMANDS[language],
+                self.workdir,
+                RUNNER_RLIMITS,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                env={"PATH": os.environ.get("PATH", ""), "HOME": self.workdir, "TMPDIR": self.workdir, "LANG": "C.UTF-8"},
+                bufsize=0,
+            )
+        except BaseException:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            raise
+        self._buffer = b""
+
+    def request(self, payload, timeout):
+        try:
+            self.process.stdin.write((json.dumps(payload) + "\n").encode("utf-8"))
+        except (BrokenPipeError, OSError) as e:
+            raise RunnerError(f"runner unavailable: {e}")
+
+        fd = self.process.stdout.fileno()
+        deadline = time.monotonic() + timeout
+        while b"\n" not in self._buffer:
+            left = deadline - time.monotonic()
+            if left <= 0 or not select.select([fd], [], [], left)[0]:
+                raise RunnerError("runner did not answer in time", status="timeout")
+            data = os.read(fd, 65536)
+            if not data:
+                raise RunnerError("runner exited")
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise RunnerError("runner sent a malformed response")
+
+    def close(self):
+        self.process.release()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class InterpreterPool:
+    """Up to `size` warm runners for one language, reused across requests."""
+
+    def __init__(self, language, size=POOL_SIZE, max_runs=MAX_RUNS):
+        self.language = language
+        self.max_runs = max_runs
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def run(self, code, stdin="", timeout=WALL_TIMEOUT):
+        """Run code; returns {"status": ok|error|timeout|crashed|busy|unavailable, "output"}."""
+        try:
+            sandbox.ensure_available()
+        except sandbox.SandboxUnavailable as e:
+            return {"status": "unavailable", "output": str(e)}
+        if not self._slots.acquire(timeout=ACQUIRE_TIMEOUT):
+            return {"status": "busy", "output": "All code runners are busy, please try again"}
+        try:
+            try:
+                runner = self._idle.get_nowait()
+            except queue.Empty:
+                runner = Runner(self.language)  # FileNotFoundError if the runtime is missing
+
+            try:
+                result = runner.request({"code": code, "stdin": stdin, "timeout": timeout}, timeout + GRACE)
+            except RunnerError as e:
+                print(f"Recycling {self.language} runner: {e}")
+                runner.close()
+                output = "" if e.status == "timeout" else "Process exited unexpectedly (memory limit?)"
+                return {"status": e.status, "output": output}
+
+            runner.runs += 1
+            if result.get("status") in ("ok", "error") and runner.runs < self.max_runs:
+                self._idle.put(runner)
+            else:
+                runner.close()  # violation or worn out: start fresh next time
+            return result
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(language):
+    language = normalize_language(language)
+    if language not in RUNNER_COMMANDS:
+        raise ValueError(f"Language '{language}' is not supported")
+    with _pools_lock:
+        if language not in _pools:
+            _pools[language] = InterpreterPool(language)
+        return _pools[language]
+
+
+def run(language, code, stdin="", timeout=WALL_TIMEOUT):
+    """Run a snippet on a warm runner for `language`."""
+    return get_pool(language).run(code, stdin, timeout)
+
+
+@atexit.register
+def _shutdown():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
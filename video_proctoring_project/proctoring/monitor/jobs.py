@@ -0,0 +1,353 @@
+"""
+Local background job queue for long-running course work.
+
+Plan generation, video processing and audio transcription used to run inside
+the request handler and pin a web worker for minutes. Endpoints now `submit()`
+a job and return its id; `manage.py run_jobs` worker processes execute it.
+
+The queue is a plain SQLite table (stdlib `sqlite3`, WAL mode) so the Flask
+app and the Django views can share it without the ORM. Jobs support progress
+reporting, cancellation (checked cooperatively by handlers), retries with
+exponential backoff, de-duplication of identical in-flight submissions, and
+recovery of jobs whose worker died mid-run.
+"""
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
+JOBS_DB_PATH = Path(os.getenv("JOBS_DB_PATH", str(BASE_DIR / "jobs.sqlite3")))
+
+POLL_INTERVAL = 1.0          # idle worker sleep between queue checks
+HEARTBEAT_INTERVAL = 30      # running jobs refresh their heartbeat this often
+STALE_AFTER = 300            # a running job without heartbeat this long is requeued
+RETRY_BACKOFF = 10           # seconds before first retry, doubled per attempt
+DEFAULT_MAX_ATTEMPTS = 3
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# kind -> "module:function"; handlers are called as handler(payload, job)
+JOB_HANDLERS = {
+    "flask.generate_plan": "app:generate_plan_job",
+    "studymate.generate_plan": "studymate.views:generate_plan_job",
+    "courses.process_video": "courses.views:process_video_job",
+    "courses.transcribe_audio": "courses.views:transcribe_audio_job",
+    "monitor.judge_attempt": "monitor.grading:judge_attempt_job",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    dedupe_key TEXT,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat REAL,
+    worker TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_run_after ON jobs (status, run_after);
+CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, status);
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job was cancelled."""
+
+
+def _connect():
+    global _schema_ready
+    conn = sqlite3.connect(str(JOBS_DB_PATH), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                _schema_ready = True
+    return conn
+
+
+def _row_to_dict(row):
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+# ------------------------------
+# Client API
+# ------------------------------
+def submit(kind, payload, dedupe_key=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Queue a job and return its id. If `dedupe_key` matches a queued or running
+    job, that job's id is returned instead of queueing a duplicate.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if dedupe_key:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) LIMIT 1",
+                (dedupe_key, *ACTIVE_STATUSES),
+            ).fetchone()
+            if row:
+                conn.execute("COMMIT")
+                return row["id"]
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn.execute(
+            "INSERT INTO jobs (id, kind, payload, dedupe_key, status, max_attempts, run_after, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), dedupe_key, QUEUED, max_attempts, now, now),
+        )
+        conn.execute("COMMIT")
+        return job_id
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def get_job(job_id):
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def job_status(job_id):
+    """Public view of a job for the status endpoints (None if unknown)."""
+    job = get_job(job_id)
+    if job is None:
+        return None
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": round(job["progress"], 3),
+        "message": job["message"],
+        "result": job["result"] if job["status"] == SUCCEEDED else None,
+        "error": job["error"] if job["status"] in (FAILED, QUEUED) else None,
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "cancel_requested": job["cancel_requested"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+def cancel(job_id):
+    """
+    Cancel a job. Queued jobs are cancelled immediately; running jobs are
+    flagged and stop at their next progress checkpoint. Returns the new status
+    (None if the job does not exist).
+    """
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        status = row["status"]
+        if status == QUEUED:
+            conn.execute(
+                "UPDATE jobs SET status = ?, cancel_requested = 1, finished_at = ? WHERE id = ?",
+                (CANCELLED, time.time(), job_id),
+            )
+            status = CANCELLED
+        elif status == RUNNING:
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        conn.execute("COMMIT")
+        return status
+    finally:
+        conn.close()
+
+
+# ------------------------------
+# Handler context
+# ------------------------------
+class JobContext:
+    """Passed to handlers for progress reporting and cancellation checks."""
+
+    def __init__(self, job_id, attempt=1, max_attempts=1):
+        self.job_id = job_id
+        self.attempt = attempt
+        self.max_attempts = max_attempts
+
+    def is_final_attempt(self):
+        return self.attempt >= self.max_attempts
+
+    def progress(self, fraction, message=""):
+        """Record progress (0..1) and raise JobCancelled if cancellation was requested."""
+        conn = _connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = ?, heartbeat = ? WHERE id = ?",
+                (max(0.0, min(1.0, float(fraction))), message, time.time(), self.job_id),
+            )
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row and row["cancel_requested"]:
+            raise JobCancelled(self.job_id)
+
+    def check_cancelled(self):
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row and row["cancel_requested"]:
+            raise JobCancelled(self.job_id)
+
+
+# ------------------------------
+# Worker
+# ------------------------------
+def _resolve_handler(kind):
+    module_name, func_name = JOB_HANDLERS[kind].split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _requeue_stale(conn, now):
+    """Return jobs whose worker stopped heart-beating to the queue (or fail them)."""
+    conn.execute(
+        "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN ? ELSE ? END, "
+        "error = 'worker stopped responding', run_after = ?, "
+        "finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END "
+        "WHERE status = ? AND heartbeat < ?",
+        (QUEUED, FAILED, now, now, RUNNING, now - STALE_AFTER),
+    )
+
+
+def claim_next(worker_name):
+    """Atomically move the oldest runnable job to RUNNING and return it (or None)."""
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        _requeue_stale(conn, now)
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? AND run_after <= ? ORDER BY created_at LIMIT 1",
+            (QUEUED, now),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, heartbeat = ?, worker = ? "
+            "WHERE id = ?",
+            (RUNNING, now, now, worker_name, row["id"]),
+        )
+        conn.execute("COMMIT")
+        job = _row_to_dict(row)
+        job["attempts"] += 1
+        return job
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _finish(job_id, status, result=None, error=None):
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, progress = CASE WHEN ? = ? THEN 1 ELSE progress END, "
+            "finished_at = ? WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, status, SUCCEEDED, time.time(), job_id),
+        )
+    finally:
+        conn.close()
+
+
+def _retry_later(job, error):
+    delay = RETRY_BACKOFF * (2 ** (job["attempts"] - 1))
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, run_after = ?, message = ? WHERE id = ?",
+            (QUEUED, error, time.time() + delay, f"Retrying in {delay}s", job["id"]),
+        )
+    finally:
+        conn.close()
+
+
+def _heartbeat_loop(job_id, stop):
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        conn = _connect()
+        try:
+            conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = ?", (time.time(), job_id, RUNNING))
+        finally:
+            conn.close()
+
+
+def run_job(job):
+    """Execute one claimed job and record its outcome."""
+    ctx = JobContext(job["id"], job["attempts"], job["max_attempts"])
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat_loop, args=(job["id"], stop), daemon=True)
+    beat.start()
+    try:
+        if job["cancel_requested"]:
+            raise JobCancelled(job["id"])
+        result = _resolve_handler(job["kind"])(job["payload"], ctx)
+        _finish(job["id"], SUCCEEDED, result=result)
+    except JobCancelled:
+        _finish(job["id"], CANCELLED, error="Cancelled")
+    except Exception as e:
+        traceback.print_exc()
+        error = str(e)[:1000]
+        if job["attempts"] < job["max_attempts"]:
+            _retry_later(job, error)
+        else:
+            _finish(job["id"], FAILED, error=error)
+    finally:
+        stop.set()
+
+
+def work(worker_name=None, once=False, stop_event=None):
+    """Worker loop: claim and run jobs until stopped (or the queue is empty with once=True)."""
+    worker_name = worker_name or f"{socket.gethostname()}:{os.getpid()}"
+    while stop_event is None or not stop_event.is_set():
+        job = claim_next(worker_name)
+        if job is None:
+            if once:
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+        print(f"[{worker_name}] running {job['kind']} job {job['id']} (attempt {job['attempts']})")
+        run_job(job)
@@ -0,0 +1,281 @@
+"""
+Local judge for coding questions.
+
+Runs a submission against every test case in parallel, each in its own
+short-lived process confined by `monitor.sandbox` (no access outside a private
+scratch directory, no network, an unprivileged uid when the worker is root).
+Each process also gets resource limits (CPU seconds, address space, file size,
+open files, processes), an almost empty environment and a wall-clock timeout that kills
+the whole process group (and, with a leased uid, everything left under it).
+stdout is compared with the expected output after normalising trailing
+whitespace; failures carry a short diff.
+
+Results are cached by (language, code hash, input, expected output) in a small
+SQLite table, so re-grading or duplicate submissions do not re-run code.
+"""
+import difflib
+import hashlib
+import json
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import sandbox
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
+JUDGE_CACHE_PATH = Path(os.getenv("JUDGE_CACHE_PATH", str(BASE_DIR / "judge_cache.sqlite3")))
+
+JUDGE_WORKERS = int(os.getenv("JUDGE_WORKERS", os.cpu_count() or 2))
+WALL_TIMEOUT = 5           # seconds per test case
+CPU_LIMIT = 4              # CPU seconds per test case
+MEMORY_LIMIT = 256 * 1024 * 1024
+OUTPUT_LIMIT = 64 * 1024   # bytes of stdout kept / file size limit
+MAX_PROCS = 32             # processes + threads a run may start (node alone uses ~10 threads)
+DIFF_LINES = 12
+
+# language -> (source file name, command builder, enforce address-space limit)
+RUNNERS = {
+    'python': ('solution.py', lambda path: [sys.executable, '-I', '-S', path], True),
+    # V8 reserves far more address space than it uses, so cap its heap instead
+    'javascript': ('solution.js', lambda path: ['node', '--max-old-space-size=128', path], False),
+}
+LANGUAGE_ALIASES = {'py': 'python', 'python3': 'python', 'js': 'javascript', 'node': 'javascript'}
+# Return codes of a child killed for exceeding RLIMIT_CPU (soft, then hard limit)
+_CPU_LIMIT_CODES = (-signal.SIGXCPU, -signal.SIGKILL) if hasattr(signal, 'SIGXCPU') else ()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def normalize_language(language):
+    language = (language or 'python').strip().lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+
+# ------------------------------
+# Sandboxed execution
+# ------------------------------
+def _rlimits(limit_memory):
+    """rlimits for one test run (applied by the sandbox launcher, not a preexec_fn)."""
+    limits = {
+        "RLIMIT_CPU": (CPU_LIMIT, CPU_LIMIT + 1),
+        "RLIMIT_FSIZE": (OUTPUT_LIMIT, OUTPUT_LIMIT),
+        "RLIMIT_NOFILE": (64, 64),
+        "RLIMIT_CORE": (0, 0),
+        "RLIMIT_NPROC": (MAX_PROCS, MAX_PROCS),  # per run: each run has its own uid (see sandbox)
+    }
+    if limit_memory:
+        limits["RLIMIT_AS"] = (MEMORY_LIMIT, MEMORY_LIMIT)
+    return limits
+
+
+def run_code(language, code, stdin_data="", timeout=WALL_TIMEOUT):
+    """
+    Run code once in a sandboxed process.
+    Returns {"status": ok|error|timeout|unsupported, "stdout", "stderr", "time_ms"}.
+    Raises sandbox.SandboxUnavailable if the code could not be confined.
+    """
+    language = normalize_language(language)
+    if language not in RUNNERS:
+        return {"status": "unsupported", "stdout": "", "stderr": f"Language '{language}' is not supported", "time_ms": 0}
+    filename, command, limit_memory = RUNNERS[language]
+
+    workdir = tempfile.mkdtemp(prefix="judge_")
+    try:
+        source = os.path.join(workdir, filename)
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write(code)
+        started = time.monotonic()
+        try:
+            process = sandbox.popen(
+                command(source),
+                workdir,
+                _rlimits(limit_memory),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env={"PATH": os.environ.get("PATH", ""), "HOME": workdir, "TMPDIR": workdir, "LANG": "C.UTF-8"},
+            )
+        except FileNotFoundError:
+            return {"status": "unsupported", "stdout": "", "stderr": f"No runtime installed for {language}", "time_ms": 0}
+
+        try:
+            stdout, stderr = process.communicate(input=(stdin_data or "").encode('utf-8'), timeout=timeout)
+            if process.returncode == 0:
+                status = "ok"
+            elif process.returncode in _CPU_LIMIT_CODES:
+                status = "timeout"  # CPU limit hit
+            else:
+                status = "error"
+        except subprocess.TimeoutExpired:
+            process.release()
+            try:
+                stdout, stderr = process.communicate(timeout=1)
+            except subprocess.TimeoutExpired:  # a process outside the group still holds the pipes
+                stdout, stderr = b"", b""
+            status = "timeout"
+        finally:
+            process.release()  # nothing the run started outlives it
+        error = sandbox.launcher_error(process.returncode, stderr)
+        if error:
+            raise sandbox.SandboxUnavailable(error)
+        return {
+            "status": status,
+            "stdout": stdout[:OUTPUT_LIMIT].decode('utf-8', errors='replace'),
+            "stderr": stderr[:OUTPUT_LIMIT].decode('utf-8', errors='replace'),
+            "time_ms": int((time.monotonic() - started) * 1000),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ------------------------------
+# Output comparison
+# ------------------------------
+def normalize_output(text):
+    lines = (text or "").replace("\r\n", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).rstrip("\n")
+
+
+def compare_output(actual, expected):
+    """(passed, diff text) after normalising line endings and trailing whitespace."""
+    actual_n, expected_n = normalize_output(actual), normalize_output(expected)
+    if actual_n == expected_n:
+        return True, ""
+    diff = difflib.unified_diff(
+        expected_n.split("\n"), actual_n.split("\n"), fromfile="expected", tofile="actual", lineterm="", n=1
+    )
+    return False, "\n".join(list(diff)[:DIFF_LINES])
+
+
+# ------------------------------
+# Result cache
+# ------------------------------
+_cache_schema_ready = False
+
+
+def _cache_conn():
+    global _cache_schema_ready
+    conn = sqlite3.connect(str(JUDGE_CACHE_PATH), timeout=30, isolation_level=None)
+    if not _cache_schema_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL)")
+        _cache_schema_ready = True
+    return conn
+
+
+def _cache_key(language, code, test_case):
+    digest = hashlib.sha256()
+    for part in (language, code, test_case["input"], test_case["expected"]):
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _cache_get(keys):
+    if not keys:
+        return {}
+    conn = _cache_conn()
+    try:
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, result FROM results WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update((key, json.loads(result)) for key, result in rows)
+        return found
+    finally:
+        conn.close()
+
+
+def _cache_put(entries):
+    if not entries:
+        return
+    conn = _cache_conn()
+    try:
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO results (key, result, created_at) VALUES (?, ?, ?)",
+            [(key, json.dumps(result), now) for key, result in entries.items()],
+        )
+    finally:
+        conn.close()
+
+
+# ------------------------------
+# Judging
+# ------------------------------
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JUDGE_WORKERS, thread_name_prefix="judge")
+        return _executor
+
+
+def _judge_one(language, code, test_case):
+    run = run_code(language, code, test_case["input"])
+    passed, diff = (False, "")
+    if run["status"] == "ok":
+        passed, diff = compare_output(run["stdout"], test_case["expected"])
+    return {
+        "passed": passed,
+        "status": run["status"] if not (run["status"] == "ok" and not passed) else "wrong_answer",
+        "time_ms": run["time_ms"],
+        "diff": diff,
+        "stderr": run["stderr"][-2000:],
+    }
+
+
+def judge_many(submissions):
+    """
+    Judge several submissions at once, sharing one worker pool.
+    `submissions` is a list of (language, code, test_cases) where each test case
+    is {"id", "input", "expected"}; returns one list of per-test results each.
+    Raises sandbox.SandboxUnavailable (nothing is run) if this host cannot
+    confine untrusted code, so the grading job fails visibly instead of
+    marking answers wrong.
+    """
+    sandbox.ensure_available()
+    plans = []
+    keys = set()
+    for language, code, test_cases in submissions:
+        language = normalize_language(language)
+        plan = [(tc, _cache_key(language, code, tc)) for tc in test_cases]
+        keys.update(key for _, key in plan)
+        plans.append((language, code, plan))
+
+    cached = _cache_get(keys)
+    futures = {}
+    executor = _get_executor()
+    for language, code, plan in plans:
+        for tc, key in plan:
+            if key not in cached and key not in futures:
+                futures[key] = executor.submit(_judge_one, language, code, tc)
+
+    fresh = {key: future.result() for key, future in futures.items()}
+    # Timeouts are load-dependent and runtimes may get installed; don't pin those
+    _cache_put({key: result for key, result in fresh.items() if result["status"] not in ("timeout", "unsupported")})
+
+    results = []
+    for language, code, plan in plans:
+        results.append([
+            dict(cached.get(key) or fresh[key], test_case_id=tc.get("id"))
+            for tc, key in plan
+        ])
+    return results
+
+
+def judge(language, code, test_cases):
+    """Judge one submission; see `judge_many`."""
+    return judge_many([(language, code, test_cases)])[0]
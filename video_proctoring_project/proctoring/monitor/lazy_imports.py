@@ -0,0 +1,39 @@
+"""
+Deferred imports for heavy dependencies.
+
+The vision service modules (vision, frame_hints, face_detectors, inference,
+mood) are imported by the Django URLconf and the Flask app. Importing them
+must stay cheap. `manage.py migrate` and `check`, the admin and every
+management command load the URLconf but never touch a frame. So those
+modules bind OpenCV through `lazy_module("cv2")`, and the ML frameworks
+(deepface/TensorFlow, ultralytics/PyTorch, onnxruntime, speech_recognition,
+pydub) are imported inside the functions that use them.
+
+monitor/tests.py checks this with `python -X importtime`; see
+IMPORT_BUDGET_SECONDS there.
+"""
+import importlib
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Only called for attributes not found normally, i.e. the module's own
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        value = getattr(self._module, attr)
+        setattr(self, attr, value)  # later lookups skip __getattr__
+        return value
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
@@ -0,0 +1,143 @@
+import json
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor import face_detectors
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png'}
+
+
+class Command(BaseCommand):
+    help = 'Compare face detector latency and recall on stored evidence frames'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--frames-dir',
+            default=str(Path(settings.MEDIA_ROOT) / 'evidence' / 'frames'),
+            help='Directory of frames to run on (default: media/evidence/frames)',
+        )
+        parser.add_argument(
+            '--detectors',
+            default='haar,haar@480,haar@320,yunet,yunet@320',
+            help='Comma-separated detector specs (NAME[@MAX_SIDE]); unavailable ones are skipped',
+        )
+        parser.add_argument(
+            '--reference',
+            default=None,
+            help='Detector spec used as ground truth when --labels is not given (default: yunet, else haar)',
+        )
+        parser.add_argument(
+            '--labels',
+            default=None,
+            help='JSON file of hand-labelled boxes: {"frame.jpg": [[x, y, w, h], ...]}',
+        )
+        parser.add_argument('--limit', type=int, default=0, help='Only use the first N frames')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per frame (default: 3)')
+        parser.add_argument('--json', dest='json_path', default=None, help='Also write the results to this file')
+
+    def _load_frames(self, frames_dir, limit):
+        paths = sorted(p for p in Path(frames_dir).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        if limit:
+            paths = paths[:limit]
+        frames = []
+        for path in paths:
+            image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+            if image is not None:
+                frames.append((path.name, image))
+        return frames
+
+    def _build(self, spec):
+        try:
+            return face_detectors.get_detector(spec)
+        except face_detectors.DetectorUnavailable as e:
+            self.stdout.write(self.style.WARNING(f"Skipping {spec}: {e}"))
+            return None
+
+    def handle(self, *args, **options):
+        frames_dir = Path(options['frames_dir'])
+        if not frames_dir.is_dir():
+            raise CommandError(f"Frames directory not found: {frames_dir}")
+        frames = self._load_frames(frames_dir, options['limit'])
+        if not frames:
+            raise CommandError(f"No readable frames in {frames_dir}")
+
+        # Ground truth: hand labels if given, otherwise the reference detector at full resolution
+        if options['labels']:
+            with open(options['labels']) as f:
+                labels = json.load(f)
+            truth = {name: [tuple(box) for box in labels.get(name, [])] for name, _ in frames}
+            reference_name = f"labels:{Path(options['labels']).name}"
+        else:
+            specs = [options['reference']] if options['reference'] else ['yunet', 'haar']
+            reference = None
+            for spec in specs:
+                reference = self._build(spec)
+                if reference:
+                    break
+            if reference is None:
+                raise CommandError("No reference detector available; pass --labels or --reference")
+            truth = {}
+            for name, image in frames:
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                truth[name] = reference.detect(image, gray)
+            reference_name = reference.name
+
+        self.stdout.write(f"Benchmarking on {len(frames)} frames from {frames_dir} (reference: {reference_name})")
+
+        results = []
+        for spec in [s.strip() for s in options['detectors'].split(',') if s.strip()]:
+            detector = self._build(spec)
+            if detector is None:
+                continue
+
+            timings, boxes_found, matched, truth_total, bucket_agree = [], 0, 0, 0, 0
+            for name, image in frames:
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                detector.detect(image, gray)  # warm-up (model load, thread-local state)
+                for _ in range(max(1, options['repeat'])):
+                    start = time.perf_counter()
+                    boxes = detector.detect(image, gray)
+                    timings.append((time.perf_counter() - start) * 1000)
+                reference_boxes = truth[name]
+                boxes_found += len(boxes)
+                truth_total += len(reference_boxes)
+                matched += face_detectors.match_boxes(boxes, reference_boxes)
+                bucket_agree += face_detectors.count_bucket(boxes) == face_detectors.count_bucket(reference_boxes)
+
+            timings = np.array(timings)
+            row = {
+                'detector': detector.name,
+                'mean_ms': round(float(timings.mean()), 2),
+                'p50_ms': round(float(np.percentile(timings, 50)), 2),
+                'p95_ms': round(float(np.percentile(timings, 95)), 2),
+                'boxes': boxes_found,
+                'recall': round(matched / truth_total, 3) if truth_total else None,
+                'precision': round(matched / boxes_found, 3) if boxes_found else None,
+                'count_agreement': round(bucket_agree / len(frames), 3),
+            }
+            results.append(row)
+            self.stdout.write(
+                f"{row['detector']:<14} mean {row['mean_ms']:>7.2f} ms  p50 {row['p50_ms']:>7.2f}  "
+                f"p95 {row['p95_ms']:>7.2f}  boxes {row['boxes']:>4}  recall {row['recall']}  "
+                f"precision {row['precision']}  count agreement {row['count_agreement']}"
+            )
+
+        if not results:
+            raise CommandError("None of the requested detectors are available")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({
+                    'frames_dir': str(frames_dir),
+                    'frames': len(frames),
+                    'reference': reference_name,
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(f"Wrote {options['json_path']}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {len(results)} detectors compared"))
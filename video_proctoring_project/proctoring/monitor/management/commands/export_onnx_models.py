@@ -0,0 +1,71 @@
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor import frame_hints, inference
+
+# Input shapes of DeepFace's Keras networks (NHWC, batch left open)
+KERAS_INPUT_SHAPES = {'facenet': (160, 160, 3), 'emotion': (48, 48, 1), 'age': (224, 224, 3), 'gender': (224, 224, 3)}
+
+
+class Command(BaseCommand):
+    help = 'Export the YOLO and DeepFace models to ONNX (optionally int8) for INFERENCE_BACKEND=onnx'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models',
+            default=','.join(inference.MODELS),
+            help=f"Comma-separated models to export (default: {','.join(inference.MODELS)})",
+        )
+        parser.add_argument(
+            '--quantize',
+            action='store_true',
+            help='Also write dynamically int8-quantized *.int8.onnx copies',
+        )
+        parser.add_argument(
+            '--imgsz',
+            type=int,
+            default=frame_hints.YOLO_IMGSZ,
+            help=f'YOLO input size baked into the export (default: {frame_hints.YOLO_IMGSZ})',
+        )
+        parser.add_argument('--opset', type=int, default=13, help='ONNX opset (default: 13)')
+
+    def _export_yolo(self, target, imgsz, opset):
+        from ultralytics import YOLO
+        exported = YOLO(inference.YOLO_MODEL_PATH).export(format='onnx', imgsz=imgsz, opset=opset, dynamic=False)
+        shutil.move(str(exported), target)
+
+    def _export_keras(self, name, target, opset):
+        import tensorflow as tf
+        import tf2onnx
+        model = inference.KerasModel(name).model
+        spec = (tf.TensorSpec((None,) + KERAS_INPUT_SHAPES[name], tf.float32, name='input'),)
+        tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=str(target))
+
+    def handle(self, *args, **options):
+        names = [n.strip() for n in options['models'].split(',') if n.strip()]
+        unknown = [n for n in names if n not in inference.MODELS]
+        if unknown:
+            raise CommandError(f"Unknown models: {', '.join(unknown)}")
+
+        inference.ONNX_MODEL_DIR.mkdir(parents=True, exist_ok=True)
+        failed = 0
+        for name in names:
+            target = inference.onnx_path(name, quantized=False)
+            try:
+                if name == 'yolo':
+                    self._export_yolo(target, options['imgsz'], options['opset'])
+                else:
+                    self._export_keras(name, target, options['opset'])
+                self.stdout.write(f"✓ {name}: {target} ({target.stat().st_size / 1e6:.1f} MB)")
+
+                if options['quantize']:
+                    from onnxruntime.quantization import QuantType, quantize_dynamic
+                    quantized = inference.onnx_path(name, quantized=True)
+                    quantize_dynamic(str(target), str(quantized), weight_type=QuantType.QInt8)
+                    self.stdout.write(f"✓ {name}: {quantized} ({quantized.stat().st_size / 1e6:.1f} MB)")
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"✗ {name}: {e}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {len(names) - failed} exported, {failed} failed"))
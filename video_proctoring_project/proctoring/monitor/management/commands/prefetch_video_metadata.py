@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from monitor.analysis_helpers import extract_youtube_id
+from monitor.models import Course, CourseModule
+from monitor.video_metadata import get_video_metadata, refresh_video_metadata
+
+
+class Command(BaseCommand):
+    help = 'Warm the video metadata cache for every course and module video'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-fetch metadata even when a fresh cache entry exists',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of concurrent yt-dlp lookups (default: 4)',
+        )
+
+    def handle(self, *args, **options):
+        urls = set(Course.objects.exclude(video_url__isnull=True).exclude(video_url='').values_list('video_url', flat=True))
+        urls |= set(CourseModule.objects.exclude(video_url__isnull=True).exclude(video_url='').values_list('video_url', flat=True))
+
+        video_ids = sorted({vid for vid in (extract_youtube_id(url) for url in urls) if vid})
+        if not video_ids:
+            self.stdout.write(self.style.WARNING("No YouTube videos found on courses"))
+            return
+
+        fetch = refresh_video_metadata if options['force'] else get_video_metadata
+        self.stdout.write(f"Prefetching metadata for {len(video_ids)} videos...")
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            for video_id, meta in zip(video_ids, pool.map(fetch, video_ids)):
+                if meta.get('error'):
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"✗ {video_id}: {meta['error']}"))
+                else:
+                    self.stdout.write(f"✓ {video_id}: {meta.get('duration')}s - {meta.get('title')}")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {len(video_ids) - failed} cached, {failed} failed"))
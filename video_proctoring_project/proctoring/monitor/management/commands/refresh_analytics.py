@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from monitor.analytics import refresh_exam_rollups
+from monitor.models import Exam
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-exam analytics rollups used by the faculty dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of exams recomputed per batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        exam_ids = list(Exam.objects.order_by('id').values_list('id', flat=True))
+        batch_size = max(1, options['batch_size'])
+        for start in range(0, len(exam_ids), batch_size):
+            refresh_exam_rollups(exam_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed analytics for {len(exam_ids)} exams"))
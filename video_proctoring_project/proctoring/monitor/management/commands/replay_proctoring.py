@@ -0,0 +1,396 @@
+import base64
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from monitor import inference, vision
+from monitor.models import Candidate, Session
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg'}
+AUDIO_SUFFIXES = {'.wav', '.webm', '.mp3', '.ogg', '.m4a'}
+UPLOAD_FRAME_PATH = '/api/upload-frame/'
+UPLOAD_AUDIO_PATH = '/api/upload-audio/'
+# Metrics compared by --compare / --max-regression (higher is worse for all but fps)
+COMPARED = (
+    ('frames', 'latency_ms', 'p50'), ('frames', 'latency_ms', 'p95'), ('frames', 'latency_ms', 'p99'),
+    ('frames', 'queries_per_frame', 'mean'), ('frames', 'fps', None),
+)
+
+
+def _summary(values):
+    if not values:
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        'mean': round(float(values.mean()), 2),
+        'p50': round(float(np.percentile(values, 50)), 2),
+        'p95': round(float(np.percentile(values, 95)), 2),
+        'p99': round(float(np.percentile(values, 99)), 2),
+        'max': round(float(values.max()), 2),
+    }
+
+
+def _tag_jpeg(jpeg, tag):
+    """Insert a JPEG comment so every upload is unique and misses the vision frame cache."""
+    comment = tag.encode()
+    return jpeg[:2] + b'\xff\xfe' + struct.pack('>H', len(comment) + 2) + comment + jpeg[2:]
+
+
+class _Stream:
+    """Request results for one endpoint, shared by all session threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies, self.queries, self.status = [], [], {}
+        self.errors = 0
+
+    def record(self, seconds, status, queries=None, error=False):
+        with self.lock:
+            self.latencies.append(seconds * 1000)
+            self.status[str(status)] = self.status.get(str(status), 0) + 1
+            if queries is not None:
+                self.queries.append(queries)
+            if error:
+                self.errors += 1
+
+    def report(self, wall):
+        return {
+            'sent': len(self.latencies),
+            'errors': self.errors,
+            'status_counts': self.status,
+            'latency_ms': _summary(self.latencies),
+            'fps': round(len(self.latencies) / wall, 2) if wall else None,
+            'queries_per_frame': _summary(self.queries),
+        }
+
+
+class Command(BaseCommand):
+    help = 'Replay stored webcam frames (and audio) through upload_frame as N concurrent proctoring sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--frames-dir',
+            default=str(Path(settings.MEDIA_ROOT) / 'evidence' / 'frames'),
+            help='Directory of JPEG frames to replay (default: media/evidence/frames)',
+        )
+        parser.add_argument('--audio-dir', default=None, help='Directory of recorded audio clips to send as well')
+        parser.add_argument('--audio-interval', type=float, default=10.0, help='Seconds between audio uploads per session')
+        parser.add_argument('--sessions', type=int, default=4, help='Concurrent sessions (default: 4)')
+        parser.add_argument('--fps', type=float, default=1.0, help='Frames per second per session (default: 1)')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run (default: 30)')
+        parser.add_argument(
+            '--url',
+            default=None,
+            help='Base URL of a running server sharing this database (default: in-process test client)',
+        )
+        parser.add_argument(
+            '--server-pid',
+            type=int,
+            action='append',
+            default=[],
+            help='With --url: server process to sample CPU/RSS for, children included (needs psutil; repeatable)',
+        )
+        parser.add_argument('--allow-cache', action='store_true', help='Send identical frame bytes (measures cache hits)')
+        parser.add_argument('--label', default='', help='Release / commit label stored in the JSON output')
+        parser.add_argument('--json', dest='json_path', default=None, help='Write the results to this file')
+        parser.add_argument('--compare', default=None, help='Baseline JSON from an earlier run to compare against')
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            default=None,
+            help='With --compare: fail if a compared metric is worse by more than this percent',
+        )
+        parser.add_argument('--keep', action='store_true', help='Keep the replay sessions, events and evidence files')
+
+    # ------------------------------
+    # Inputs
+    # ------------------------------
+    def _load(self, directory, suffixes, what):
+        directory = Path(directory)
+        if not directory.is_dir():
+            raise CommandError(f"{what} directory not found: {directory}")
+        paths = sorted(p for p in directory.iterdir() if p.suffix.lower() in suffixes)
+        if not paths:
+            raise CommandError(f"No {what.lower()} files in {directory}")
+        return [p.read_bytes() for p in paths]
+
+    # ------------------------------
+    # Transport
+    # ------------------------------
+    def _host(self):
+        # The test client's default 'testserver' host is rejected outside the test runner
+        for host in settings.ALLOWED_HOSTS:
+            host = host.lstrip('.')
+            if host and host != '*':
+                return host
+        return 'localhost'
+
+    def _poster(self, base_url, user):
+        """A per-thread post(path, data) -> (status, queries or None)."""
+        if base_url:
+            import requests
+            http = requests.Session()
+
+            def post(path, data):
+                response = http.post(base_url.rstrip('/') + path, data=data, timeout=120)
+                return response.status_code, None
+            return post
+
+        client = Client(HTTP_HOST=self._host())
+        if user is not None:
+            client.force_login(user)
+
+        def post(path, data):
+            # connection is per thread, so this counts only this session's queries
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post(path, data)
+            return response.status_code, len(queries.captured_queries)
+        return post
+
+    def _run_session(self, index, session_id, options, frames, audio, user, deadline, frame_stream, audio_stream):
+        post = self._poster(options['url'], user)
+        interval = 1.0 / options['fps']
+        next_frame = next_audio = time.perf_counter()
+        position = index * len(frames) // max(1, options['sessions'])  # sessions start at different frames
+        sent = 0
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if audio and now >= next_audio:
+                    clip = audio[(index + sent) % len(audio)]
+                    data = {'session_id': str(session_id), 'audio': base64.b64encode(clip).decode()}
+                    self._send(post, UPLOAD_AUDIO_PATH, data, audio_stream)
+                    next_audio += options['audio_interval']
+                    continue
+                if now < next_frame:
+                    time.sleep(min(next_frame, deadline) - now)
+                    continue
+                jpeg = frames[position % len(frames)]
+                if not options['allow_cache']:
+                    jpeg = _tag_jpeg(jpeg, f"replay {session_id} {sent}")
+                data = {'session_id': str(session_id), 'frame': 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()}
+                self._send(post, UPLOAD_FRAME_PATH, data, frame_stream)
+                position += 1
+                sent += 1
+                next_frame += interval  # fixed schedule: a slow server shows up as latency, not fewer frames
+        finally:
+            if not options['url']:
+                connection.close()
+
+    def _send(self, post, path, data, stream):
+        start = time.perf_counter()
+        try:
+            status, queries = post(path, data)
+            stream.record(time.perf_counter() - start, status, queries, error=status >= 400)
+        except Exception as e:
+            stream.record(time.perf_counter() - start, type(e).__name__, error=True)
+
+    # ------------------------------
+    # Worker CPU / RSS
+    # ------------------------------
+    def _worker_sampler(self, pids, stop, samples):
+        import psutil
+        processes = {}
+        for pid in pids:
+            try:
+                parent = psutil.Process(pid)
+                for proc in [parent] + parent.children(recursive=True):
+                    proc.cpu_percent(None)  # prime the CPU counter
+                    processes[proc.pid] = proc
+            except psutil.Error as e:
+                self.stdout.write(self.style.WARNING(f"Cannot sample pid {pid}: {e}"))
+        while not stop.wait(0.5):
+            for pid, proc in processes.items():
+                try:
+                    samples.setdefault(pid, []).append((proc.cpu_percent(None), proc.memory_info().rss))
+                except psutil.Error:
+                    pass
+
+    def _worker_report(self, samples):
+        workers = []
+        for pid, rows in sorted(samples.items()):
+            cpu = [c for c, _ in rows]
+            rss = [r for _, r in rows]
+            workers.append({
+                'pid': pid,
+                'cpu_percent': round(sum(cpu) / len(cpu), 1),
+                'rss_mb': round(rss[-1] / 1e6, 1),
+                'peak_rss_mb': round(max(rss) / 1e6, 1),
+            })
+        return workers
+
+    # ------------------------------
+    # Baseline comparison
+    # ------------------------------
+    def _compare(self, result, baseline_path, max_regression):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        self.stdout.write(f"Compared with {baseline_path} ({baseline.get('label') or 'unlabelled'}):")
+        regressions = []
+        for section, metric, stat in COMPARED:
+            old, new = baseline.get(section, {}).get(metric), result[section][metric]
+            if stat:
+                old, new = (old or {}).get(stat), (new or {}).get(stat)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = -change if metric == 'fps' else change
+            name = f"{metric}.{stat}" if stat else metric
+            line = f"  {name:<24} {old:>9} -> {new:>9} ({change:+.1f}%)"
+            if max_regression is not None and worse > max_regression:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"Regressed beyond {max_regression}%: {', '.join(regressions)}")
+
+    # ------------------------------
+    # Run
+    # ------------------------------
+    def handle(self, *args, **options):
+        if options['sessions'] < 1 or options['fps'] <= 0 or options['duration'] <= 0:
+            raise CommandError("--sessions, --fps and --duration must be positive")
+        frames = self._load(options['frames_dir'], IMAGE_SUFFIXES, 'Frames')
+        audio = self._load(options['audio_dir'], AUDIO_SUFFIXES, 'Audio') if options['audio_dir'] else []
+        if audio and options['url']:
+            self.stdout.write(self.style.WARNING("upload-audio needs a logged-in user; audio is only replayed in-process"))
+            audio = []
+
+        run_id = uuid.uuid4().hex[:8]
+        user = None
+        if audio:
+            user = get_user_model().objects.create_user(username=f"replay-{run_id}", password=uuid.uuid4().hex)
+        sessions = []
+        for i in range(options['sessions']):
+            candidate = Candidate.objects.create(name=f"Replay {run_id} #{i}", roll_number=f"REPLAY-{run_id}-{i}")
+            sessions.append(Session.objects.create(candidate=candidate))
+
+        media_root = None
+        overrides = None
+        if not options['url'] and not options['keep']:
+            # Event evidence JPEGs go to a scratch MEDIA_ROOT instead of the real one
+            media_root = tempfile.mkdtemp(prefix='replay-media-')
+            overrides = override_settings(MEDIA_ROOT=media_root)
+            overrides.enable()
+
+        target = options['url'] or 'in-process test client'
+        self.stdout.write(
+            f"Replaying {len(frames)} frames as {options['sessions']} sessions at {options['fps']} fps "
+            f"for {options['duration']}s against {target}..."
+        )
+
+        frame_stream, audio_stream = _Stream(), _Stream()
+        samples, stop = {}, threading.Event()
+        sampler = None
+        pids = options['server_pid'] if options['url'] else [os.getpid()]
+        try:
+            import psutil  # noqa: F401  (optional: per-worker CPU / RSS sampling)
+            if pids:
+                sampler = threading.Thread(target=self._worker_sampler, args=(pids, stop, samples), daemon=True)
+                sampler.start()
+        except ImportError:
+            if options['url'] and pids:
+                self.stdout.write(self.style.WARNING("psutil is not installed; server CPU/RSS not sampled"))
+
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        deadline = wall_start + options['duration']
+        threads = [
+            threading.Thread(
+                target=self._run_session,
+                args=(i, session.id, options, frames, audio, user, deadline, frame_stream, audio_stream),
+                name=f"replay-{i}",
+            )
+            for i, session in enumerate(sessions)
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            stop.set()
+            if sampler:
+                sampler.join()
+            if overrides:
+                overrides.disable()
+                shutil.rmtree(media_root, ignore_errors=True)
+            if not options['keep']:
+                Session.objects.filter(id__in=[s.id for s in sessions]).delete()  # events cascade
+                Candidate.objects.filter(roll_number__startswith=f"REPLAY-{run_id}-").delete()
+                if user is not None:
+                    user.delete()
+
+        workers = self._worker_report(samples)
+        if not workers and not options['url']:
+            # No psutil: this process is the worker; ru_maxrss is the peak in KB on Linux
+            workers = [{
+                'pid': os.getpid(),
+                'cpu_percent': round(cpu / wall * 100, 1),
+                'rss_mb': None,
+                'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 1),
+            }]
+
+        result = {
+            'label': options['label'],
+            'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'target': target,
+            'sessions': options['sessions'],
+            'fps_per_session': options['fps'],
+            'duration_s': round(wall, 2),
+            'frames_dir': options['frames_dir'],
+            'unique_frames': not options['allow_cache'],
+            'frames': frame_stream.report(wall),
+            'audio': audio_stream.report(wall) if audio else None,
+            'workers': workers,
+            'environment': {
+                'python': platform.python_version(),
+                'inference_backend': inference.BACKEND,
+                'gadget_mode': vision.GADGET_MODE,
+                'face_detector': os.getenv('FACE_DETECTOR', 'default'),
+            },
+        }
+
+        report = result['frames']
+        latency = report['latency_ms'] or {}
+        self.stdout.write(
+            f"Frames: {report['sent']} sent, {report['errors']} errors, {report['fps']} frames/s; "
+            f"latency p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, p99 {latency.get('p99')} ms"
+        )
+        if report['queries_per_frame']:
+            self.stdout.write(f"DB queries per frame: mean {report['queries_per_frame']['mean']}, max {report['queries_per_frame']['max']}")
+        for worker in workers:
+            self.stdout.write(f"Worker {worker['pid']}: CPU {worker['cpu_percent']}%, peak RSS {worker['peak_rss_mb']} MB")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(result, f, indent=2)
+            self.stdout.write(f"Wrote {options['json_path']}")
+        if options['compare']:
+            self._compare(result, options['compare'], options['max_regression'])
+
+        if report['errors']:
+            self.stdout.write(self.style.WARNING(f"Done with {report['errors']} failed uploads: {report['status_counts']}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,78 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Time the analyzer / helper hot paths and compare them with the committed baselines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', default=None, help='Comma-separated benchmark names (default: all)')
+        parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=benchmarks.DEFAULT_ROUNDS,
+            help=f'Timed rounds per benchmark (default: {benchmarks.DEFAULT_ROUNDS})',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=benchmarks.DEFAULT_TOLERANCE,
+            help=f'Percent slower than baseline that counts as a regression (default: {benchmarks.DEFAULT_TOLERANCE})',
+        )
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error if any benchmark regressed')
+        parser.add_argument('--update-baselines', action='store_true', help=f'Rewrite {benchmarks.BASELINES_PATH.name}')
+        parser.add_argument('--json', dest='json_path', default=None, help='Also write the raw results to this file')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in benchmarks.CASES:
+                self.stdout.write(name)
+            return
+
+        names = [n.strip() for n in options['only'].split(',') if n.strip()] if options['only'] else None
+        try:
+            results = benchmarks.run(names, rounds=options['rounds'])
+        except KeyError as e:
+            raise CommandError(e.args[0])
+
+        baselines = benchmarks.load_baselines()
+        rows = {row[0]: row for row in benchmarks.compare(results, baselines, options['tolerance'])}
+        self.stdout.write(f"{'benchmark':<34}{'median':>12}{'min':>12}{'base min':>12}{'change':>9}")
+        for name, result in results.items():
+            if 'skipped' in result:
+                self.stdout.write(self.style.WARNING(f"{name:<34}  skipped: {result['skipped']}"))
+                continue
+            row = rows.get(name)
+            baseline = f"{row[1]:.2f}" if row else '-'
+            change = f"{row[3]:+.1f}%" if row else ''
+            line = f"{name:<34}{result['median_us']:>10.2f}us{result['min_us']:>10.2f}us{baseline:>12}{change:>9}"
+            self.stdout.write(self.style.ERROR(line) if row and row[4] else line)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'machine': benchmarks.machine_info(), 'results': results}, f, indent=2)
+            self.stdout.write(f"Wrote {options['json_path']}")
+
+        if options['update_baselines']:
+            benchmarks.save_baselines(results)
+            self.stdout.write(self.style.SUCCESS(f"Updated {benchmarks.BASELINES_PATH}"))
+            return
+
+        regressed = [name for name, row in rows.items() if row[4]]
+        missing = benchmarks.skipped_with_baseline(results, baselines)
+        if regressed or missing:
+            problems = []
+            if regressed:
+                problems.append(f"Slower than baseline by more than {options['tolerance']}%: {', '.join(regressed)}")
+            if missing:
+                problems.append(f"Skipped but have a baseline: {', '.join(missing)}")
+            message = '; '.join(problems)
+            if options['fail_on_regression']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Done: {len(results)} benchmarks, no regressions"))
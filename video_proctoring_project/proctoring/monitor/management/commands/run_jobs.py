@@ -0,0 +1,55 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from monitor import jobs
+
+
+def _worker_main(index):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    jobs.work(worker_name=f"worker-{index}")
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers (course plans, video processing, transcription)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Number of worker processes (default: 2)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process queued jobs in this process and exit when the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            jobs.work(once=True)
+            self.stdout.write(self.style.SUCCESS("Job queue drained"))
+            return
+
+        # Children must open their own database connections
+        connections.close_all()
+
+        count = max(1, options['workers'])
+        processes = [
+            multiprocessing.Process(target=_worker_main, args=(i,), name=f"job-worker-{i}", daemon=True)
+            for i in range(count)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {count} job workers (queue: {jobs.JOBS_DB_PATH})"))
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping job workers...")
+            for process in processes:
+                process.terminate()
@@ -1,8 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from monitor.models import StudentProfile
-from datetime import datetime
-import csv
+from monitor.student_import import ImportValidationError, apply_import, dob_password, parse_csv, parse_rows, plan_import
+import json
 import os
 
 
@@ -18,13 +17,34 @@ class Command(BaseCommand):
         parser.add_argument(
             '--file',
             type=str,
-            help='CSV file path with student data (roll_number, name, dob)',
+            help='CSV file path with student data (roll_number, name, dob[, department, email])',
         )
         parser.add_argument(
             '--add-student',
             type=str,
             help='Add single student: --add-student "ROLL_NO,FullName,YYYY-MM-DD"',
         )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the file and report what would change without writing anything',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Processes used to hash passwords (default: CPU count)',
+        )
+        parser.add_argument(
+            '--reset-passwords',
+            action='store_true',
+            help='Reset passwords of updated students to their DOB',
+        )
+        parser.add_argument(
+            '--report',
+            type=str,
+            help='Write the created/updated/skipped diff to this JSON file',
+        )
 
     def handle(self, *args, **options):
         # Delete all users if requested
@@ -43,76 +63,59 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR("Format: ROLL_NO,FullName,YYYY-MM-DD"))
                 return
             
-            roll_no, name, dob_str = data[0].strip(), data[1].strip(), data[2].strip()
-            self.create_student(roll_no, name, dob_str)
+            self.import_students(lambda: parse_rows([options['add_student']]), options, verbose=True)
             return
 
         # Load from CSV file
         if options['file']:
-            self.load_from_csv(options['file'])
+            self.load_from_csv(options['file'], options)
             return
 
         self.stdout.write(self.style.WARNING("No action specified. Use --help for options"))
 
-    def create_student(self, roll_number, full_name, dob_str):
-        """Create a student user with roll number as username and DOB as password"""
+    def import_students(self, parse, options, verbose=False):
+        """Validate, diff and bulk-import students; prints and optionally saves the diff."""
         try:
-            # Parse DOB
-            dob = datetime.strptime(dob_str, '%Y-%m-%d').date()
-            
-            # Check if student already exists
-            if User.objects.filter(username=roll_number).exists():
-                self.stdout.write(self.style.WARNING(f"Student {roll_number} already exists"))
-                return
-            
-            # Create user with roll_number as username and DOB as password
-            dob_password = dob.strftime('%Y%m%d')  # YYYYMMDD format
-            user = User.objects.create_user(
-                username=roll_number,
-                password=dob_password,
-                first_name=full_name.split()[0] if full_name else '',
-                last_name=' '.join(full_name.split()[1:]) if len(full_name.split()) > 1 else ''
-            )
-            
-            # Create student profile
-            StudentProfile.objects.create(
-                user=user,
-                full_name=full_name,
-                dob=dob,
-                roll_number=roll_number
-            )
-            
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"✓ Student created: {roll_number} | Password: {dob_password}"
-                )
-            )
-        except ValueError as e:
-            self.stdout.write(self.style.ERROR(f"Invalid date format for {roll_number}: {e}"))
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error creating {roll_number}: {e}"))
+            rows = parse()
+        except ImportValidationError as e:
+            for line_no, message in e.errors:
+                self.stdout.write(self.style.ERROR(f"Line {line_no}: {message}"))
+            self.stdout.write(self.style.ERROR(f"Nothing imported: {len(e.errors)} invalid rows"))
+            return
+
+        plan = plan_import(rows)
+        report = {
+            'created': [row['roll_number'] for row in plan['create']],
+            'updated': [row['roll_number'] for _, row in plan['update']],
+            'skipped': [{'roll_number': row['roll_number'], 'reason': reason} for row, reason in plan['skip']],
+        }
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run - no changes written"))
+        else:
+            apply_import(plan, workers=options['workers'], reset_passwords=options['reset_passwords'])
 
-    def load_from_csv(self, filepath):
+        if verbose:
+            for row in plan['create']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✓ Student created: {row['roll_number']} | Password: {dob_password(row['dob'])}"
+                ))
+            for row, reason in plan['skip']:
+                self.stdout.write(self.style.WARNING(f"Student {row['roll_number']} skipped: {reason}"))
+
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created: {len(report['created'])} | Updated: {len(report['updated'])} | Skipped: {len(report['skipped'])}"
+        ))
+
+    def load_from_csv(self, filepath, options):
         """Load students from CSV file"""
         if not os.path.exists(filepath):
             self.stdout.write(self.style.ERROR(f"File not found: {filepath}"))
             return
         
-        count = 0
-        with open(filepath, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            # Skip header if exists
-            headers = next(reader, None)
-            
-            for row in reader:
-                if len(row) < 3:
-                    self.stdout.write(self.style.WARNING(f"Skipping invalid row: {row}"))
-                    continue
-                
-                roll_no, name, dob = row[0].strip(), row[1].strip(), row[2].strip()
-                self.create_student(roll_no, name, dob)
-                count += 1
-        
-        self.stdout.write(
-            self.style.SUCCESS(f"\nTotal {count} students processed from {filepath}")
-        )
+        self.import_students(lambda: parse_csv(filepath), options)
+        self.stdout.write(f"Processed {filepath}")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0012_examsubmission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentprofile',
+            name='department',
+            field=models.CharField(blank=True, db_index=True, max_length=128, null=True),
+        ),
+    ]
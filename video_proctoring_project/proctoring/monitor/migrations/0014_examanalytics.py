@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0013_studentprofile_department'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamAnalytics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assignment_count', models.PositiveIntegerField(default=0)),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('passed_count', models.PositiveIntegerField(default=0)),
+                ('sum_marks_obtained', models.FloatField(default=0)),
+                ('sum_percentage', models.FloatField(default=0)),
+                ('sum_violations', models.PositiveIntegerField(default=0)),
+                ('sum_tab_switches', models.PositiveIntegerField(default=0)),
+                ('timed_attempts', models.PositiveIntegerField(default=0)),
+                ('sum_time_seconds', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exam', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analytics', to='monitor.exam')),
+                ('faculty', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_analytics', to='monitor.faculty')),
+            ],
+            options={
+                'verbose_name_plural': 'Exam analytics',
+            },
+        ),
+    ]
@@ -9,6 +9,7 @@ class StudentProfile(models.Model):
     full_name = models.CharField(max_length=128)
     dob = models.DateField()  # Date of Birth
     roll_number = models.CharField(max_length=50, unique=True, null=False, blank=False)
+    department = models.CharField(max_length=128, blank=True, null=True, db_index=True)  # cohort filter for bulk enrollment
     def __str__(self):
         return self.full_name
 
@@ -367,3 +368,30 @@ class StudentAnswer(models.Model):
 
     def __str__(self):
         return f"Answer for Q{self.question.order} by {self.attempt.student.full_name}"
+
+
+# ------------------------------
+# Per-exam analytics rollup (maintained by monitor.analytics)
+# ------------------------------
+class ExamAnalytics(models.Model):
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, related_name='analytics')
+    faculty = models.ForeignKey(Faculty, on_delete=models.CASCADE, related_name='exam_analytics')
+    
+    # Sums rather than averages so faculty-wide figures are a single SUM over rows
+    assignment_count = models.PositiveIntegerField(default=0)
+    attempt_count = models.PositiveIntegerField(default=0)
+    passed_count = models.PositiveIntegerField(default=0)
+    sum_marks_obtained = models.FloatField(default=0)
+    sum_percentage = models.FloatField(default=0)
+    sum_violations = models.PositiveIntegerField(default=0)
+    sum_tab_switches = models.PositiveIntegerField(default=0)
+    timed_attempts = models.PositiveIntegerField(default=0)
+    sum_time_seconds = models.FloatField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Exam analytics"
+
+    def __str__(self):
+        return f"Analytics for {self.exam.title}"
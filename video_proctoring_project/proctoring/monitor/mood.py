@@ -0,0 +1,195 @@
+"""
+Batched learner mood analysis.
+
+`DeepFace.analyze` on one frame detects the face again for every action and
+runs one forward pass per action. For a batch of frames, this engine instead:
+1. Decodes each frame and finds its face once (the shared `vision` face stage)
+   on a thread pool. When the client sends a face crop (see frame_hints), that
+   crop is used and nothing is detected.
+2. Crops and preprocesses every face for each requested action and stacks the
+   crops into one array per model.
+3. Runs each model once per MAX_BATCH crops.
+
+Only the requested actions are run. Engagement needs only 'emotion', which
+is the default. The models are DeepFace's own Emotion/Age/Gender networks,
+loaded once per process on the configured inference backend (Keras or ONNX).
+"""
+import base64
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import inference, vision
+from .lazy_imports import lazy_module
+
+cv2 = lazy_module("cv2")
+
+MOOD_WORKERS = int(os.getenv("MOOD_WORKERS", os.cpu_count() or 2))
+MAX_BATCH = int(os.getenv("MOOD_MAX_BATCH", 64))   # crops per forward pass
+
+SUPPORTED_ACTIONS = ('emotion', 'age', 'gender')
+DEFAULT_ACTIONS = ('emotion',)
+
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+GENDER_LABELS = ['Woman', 'Man']
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class MoodError(ValueError):
+    """A frame could not be decoded or analysed."""
+
+
+# ------------------------------
+# Decoding / detection
+# ------------------------------
+def decode_frame(frame_data):
+    """Base64 image (data URI allowed) or RGB/BGR array -> BGR array."""
+    if isinstance(frame_data, str):
+        if ',' in frame_data:
+            frame_data = frame_data.split(',', 1)[1]
+        try:
+            raw = base64.b64decode(frame_data)
+        except ValueError:
+            raise MoodError("Invalid base64 image data")
+        img = cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise MoodError("Could not decode image")
+        return img
+    img = np.asarray(frame_data)
+    if img.ndim == 3 and img.shape[2] == 3:
+        return cv2.cvtColor(img, cv2.COLOR_RGB2BGR)  # arrays from PIL are RGB
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    if img.ndim == 3 and img.shape[2] == 4:
+        return cv2.cvtColor(img, cv2.COLOR_RGBA2BGR)
+    raise MoodError(f"Unsupported image shape {img.shape}")
+
+
+def _prepare(item):
+    """Decode + detect for one (frame, hint) pair; runs on the worker pool."""
+    frame_data, hint = item
+    if hint is not None and hint.crop is not None:
+        # The client already cropped the face at full resolution: no decode or detection needed
+        return {'crop': hint.crop, 'box': None, 'source': 'client_crop'}
+    try:
+        if isinstance(frame_data, str):
+            frame = vision.load_frame(frame_data)  # shares decode + detection with the other endpoints
+        else:
+            frame = vision.Frame(decode_frame(frame_data))
+    except (MoodError, vision.VisionError) as e:
+        return {'error': str(e)}
+    try:
+        box = vision.run_stage(frame, 'faces')['largest']
+    except vision.VisionUnavailable:
+        box = None  # no detector on this server; the result says face_source 'full_frame'
+    if box is None:
+        # enforce_detection=False behaviour: analyse the whole frame
+        return {'crop': frame.image, 'box': None, 'source': 'full_frame'}
+    return {'crop': frame.crop(box), 'box': box, 'source': 'detected'}
+
+
+# ------------------------------
+# Models
+# ------------------------------
+_INPUTS = {'emotion': inference.emotion_input, 'age': inference.face_input, 'gender': inference.face_input}
+
+
+def get_model(action):
+    """The DeepFace network for `action` on the configured inference backend."""
+    return inference.load(action)
+
+
+def _predict(action, batch):
+    model = get_model(action)
+    outputs = []
+    for start in range(0, len(batch), MAX_BATCH):
+        outputs.append(np.asarray(model.predict(np.stack(batch[start:start + MAX_BATCH]))))
+    return np.concatenate(outputs) if outputs else np.empty((0,))
+
+
+def _decode_outputs(action, probs):
+    if action == 'emotion':
+        total = float(probs.sum()) or 1.0
+        emotions = {label: float(100 * p / total) for label, p in zip(EMOTION_LABELS, probs)}
+        return {'emotion': emotions, 'dominant_emotion': EMOTION_LABELS[int(np.argmax(probs))]}
+    if action == 'age':
+        return {'age': int(round(float(np.sum(probs * np.arange(len(probs))))))}
+    genders = {label: float(100 * p) for label, p in zip(GENDER_LABELS, probs)}
+    return {'gender': genders, 'dominant_gender': GENDER_LABELS[int(np.argmax(probs))]}
+
+
+# ------------------------------
+# Engine
+# ------------------------------
+def normalize_actions(actions):
+    if not actions:
+        return list(DEFAULT_ACTIONS)
+    if isinstance(actions, str):
+        actions = [a.strip() for a in actions.split(',')]
+    unknown = [a for a in actions if a not in SUPPORTED_ACTIONS]
+    if unknown:
+        raise MoodError(f"Unsupported actions: {', '.join(unknown)}")
+    return [a for a in SUPPORTED_ACTIONS if a in actions]
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MOOD_WORKERS, thread_name_prefix="mood")
+        return _executor
+
+
+def analyze_frames(frames, actions=None, hints=None):
+    """
+    Analyse a list of frames (base64 strings or arrays) in one batch.
+    `hints` optionally gives a frame_hints.FrameHint (or None) per frame; a
+    hinted face crop is used as-is instead of detecting in the frame.
+
+    Returns one dict per frame, in order. A successful entry has `success`,
+    `face_detected`, `face_box` (frame pixels; None for client crops),
+    `face_source` ('detected', 'client_crop' or 'full_frame') and the keys
+    DeepFace.analyze would give for the requested actions
+    (`emotion`/`dominant_emotion`, `age`, `gender`/`dominant_gender`).
+    A failed one has `success: False` and `error`.
+    """
+    actions = normalize_actions(actions)
+    items = list(zip(frames, hints or [None] * len(frames)))
+    if len(items) > 1:
+        prepared = list(_get_executor().map(_prepare, items))
+    else:
+        prepared = [_prepare(item) for item in items]
+
+    ok = [i for i, item in enumerate(prepared) if 'error' not in item]
+    results = [
+        {'success': False, 'error': item['error']} if 'error' in item
+        else {
+            'success': True,
+            'face_detected': item['source'] != 'full_frame',
+            'face_box': item['box'],
+            'face_source': item['source'],
+        }
+        for item in prepared
+    ]
+    if not ok:
+        return results
+
+    inputs = {}
+    for action in actions:
+        builder = _INPUTS[action]
+        if builder in inputs:
+            continue  # age and gender reuse the same crops
+        inputs[builder] = [builder(prepared[i]['crop']) for i in ok]
+
+    for action in actions:
+        probs = _predict(action, inputs[_INPUTS[action]])
+        for i, row in zip(ok, probs):
+            results[i].update(_decode_outputs(action, row))
+    return results
+
+
+def analyze_frame(frame_data, actions=None, hint=None):
+    return analyze_frames([frame_data], actions, [hint])[0]
@@ -0,0 +1,153 @@
+"""
+Keyset (cursor) pagination for the list APIs.
+
+A page is fetched with `WHERE (ordering key) < (last key seen)` instead of an
+OFFSET. Page cost stays flat however deep the client goes, and rows added
+while paging do not shift later pages. Every ordering ends in a unique field
+(`id`), so the order is total and stable.
+
+Query parameters understood by `paginate`/`list_response`:
+    limit   page size (capped at MAX_PAGE_SIZE)
+    cursor  opaque token from the previous page's `next_cursor`
+A request with neither `limit` nor `cursor` gets the whole list in one
+response, as before pagination existed. A `cursor` without `limit` pages by
+DEFAULT_PAGE_SIZE.
+    fields  comma-separated subset of item keys to return
+Responses carry a weak ETag over the body and answer a matching
+`If-None-Match` with 304.
+"""
+import base64
+import datetime
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class CursorError(ValueError):
+    """Bad `cursor` / `limit` parameter; reported to the client as a 400."""
+
+
+# ------------------------------
+# Cursor encoding
+# ------------------------------
+def encode_cursor(values):
+    encoded = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(encoded).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, length):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise CursorError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise CursorError("Invalid cursor")
+    if not all(isinstance(v, (str, int, float)) for v in values):
+        raise CursorError("Invalid cursor")
+    try:
+        # parse_datetime raises ValueError for well-formed but impossible dates
+        return [parse_datetime(v) or v if isinstance(v, str) else v for v in values]
+    except ValueError:
+        raise CursorError("Invalid cursor")
+
+
+def _after(order, values):
+    """Q for rows strictly after `values` in `order` (e.g. ['-started_at', '-id'])."""
+    condition = Q()
+    for i, field in enumerate(order):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[i]})
+        for previous, value in zip(order[:i], values[:i]):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+# ------------------------------
+# Paging
+# ------------------------------
+def page_size(request):
+    """Requested page size, or None if the client did not opt into paging."""
+    raw = request.GET.get('limit')
+    if not raw:
+        return DEFAULT_PAGE_SIZE if request.GET.get('cursor') else None
+    try:
+        size = int(raw)
+    except ValueError:
+        raise CursorError("limit must be an integer")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate(queryset, request, order, serialize):
+    """
+    One page of `queryset` ordered by `order` (last field must be unique).
+    Returns (items, next_cursor); next_cursor is None on the last page, and
+    always when the client sent neither `limit` nor `cursor` (everything).
+    """
+    limit = page_size(request)
+    queryset = queryset.order_by(*order)
+    token = request.GET.get('cursor')
+    if token:
+        try:
+            queryset = queryset.filter(_after(order, decode_cursor(token, len(order))))
+        except (ValueError, TypeError, ValidationError):
+            # Values of the wrong type for the ordering fields
+            raise CursorError("Invalid cursor")
+    if limit is None:
+        return [serialize(row) for row in queryset], None
+
+    rows = list(queryset[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, field.lstrip('-')) for field in order])
+    return [serialize(row) for row in rows], next_cursor
+
+
+def select_fields(request, items):
+    """Apply `?fields=a,b` to a list of dicts (unknown names are ignored)."""
+    fields = [f.strip() for f in request.GET.get('fields', '').split(',') if f.strip()]
+    if not fields:
+        return items
+    return [{key: item[key] for key in fields if key in item} for item in items]
+
+
+# ------------------------------
+# Responses
+# ------------------------------
+def etag_json_response(request, data):
+    """JsonResponse with a weak ETag; 304 if the client's If-None-Match matches."""
+    body = json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+    etag = 'W/"%s"' % hashlib.sha256(body).hexdigest()[:32]
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def list_response(request, key, items, next_cursor, **extra):
+    """Standard paged list body: {key: items, next_cursor, has_more, **extra}."""
+    data = dict(extra)
+    data[key] = select_fields(request, items)
+    data['next_cursor'] = next_cursor
+    data['has_more'] = next_cursor is not None
+    return etag_json_response(request, data)
+
+
+def cursor_error_response(error):
+    return JsonResponse({'error': str(error)}, status=400)
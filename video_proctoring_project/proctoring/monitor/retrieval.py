@@ -0,0 +1,184 @@
+"""
+Local BM25 retrieval over transcript chunks for the AI tutor endpoints.
+
+Each video gets one index, built from its `Transcript` the first time a
+question is asked and persisted as `transcripts/{video_id}_index.json` next
+to the transcript cache. Questions are answered with the top-k chunks instead
+of a fixed window around the playback position.
+"""
+import json
+import math
+import re
+import threading
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+
+from .singleflight import atomic_write_json
+from .transcripts import TRANSCRIPTS_DIR, load_transcript
+
+INDEX_VERSION = 1
+CHUNK_SECONDS = 60      # target span of one chunk for timed transcripts
+CHUNK_MAX_WORDS = 160   # hard cap so untimed (start=0) captions still split
+BM25_K1 = 1.5
+BM25_B = 0.75
+MAX_CACHED_INDEXES = 64
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my of on or so that the their them then there these they this to was we what when
+where which who why will with you your just like okay um uh yeah
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_VTT_TAG_RE = re.compile(r"<[^>]+>")
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def tokenize(text):
+    return [tok for tok in _TOKEN_RE.findall(text.lower()) if tok not in STOPWORDS and len(tok) > 1]
+
+
+def _format_time(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+# ------------------------------
+# Index
+# ------------------------------
+class TranscriptIndex:
+    """BM25 postings over fixed-size transcript chunks."""
+
+    def __init__(self, video_id, chunks, postings, doc_lengths, segment_count):
+        self.video_id = video_id
+        self.chunks = chunks              # [{"start", "end", "text"}]
+        self.postings = postings          # term -> [[chunk_idx, tf], ...]
+        self.doc_lengths = doc_lengths    # tokens per chunk
+        self.segment_count = segment_count
+        self.chunk_starts = [chunk["start"] for chunk in chunks]
+        total = sum(doc_lengths)
+        self.avgdl = (total / len(doc_lengths)) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, transcript):
+        chunks = []
+        words = []
+        chunk_start = None
+        last_start = 0.0
+        for i in range(len(transcript)):
+            start = transcript.starts[i]
+            if chunk_start is None:
+                chunk_start = start
+            words.extend(_VTT_TAG_RE.sub("", transcript.segment_text(i)).split())
+            last_start = start
+            if start - chunk_start >= CHUNK_SECONDS or len(words) >= CHUNK_MAX_WORDS:
+                chunks.append({"start": chunk_start, "end": start + transcript.durations[i], "text": " ".join(words)})
+                words = []
+                chunk_start = None
+        if words:
+            chunks.append({"start": chunk_start, "end": last_start, "text": " ".join(words)})
+
+        postings = {}
+        doc_lengths = []
+        for idx, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk["text"]))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append([idx, tf])
+        return cls(transcript.video_id, chunks, postings, doc_lengths, len(transcript))
+
+    def to_dict(self):
+        return {
+            "version": INDEX_VERSION,
+            "video_id": self.video_id,
+            "segment_count": self.segment_count,
+            "chunks": self.chunks,
+            "postings": self.postings,
+            "doc_lengths": self.doc_lengths,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["video_id"], data["chunks"], data["postings"], data["doc_lengths"], data["segment_count"])
+
+    def search(self, query, k=4):
+        """Return up to k chunks ranked by BM25 score (each with a "score" key)."""
+        n = len(self.chunks)
+        if not n:
+            return []
+        scores = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for idx, tf in plist:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[idx] / (self.avgdl or 1))
+                scores[idx] = scores.get(idx, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [dict(self.chunks[idx], score=round(score, 4)) for idx, score in ranked]
+
+    def chunk_at(self, seconds):
+        """Chunk covering a playback position (last chunk starting at or before it)."""
+        idx = bisect_right(self.chunk_starts, seconds) - 1
+        return self.chunks[idx] if idx >= 0 else None
+
+
+def _index_path(video_id):
+    return TRANSCRIPTS_DIR / f"{video_id}_index.json"
+
+
+def get_index(video_id):
+    """Load (or build and persist) the retrieval index for a video."""
+    with _cache_lock:
+        cached = _cache.get(video_id)
+        if cached is not None:
+            _cache.move_to_end(video_id)
+            return cached
+
+    transcript = load_transcript(video_id)
+    index = None
+    path = _index_path(video_id)
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION and data.get("segment_count") == len(transcript):
+                index = TranscriptIndex.from_dict(data)
+        except Exception as e:
+            print(f"Ignoring unreadable index for {video_id}: {e}")
+
+    # Only cache indexes for real transcripts, never for the mock placeholder
+    has_transcript = (TRANSCRIPTS_DIR / f"{video_id}_timestamps.json").exists()
+    if index is None:
+        index = TranscriptIndex.build(transcript)
+        if not has_transcript:
+            return index
+        try:
+            atomic_write_json(path, index.to_dict())
+        except Exception as e:
+            print(f"Could not persist index for {video_id}: {e}")
+
+    with _cache_lock:
+        _cache[video_id] = index
+        while len(_cache) > MAX_CACHED_INDEXES:
+            _cache.popitem(last=False)
+    return index
+
+
+def retrieve_context(video_id, question, current_time=None, k=4):
+    """
+    Transcript context for a tutor prompt: the top-k BM25 chunks for the
+    question, plus the chunk at the current playback position when given,
+    ordered by time and prefixed with [mm:ss] markers.
+    """
+    index = get_index(video_id)
+    chosen = {(c["start"], c["end"]): c for c in index.search(question, k=k)}
+    if current_time is not None:
+        here = index.chunk_at(current_time)
+        if here is not None:
+            chosen.setdefault((here["start"], here["end"]), here)
+    ordered = sorted(chosen.values(), key=lambda c: c["start"])
+    return "\n".join(f"[{_format_time(c['start'])}] {c['text']}" for c in ordered)
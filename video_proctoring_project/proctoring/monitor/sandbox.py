@@ -0,0 +1,341 @@
+"""
+Confinement for untrusted code: graded submissions (monitor.judge) and
+practice runs (monitor.interpreter_pool).
+
+Threat model: submitted code is hostile and runs on the same host as the web
+and job workers. It must not read or change anything outside its own scratch
+directory (db.sqlite3, media, .env, other students' submissions). It must not
+open network connections or signal the worker processes. rlimits only bound
+CPU, memory and output. The isolation itself comes from:
+
+- Landlock (Linux 5.13+, no privileges needed). The child can read and
+  execute the system and interpreter directories and write only its scratch
+  directory. From Landlock ABI 4 (Linux 6.7) TCP bind/connect are denied too.
+  From ABI 6 (Linux 6.12), signals and abstract unix sockets that leave the
+  sandbox are also denied. Docker's default seccomp profile allows Landlock
+  from Docker 23.
+- When the worker runs as root, each child also runs under a uid of its own,
+  leased from SANDBOX_UID_BASE .. +SANDBOX_UID_COUNT (gid of SANDBOX_USER).
+  RLIMIT_NPROC counts per uid, so a leased uid makes the process limit apply
+  per run. When the run is released, every process left under its uid is
+  killed, including ones that escaped the process group. Without root,
+  RLIMIT_NPROC is relative to what the worker's uid already runs, and only
+  the process group is killed.
+
+Every command is started through a small launcher (`python -c _LAUNCHER`).
+The launcher applies the limits and then execs the target. So nothing runs
+between fork and exec in the multi-threaded parent (no preexec_fn). If the
+kernel cannot provide the isolation, the launcher exits with LAUNCHER_FAILED
+and callers raise SandboxUnavailable. Code is never run unconfined by
+accident. SANDBOX_ALLOW_UNCONFINED=1 turns the isolation into best effort;
+set it on development machines only.
+"""
+import fcntl
+import json
+import os
+import pwd
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+SANDBOX_USER = os.getenv("SANDBOX_USER", "nobody")   # used when the worker runs as root
+# Per-run uids (worker running as root); SANDBOX_UID_COUNT=0 runs everything as SANDBOX_USER
+SANDBOX_UID_BASE = int(os.getenv("SANDBOX_UID_BASE", 200000))
+SANDBOX_UID_COUNT = int(os.getenv("SANDBOX_UID_COUNT", 1024))
+UID_LEASE_DIR = Path(tempfile.gettempdir()) / "sandbox-uids"
+ALLOW_UNCONFINED = os.getenv("SANDBOX_ALLOW_UNCONFINED", "") == "1"
+MIN_LANDLOCK_ABI = 4      # first ABI that can deny network access
+LAUNCHER_FAILED = 125
+
+# Read + execute for the child; everything else on the filesystem is denied
+READ_ONLY_PATHS = ['/usr', '/lib', '/lib32', '/lib64', '/bin', '/sbin', '/etc']
+DEVICES = ['/dev/null', '/dev/zero', '/dev/urandom']
+
+_LAUNCHER = r'''
+import ctypes, json, os, resource, sys
+
+config = json.loads(sys.argv[1])
+command = sys.argv[2:]
+
+
+def fail(message):
+    os.write(2, ("sandbox: " + message + "\n").encode())
+    os._exit(LAUNCHER_FAILED)
+
+
+# Landlock (linux/landlock.h); the syscall numbers are the same on every architecture
+CREATE_RULESET, ADD_RULE, RESTRICT_SELF = 444, 445, 446
+EXECUTE, WRITE_FILE, READ_FILE, READ_DIR = 1, 2, 4, 8
+TRUNCATE, IOCTL_DEV = 1 << 14, 1 << 15
+FILE_RIGHTS = EXECUTE | WRITE_FILE | READ_FILE | TRUNCATE | IOCTL_DEV
+PR_SET_NO_NEW_PRIVS = 38
+
+
+class RulesetAttr(ctypes.Structure):
+    _fields_ = [("fs", ctypes.c_uint64), ("net", ctypes.c_uint64), ("scoped", ctypes.c_uint64)]
+
+
+class PathBeneath(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [("allowed", ctypes.c_uint64), ("fd", ctypes.c_int32)]
+
+
+def landlock(read_paths, write_paths, devices):
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.syscall.restype = ctypes.c_long
+    abi = libc.syscall(CREATE_RULESET, None, ctypes.c_size_t(0), ctypes.c_uint32(1))
+    if abi < config["min_abi"]:
+        return "Landlock ABI %d is unavailable (kernel has %d)" % (config["min_abi"], max(abi, 0))
+    handled = (1 << {1: 13, 2: 14, 3: 15, 4: 15}.get(abi, 16)) - 1
+    attr = RulesetAttr(handled, 3 if abi >= 4 else 0, 3 if abi >= 6 else 0)  # TCP bind+connect; unix+signal scope
+    size = 8 if abi < 4 else 16 if abi < 6 else 24
+    ruleset = libc.syscall(CREATE_RULESET, ctypes.byref(attr), ctypes.c_size_t(size), ctypes.c_uint32(0))
+    if ruleset < 0:
+        return "landlock_create_ruleset: " + os.strerror(ctypes.get_errno())
+    rules = [(p, EXECUTE | READ_FILE | READ_DIR) for p in read_paths]
+    rules += [(p, handled) for p in write_paths] + [(p, READ_FILE | WRITE_FILE) for p in devices]
+    for path, allowed in rules:
+        try:
+            fd = os.open(path, os.O_PATH | os.O_CLOEXEC)
+        except OSError:
+            continue
+        if not os.path.isdir(path):
+            allowed &= FILE_RIGHTS
+        rule = PathBeneath(allowed & handled, fd)
+        if libc.syscall(ADD_RULE, ruleset, ctypes.c_uint32(1), ctypes.byref(rule), ctypes.c_uint32(0)) < 0:
+            return "landlock_add_rule(%s): %s" % (path, os.strerror(ctypes.get_errno()))
+        os.close(fd)
+    if libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) < 0 or libc.syscall(RESTRICT_SELF, ruleset, ctypes.c_uint32(0)) < 0:
+        return "landlock_restrict_self: " + os.strerror(ctypes.get_errno())
+    os.close(ruleset)
+    return None
+
+
+def tasks_of(uid):
+    """Processes + threads of `uid`: what RLIMIT_NPROC counts."""
+    count = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open("/proc/%s/status" % pid) as f:
+                fields = dict(line.split(":", 1) for line in f if ":" in line)
+            if int(fields["Uid"].split()[0]) == uid:
+                count += int(fields["Threads"])
+        except (OSError, KeyError, ValueError):
+            pass
+    return count
+
+
+os.umask(0o077)
+for name, limits in config["rlimits"].items():
+    if name == "RLIMIT_NPROC":
+        # Counted per uid: allow this many on top of what the run's uid already has
+        used = tasks_of(os.getuid() if config["uid"] is None else config["uid"])
+        limits = [used + limits[0], used + limits[1]]
+    resource.setrlimit(getattr(resource, name), tuple(limits))
+error = landlock(config["read"], config["write"], config["devices"])
+if error and config["required"]:
+    fail(error)
+if config["uid"] is not None:
+    try:
+        os.setgroups([])
+        os.setgid(config["gid"])
+        os.setuid(config["uid"])
+    except OSError as e:
+        fail("cannot switch to uid %d: %s" % (config["uid"], e))
+try:
+    os.execv(command[0], command)
+except OSError as e:
+    fail("cannot exec %s: %s" % (command[0], e))
+'''.replace("LAUNCHER_FAILED", str(LAUNCHER_FAILED))
+
+
+class SandboxUnavailable(Exception):
+    """This host cannot confine untrusted code; refuse to run it."""
+
+
+def _sandbox_ids():
+    """(uid, gid) of SANDBOX_USER, or (None, None) to keep the worker's own."""
+    if os.name != 'posix' or os.geteuid() != 0:
+        return None, None
+    try:
+        entry = pwd.getpwnam(SANDBOX_USER)
+    except KeyError:
+        raise SandboxUnavailable(f"SANDBOX_USER '{SANDBOX_USER}' does not exist")
+    return entry.pw_uid, entry.pw_gid
+
+
+# Run as the target uid: signals every process it owns, except this helper
+_KILL_UID = r'''
+import os, signal, sys
+os.setgroups([])
+os.setgid(int(sys.argv[2]))
+os.setuid(int(sys.argv[1]))
+try:
+    os.kill(-1, signal.SIGKILL)
+except ProcessLookupError:
+    pass
+'''
+
+
+def _kill_uid(uid, gid):
+    subprocess.run([sys.executable, '-I', '-S', '-c', _KILL_UID, str(uid), str(gid)], timeout=30, check=True)
+
+
+class _UidLease:
+    """
+    A uid from the per-run range, held through a flock on UID_LEASE_DIR/<uid>
+    so worker processes never share one. A lock file left non-empty means the
+    previous holder died without cleaning up; its processes are killed first.
+    """
+
+    def __init__(self, gid):
+        self.gid = gid
+        UID_LEASE_DIR.mkdir(mode=0o700, exist_ok=True)
+        start = random.randrange(SANDBOX_UID_COUNT)
+        for i in range(SANDBOX_UID_COUNT):
+            uid = SANDBOX_UID_BASE + (start + i) % SANDBOX_UID_COUNT
+            fd = os.open(UID_LEASE_DIR / str(uid), os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            self.uid, self._fd = uid, fd
+            if os.fstat(fd).st_size:
+                _kill_uid(uid, gid)
+            os.write(fd, b"1")
+            return
+        raise SandboxUnavailable(f"All {SANDBOX_UID_COUNT} sandbox uids are in use")
+
+    def release(self):
+        try:
+            _kill_uid(self.uid, self.gid)
+            os.ftruncate(self._fd, 0)
+        finally:
+            os.close(self._fd)  # drops the lock
+
+
+class SandboxProcess(subprocess.Popen):
+    """A confined child; call release() once done with it."""
+
+    lease = None
+    released = False
+
+    def release(self):
+        """Kill whatever the run left behind (its process group, its leased uid) and reap it."""
+        if self.released:
+            return
+        self.released = True
+        if os.name == 'posix':
+            try:
+                os.killpg(self.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        else:
+            self.kill()
+        self.wait()
+        lease, self.lease = self.lease, None
+        if lease is not None:
+            lease.release()
+
+
+def _install_prefix(executable):
+    """Directory tree an interpreter loads its own files from (/usr/bin/node -> /usr)."""
+    return os.path.dirname(os.path.dirname(os.path.realpath(executable)))
+
+
+def prepare_workdir(workdir, uid, gid):
+    """Hand a scratch directory (and anything already written into it) to the run's uid."""
+    if uid is None:
+        return
+    for root, dirs, files in os.walk(workdir):
+        for name in [root] + [os.path.join(root, n) for n in dirs + files]:
+            os.chown(name, uid, gid)
+
+
+def popen(command, workdir, rlimits=None, **kwargs):
+    """
+    SandboxProcess for `command`, confined to `workdir` (see module docstring).
+    The child gets its own session (and uid, when leased); the caller must
+    call release() on it when done. Raises FileNotFoundError if the runtime
+    is not installed.
+    """
+    if os.name != 'posix':
+        if not ALLOW_UNCONFINED:
+            raise SandboxUnavailable("Running untrusted code needs Linux (set SANDBOX_ALLOW_UNCONFINED=1 for development)")
+        return SandboxProcess(command, cwd=workdir, **kwargs)
+
+    env = kwargs.get("env") or os.environ
+    executable = shutil.which(command[0], path=env.get("PATH"))
+    if executable is None:
+        raise FileNotFoundError(command[0])
+    uid, gid = _sandbox_ids()
+    lease = None
+    if uid is not None and SANDBOX_UID_COUNT > 0:
+        lease = _UidLease(gid)
+        uid = lease.uid
+    prefixes = {sys.prefix, sys.base_prefix, _install_prefix(sys.executable), _install_prefix(executable)}
+    config = {
+        "rlimits": {name: list(limits) for name, limits in (rlimits or {}).items()},
+        "read": READ_ONLY_PATHS + sorted(prefixes),
+        "write": [workdir],
+        "devices": DEVICES,
+        "min_abi": MIN_LANDLOCK_ABI,
+        "required": not ALLOW_UNCONFINED,
+        "uid": uid,
+        "gid": gid,
+    }
+    launcher = [sys.executable, '-I', '-S', '-c', _LAUNCHER, json.dumps(config), executable, *command[1:]]
+    try:
+        prepare_workdir(workdir, uid, gid)
+        process = SandboxProcess(launcher, cwd=workdir, start_new_session=True, **kwargs)
+    except BaseException:
+        if lease is not None:
+            lease.release()
+        raise
+    process.lease = lease
+    return process
+
+
+def launcher_error(returncode, stderr):
+    """The launcher's message if it refused to start the command, else None."""
+    if returncode == LAUNCHER_FAILED and stderr.startswith(b"sandbox: "):
+        return stderr.decode("utf-8", errors="replace").strip()
+    return None
+
+
+# ------------------------------
+# Availability probe
+# ------------------------------
+_probe_result = None
+_probe_lock = threading.Lock()
+
+
+def ensure_available():
+    """Raise SandboxUnavailable (once per process, then cached) if untrusted code cannot be confined here."""
+    global _probe_result
+    with _probe_lock:
+        if _probe_result is None:
+            workdir = tempfile.mkdtemp(prefix="sandbox_probe_")
+            try:
+                process = popen([sys.executable, '-I', '-S', '-c', 'pass'], workdir,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env={"PATH": os.environ.get("PATH", "")})
+                try:
+                    _, stderr = process.communicate(timeout=30)
+                finally:
+                    process.release()
+                error = launcher_error(process.returncode, stderr)
+                _probe_result = error or ("" if process.returncode == 0 else stderr.decode(errors="replace").strip())
+            except SandboxUnavailable as e:
+                _probe_result = str(e)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+    if _probe_result:
+        raise SandboxUnavailable(f"Cannot confine untrusted code on this host: {_probe_result}")
@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import StudentProfile
+from .models import StudentProfile, Exam, Question, TestCase
+from .exam_papers import build_paper, invalidate_paper
+from .grading import invalidate_answer_key
 
 @receiver(post_save, sender=StudentProfile)
 def set_student_password(sender, instance, created, **kwargs):
@@ -10,3 +13,29 @@ def set_student_password(sender, instance, created, **kwargs):
         user = instance.user
         user.set_password(dob_str)
         user.save()
+
+
+# Exam paper snapshots / answer keys: drop on any change, rebuild the paper eagerly when a published exam is saved
+@receiver(post_save, sender=Exam)
+def refresh_exam_paper(sender, instance, **kwargs):
+    invalidate_paper(instance.id)
+    invalidate_answer_key(instance.id)
+    if instance.is_published:
+        transaction.on_commit(lambda: build_paper(instance.id))
+
+@receiver(post_delete, sender=Exam)
+def drop_exam_paper(sender, instance, **kwargs):
+    invalidate_paper(instance.id)
+    invalidate_answer_key(instance.id)
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_paper_for_question(sender, instance, **kwargs):
+    invalidate_paper(instance.exam_id)
+    invalidate_answer_key(instance.exam_id)
+
+@receiver([post_save, post_delete], sender=TestCase)
+def invalidate_paper_for_test_case(sender, instance, **kwargs):
+    exam_id = Question.objects.filter(id=instance.question_id).values_list('exam_id', flat=True).first()
+    if exam_id:
+        invalidate_paper(exam_id)
+        invalidate_answer_key(exam_id)
@@ -0,0 +1,161 @@
+"""
+Single-flight coalescing and atomic cache writes.
+
+When many students open a freshly shared course at once, every request for the
+same video would otherwise run yt-dlp, fetch the transcript and call the LLM on
+its own. `single_flight` lets the first caller for a key do the work while
+concurrent callers wait and reuse its result:
+
+* threads in the same process wait on the leader's in-flight call;
+* other worker processes block on a per-key file lock, then re-check the cache
+  (via `recheck`) or pick up the leader's shared result file before computing.
+
+Cache files are written with `atomic_write_text`/`atomic_write_json` (temp file
+in the same directory + `os.replace`) so readers never see a torn file.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: in-process coalescing only
+    fcntl = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
+LOCKS_DIR = BASE_DIR / "transcripts" / ".locks"
+LOCKS_DIR.mkdir(parents=True, exist_ok=True)
+
+# How long a finished course plan is reused by followers in other workers
+RESULT_SHARE_SECONDS = 300
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+# ------------------------------
+# Atomic writes
+# ------------------------------
+def atomic_write_bytes(path, data):
+    """Write bytes to `path` via a temp file + rename so readers see old or new, never partial."""
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_text(path, text, encoding="utf-8"):
+    atomic_write_bytes(path, text.encode(encoding))
+
+
+def atomic_write_json(path, data):
+    atomic_write_text(path, json.dumps(data))
+
+
+# ------------------------------
+# Locks
+# ------------------------------
+def _key_name(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def file_lock(key):
+    """Exclusive cross-process lock for `key` (no-op where fcntl is unavailable)."""
+    if fcntl is None:
+        yield
+        return
+    with open(LOCKS_DIR / f"{_key_name(key)}.lock", "a") as handle:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _shared_result_path(key):
+    return LOCKS_DIR / f"{_key_name(key)}.result.json"
+
+
+def _read_shared_result(key, share_seconds):
+    path = _shared_result_path(key)
+    try:
+        if time.time() - path.stat().st_mtime > share_seconds:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# ------------------------------
+# Single flight
+# ------------------------------
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def single_flight(key, compute, recheck=None, share_seconds=0):
+    """
+    Run `compute()` at most once at a time per `key` and share its result.
+
+    `recheck()` is called after acquiring the cross-process lock; a non-None
+    return value (e.g. a cache file another worker just wrote) is used instead
+    of computing. With `share_seconds > 0` the leader also publishes its
+    JSON-serialisable result so followers in other processes can reuse it for
+    that long.
+    """
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _inflight[key] = call
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        with file_lock(key):
+            result = recheck() if recheck else None
+            if result is None and share_seconds:
+                result = _read_shared_result(key, share_seconds)
+            if result is None:
+                result = compute()
+                if share_seconds:
+                    try:
+                        atomic_write_json(_shared_result_path(key), result)
+                    except Exception as e:
+                        print(f"Could not share result for {key}: {e}")
+        call.result = result
+        return result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call.done.set()
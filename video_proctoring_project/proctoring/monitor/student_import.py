@@ -0,0 +1,218 @@
+"""
+Bulk student import from CSV.
+
+The old loader did an `exists()` check and a `create_user` per row. Each
+create_user is a full PBKDF2 hash, and then the `StudentProfile` post_save
+signal hashed the same DOB password again and saved the user a second time.
+
+This pipeline instead:
+1. Parses and validates the whole file up front; nothing is written if any
+   row is bad.
+2. Diffs it against the database in a few queries: create, update or skip.
+3. Hashes the new passwords in a process pool.
+4. Writes users, profiles and proctoring candidates with `bulk_create` /
+   `bulk_update` in one transaction. `bulk_create` sends no signals, so each
+   password is hashed exactly once.
+
+CSV columns: roll_number, name, dob (YYYY-MM-DD), optional department and
+email. A header row is detected and skipped.
+"""
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Candidate, StudentProfile
+
+BULK_CHUNK_SIZE = 1000
+HASH_CHUNK_SIZE = 64          # passwords per task sent to a hashing worker
+ROLL_NUMBER_RE = re.compile(r'^[\w.@+-]{1,50}$')  # must also be a valid username
+PROFILE_FIELDS = ['full_name', 'dob', 'department']
+
+
+class ImportValidationError(ValueError):
+    """The file has invalid rows; `errors` lists them as (line, message)."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+
+
+# ------------------------------
+# Parsing / validation
+# ------------------------------
+def parse_rows(lines):
+    """Validate CSV lines; returns a list of row dicts or raises ImportValidationError."""
+    rows, errors, seen = [], [], {}
+    for line_no, raw in enumerate(csv.reader(lines), 1):
+        if not raw or not any(cell.strip() for cell in raw):
+            continue
+        if line_no == 1 and raw[0].strip().lower().replace(' ', '_') in ('roll_number', 'roll_no', 'roll'):
+            continue
+        cells = [cell.strip() for cell in raw] + [''] * 5
+        roll_number, full_name, dob_str, department, email = cells[:5]
+
+        if not ROLL_NUMBER_RE.match(roll_number):
+            errors.append((line_no, f"Invalid roll number '{roll_number}'"))
+            continue
+        if roll_number in seen:
+            errors.append((line_no, f"Duplicate roll number {roll_number} (first on line {seen[roll_number]})"))
+            continue
+        seen[roll_number] = line_no
+        if not full_name:
+            errors.append((line_no, f"Missing name for {roll_number}"))
+            continue
+        try:
+            dob = datetime.strptime(dob_str, '%Y-%m-%d').date()
+        except ValueError:
+            errors.append((line_no, f"Invalid date '{dob_str}' for {roll_number} (expected YYYY-MM-DD)"))
+            continue
+
+        rows.append({
+            'line': line_no,
+            'roll_number': roll_number,
+            'full_name': full_name,
+            'dob': dob,
+            'department': department or None,
+            'email': email or '',
+        })
+    if errors:
+        raise ImportValidationError(errors)
+    return rows
+
+
+def parse_csv(filepath):
+    with open(filepath, 'r', encoding='utf-8-sig', newline='') as f:
+        return parse_rows(f)
+
+
+# ------------------------------
+# Planning
+# ------------------------------
+def plan_import(rows):
+    """
+    Split rows into create / update / skip against the database (2 queries).
+    Returns {"create": [row], "update": [(profile, row)], "skip": [(row, reason)]}.
+    """
+    rolls = [row['roll_number'] for row in rows]
+    profiles = {p.roll_number: p for p in StudentProfile.objects.filter(roll_number__in=rolls)}
+    taken_usernames = set(User.objects.filter(username__in=rolls).values_list('username', flat=True))
+
+    plan = {'create': [], 'update': [], 'skip': []}
+    for row in rows:
+        profile = profiles.get(row['roll_number'])
+        if profile is None:
+            if row['roll_number'] in taken_usernames:
+                plan['skip'].append((row, 'username already used by a non-student account'))
+            else:
+                plan['create'].append(row)
+        elif any(getattr(profile, field) != row[field] for field in PROFILE_FIELDS if row[field] is not None):
+            plan['update'].append((profile, row))
+        else:
+            plan['skip'].append((row, 'unchanged'))
+    return plan
+
+
+# ------------------------------
+# Hashing
+# ------------------------------
+def _init_hash_worker():
+    # Spawned workers (macOS/Windows) start without Django set up; forked ones inherit it
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def hash_passwords(passwords, workers=None):
+    """make_password for each password, spread over a process pool."""
+    if not passwords:
+        return []
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) < HASH_CHUNK_SIZE:
+        return [make_password(password) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_hash_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=HASH_CHUNK_SIZE))
+
+
+def dob_password(dob):
+    return dob.strftime('%Y%m%d')  # YYYYMMDD, same as the StudentProfile signal
+
+
+# ------------------------------
+# Import
+# ------------------------------
+def _split_name(full_name):
+    parts = full_name.split()
+    return (parts[0] if parts else ''), ' '.join(parts[1:])
+
+
+def apply_import(plan, workers=None, reset_passwords=False):
+    """
+    Write a plan produced by `plan_import`. Updated students keep their
+    password unless `reset_passwords` is set (then it is reset to the DOB).
+    Returns {"created": n, "updated": n, "skipped": n}.
+    """
+    creates = plan['create']
+    updates = plan['update']
+    rehash = updates if reset_passwords else []
+    hashes = hash_passwords(
+        [dob_password(row['dob']) for row in creates] + [dob_password(row['dob']) for _, row in rehash],
+        workers=workers,
+    )
+    create_hashes, update_hashes = hashes[:len(creates)], hashes[len(creates):]
+
+    with transaction.atomic():
+        users = []
+        for row, password in zip(creates, create_hashes):
+            first_name, last_name = _split_name(row['full_name'])
+            users.append(User(
+                username=row['roll_number'], password=password, email=row['email'],
+                first_name=first_name, last_name=last_name,
+            ))
+        User.objects.bulk_create(users, batch_size=BULK_CHUNK_SIZE)
+        # Not every backend returns primary keys from bulk_create; look them up
+        user_ids = dict(
+            User.objects.filter(username__in=[row['roll_number'] for row in creates]).values_list('username', 'id')
+        )
+
+        # bulk_create skips post_save, so the DOB password is not hashed a second time
+        StudentProfile.objects.bulk_create(
+            [
+                StudentProfile(
+                    user_id=user_ids[row['roll_number']], roll_number=row['roll_number'],
+                    full_name=row['full_name'], dob=row['dob'], department=row['department'],
+                )
+                for row in creates
+            ],
+            batch_size=BULK_CHUNK_SIZE,
+        )
+        Candidate.objects.bulk_create(
+            [
+                Candidate(name=row['full_name'], roll_number=row['roll_number'], email=row['email'] or None)
+                for row in creates
+            ],
+            batch_size=BULK_CHUNK_SIZE,
+            ignore_conflicts=True,
+        )
+
+        for profile, row in updates:
+            profile.full_name, profile.dob = row['full_name'], row['dob']
+            if row['department'] is not None:
+                profile.department = row['department']
+        StudentProfile.objects.bulk_update(
+            [profile for profile, _ in updates], PROFILE_FIELDS, batch_size=BULK_CHUNK_SIZE
+        )
+        if rehash:
+            users_to_reset = list(User.objects.filter(id__in=[profile.user_id for profile, _ in rehash]))
+            by_id = {profile.user_id: password for (profile, _), password in zip(rehash, update_hashes)}
+            for user in users_to_reset:
+                user.password = by_id[user.id]
+            User.objects.bulk_update(users_to_reset, ['password'], batch_size=BULK_CHUNK_SIZE)
+
+    return {'created': len(creates), 'updated': len(updates), 'skipped': len(plan['skip'])}
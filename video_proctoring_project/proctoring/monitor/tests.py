@@ -1,3 +1,464 @@
-from django.test import TestCase
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase
+
+from . import benchmarks, engagement, face_detectors, frame_hints, inference, interpreter_pool, judge, pagination, sandbox, vision
+
+FRAMES_DIR = Path(settings.MEDIA_ROOT) / 'evidence' / 'frames'
+PARITY_FRAMES = 16
+
+# Startup must not pull in any of these (see lazy_imports)
+HEAVY_MODULES = ('cv2', 'tensorflow', 'torch', 'deepface', 'ultralytics', 'onnxruntime', 'speech_recognition', 'pydub')
+IMPORT_BUDGET_SECONDS = float(os.getenv('IMPORT_BUDGET_SECONDS', 1.5))
+
+
+def _evidence_frames(limit=PARITY_FRAMES):
+    paths = sorted(FRAMES_DIR.glob('*.jpg'))[:limit]
+    frames = [cv2.imread(str(p), cv2.IMREAD_COLOR) for p in paths]
+    return [f for f in frames if f is not None]
+
+
+def _face_region(frame):
+    # Webcam frames are framed around the learner; the upper middle is where the face sits
+    h, w = frame.shape[:2]
+    return frame[int(h * 0.1):int(h * 0.7), int(w * 0.3):int(w * 0.7)]
+
+
+# ------------------------------
+# ONNX YOLO decoding (no model files needed)
+# ------------------------------
+class _Input:
+    def __init__(self, shape):
+        self.name = 'images'
+        self.shape = shape
+
+
+class _FakeYoloSession:
+    """Returns a fixed YOLOv8-style (1, 4 + classes, anchors) output."""
+
+    def __init__(self, output, shape=(1, 3, 320, 320)):
+        self.output = output
+        self.shape = shape
+        self.fed = None
+
+    def get_inputs(self):
+        return [_Input(list(self.shape))]
+
+    def run(self, _, feed):
+        self.fed = feed['images']
+        return [self.output]
+
+
+def _yolo_output(anchors, classes=3):
+    """anchors: [(cx, cy, w, h, class_id, score)] in letterboxed pixels."""
+    out = np.zeros((1, 4 + classes, len(anchors)), dtype=np.float32)
+    for i, (cx, cy, w, h, cls, score) in enumerate(anchors):
+        out[0, :4, i] = (cx, cy, w, h)
+        out[0, 4 + cls, i] = score
+    return out
+
+
+class OnnxDetectorTests(SimpleTestCase):
+    names = {0: 'person', 1: 'cell phone', 2: 'book'}
+
+    def test_boxes_map_back_through_letterbox(self):
+        # 640x480 into 320x320: scale 0.5, 40 px of padding above and below
+        session = _FakeYoloSession(_yolo_output([(160, 160, 100, 60, 1, 0.9)]))
+        detector = inference.OnnxDetector(session, self.names)
+        detections = detector.detect(np.zeros((480, 640, 3), np.uint8), 416, 0.25)
+        self.assertEqual(session.fed.shape, (1, 3, 320, 320))
+        self.assertEqual(len(detections), 1)
+        label, confidence, box = detections[0]
+        self.assertEqual(label, 'cell phone')
+        self.assertAlmostEqual(confidence, 0.9, places=5)
+        self.assertEqual(box, [220, 180, 420, 300])
+
+    def test_confidence_threshold_and_per_class_nms(self):
+        session = _FakeYoloSession(_yolo_output([
+            (100, 100, 50, 50, 1, 0.9),
+            (102, 101, 50, 50, 1, 0.8),   # duplicate phone: suppressed
+            (101, 100, 50, 50, 2, 0.7),   # same place, other class: kept
+            (250, 250, 40, 40, 0, 0.1),   # below threshold
+        ]))
+        detector = inference.OnnxDetector(session, self.names)
+        detections = detector.detect(np.zeros((320, 320, 3), np.uint8), 320, 0.25)
+        self.assertEqual([(d[0], round(d[1], 2)) for d in detections], [('cell phone', 0.9), ('book', 0.7)])
+
+    def test_dynamic_input_uses_requested_size(self):
+        session = _FakeYoloSession(_yolo_output([]), shape=('batch', 3, 'height', 'width'))
+        detector = inference.OnnxDetector(session, self.names)
+        self.assertEqual(detector.detect(np.zeros((480, 640, 3), np.uint8), 416, 0.25), [])
+        self.assertEqual(session.fed.shape, (1, 3, 416, 416))
+
+
+# ------------------------------
+# Native vs ONNX parity (skipped unless both runtimes and the exported models are present)
+# ------------------------------
+class InferenceParityTests(SimpleTestCase):
+
+    def _models(self, name, quantized):
+        try:
+            return inference.load(name, 'native'), inference.load(name, 'onnx', quantized)
+        except (inference.BackendUnavailable, ImportError) as e:
+            self.skipTest(str(e))
+
+    def _frames(self):
+        frames = _evidence_frames()
+        if not frames:
+            self.skipTest(f"No frames in {FRAMES_DIR}")
+        return frames
+
+    def _classifier_parity(self, name, build_input, quantized):
+        native, onnx = self._models(name, quantized)
+        batch = np.stack([build_input(_face_region(f)) for f in self._frames()])
+        expected, actual = native.predict(batch), onnx.predict(batch)
+        self.assertEqual(expected.shape, actual.shape)
+        if quantized:
+            agreement = np.mean(expected.argmax(axis=1) == actual.argmax(axis=1))
+            self.assertGreaterEqual(agreement, 0.9)
+            self.assertLess(float(np.abs(expected - actual).mean()), 0.05)
+        else:
+            np.testing.assert_allclose(actual, expected, atol=1e-3)
+
+    def _embedding_parity(self, quantized):
+        native, onnx = self._models('facenet', quantized)
+        batch = np.stack([inference.facenet_input(_face_region(f)) for f in self._frames()])
+        expected, actual = native.predict(batch), onnx.predict(batch)
+        expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+        actual /= np.linalg.norm(actual, axis=1, keepdims=True)
+        self.assertGreaterEqual(float((expected * actual).sum(axis=1).min()), 0.98 if quantized else 0.999)
+
+    def _yolo_parity(self, quantized):
+        native, onnx = self._models('yolo', quantized)
+        matched = total = 0
+        for frame in self._frames():
+            # Confident native detections must be found by ONNX at the serving threshold
+            expected = native.detect(frame, frame_hints.YOLO_IMGSZ, 0.4)
+            actual = onnx.detect(frame, frame_hints.YOLO_IMGSZ, 0.25)
+            for label, _, box in expected:
+                total += 1
+                ref = (box[0], box[1], box[2] - box[0], box[3] - box[1])
+                matched += any(
+                    other == label and frame_hints.iou(ref, (b[0], b[1], b[2] - b[0], b[3] - b[1])) >= 0.5
+                    for other, _, b in actual
+                )
+        if not total:
+            self.skipTest("No confident detections in the evidence frames")
+        self.assertGreaterEqual(matched / total, 0.8 if quantized else 0.9)
+
+    def test_emotion_parity(self):
+        self._classifier_parity('emotion', inference.emotion_input, quantized=False)
+
+    def test_age_parity(self):
+        self._classifier_parity('age', inference.face_input, quantized=False)
+
+    def test_gender_parity(self):
+        self._classifier_parity('gender', inference.face_input, quantized=False)
+
+    def test_facenet_parity(self):
+        self._embedding_parity(quantized=False)
+
+    def test_yolo_parity(self):
+        self._yolo_parity(quantized=False)
+
+    def test_emotion_parity_int8(self):
+        self._classifier_parity('emotion', inference.emotion_input, quantized=True)
+
+    def test_gender_parity_int8(self):
+        self._classifier_parity('gender', inference.face_input, quantized=True)
+
+    def test_facenet_parity_int8(self):
+        self._embedding_parity(quantized=True)
+
+    def test_yolo_parity_int8(self):
+        self._yolo_parity(quantized=True)
+
+
+# ------------------------------
+# Sandbox for untrusted code
+# ------------------------------
+class JudgeSandboxTests(SimpleTestCase):
+
+    def setUp(self):
+        try:
+            sandbox.ensure_available()
+        except sandbox.SandboxUnavailable as e:
+            self.skipTest(str(e))
+
+    def _python(self, code):
+        return judge.run_code('python', code)
+
+    def test_submission_cannot_touch_project_files(self):
+        db_path = str(Path(settings.BASE_DIR) / 'db.sqlite3')
+        run = self._python(
+            "for mode in ('rb', 'ab'):\n"
+            "    try:\n"
+            f"        open({db_path!r}, mode)\n"
+            "        print('opened', mode)\n"
+            "    except PermissionError:\n"
+            "        print('denied', mode)\n"
+            "open('scratch.txt', 'w').write('ok')\n"
+            "print(open('scratch.txt').read())\n"
+        )
+        self.assertEqual(run['status'], 'ok', run['stderr'])
+        self.assertEqual(run['stdout'].split(), ['denied', 'rb', 'denied', 'ab', 'ok'])
+
+    def test_submission_has_no_network(self):
+        run = self._python(
+            "import socket\n"
+            "try:\n"
+            "    socket.create_connection(('127.0.0.1', 80), timeout=2)\n"
+            "    print('connected')\n"
+            "except PermissionError:\n"
+            "    print('denied')\n"
+            "except OSError:\n"
+            "    print('reached the network stack')\n"
+        )
+        self.assertEqual(run['stdout'].strip(), 'denied')
+
+    def test_process_limit_is_per_run_and_leftovers_are_killed(self):
+        run = self._python(
+            "import os\n"
+            "pids = []\n"
+            "try:\n"
+            "    while len(pids) < 500:\n"
+            "        pid = os.fork()\n"
+            "        if pid == 0:\n"
+            "            os.setsid()  # leave the process group\n"
+            "            os.close(1)\n"
+            "            os.close(2)\n"
+            "            os.system('sleep 60')\n"
+            "            os._exit(0)\n"
+            "        pids.append(pid)\n"
+            "except OSError:\n"
+            "    pass\n"
+            "print(*pids)\n"
+        )
+        self.assertEqual(run['status'], 'ok', run['stderr'])
+        pids = [int(p) for p in run['stdout'].split()]
+        self.assertLess(len(pids), judge.MAX_PROCS)
+        for pid in pids:
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    state = f.read().rsplit(')', 1)[1].split()[0]
+            except FileNotFoundError:
+                continue
+            self.assertEqual(state, 'Z', f'process {pid} outlived the run')
+
+    def test_refuses_to_run_unconfined(self):
+        with mock.patch.object(sandbox, 'MIN_LANDLOCK_ABI', 99), mock.patch.object(sandbox, 'ALLOW_UNCONFINED', False):
+            with self.assertRaises(sandbox.SandboxUnavailable):
+                self._python("print('ran')")
+
+
+class InterpreterPoolIsolationTests(SimpleTestCase):
+    """Two runs in a row on one warm runner: the first must not be able to change the second."""
+
+    def _pool(self, language):
+        try:
+            sandbox.ensure_available()
+        except sandbox.SandboxUnavailable as e:
+            self.skipTest(str(e))
+        pool = interpreter_pool.InterpreterPool(language, size=1)
+        self.addCleanup(pool.close)
+        return pool
+
+    def _run(self, pool, code):
+        try:
+            return pool.run(code)
+        except FileNotFoundError:
+            self.skipTest(f"No {pool.language} runtime installed")
+
+    def test_javascript_run_cannot_tamper_with_the_next(self):
+        pool = self._pool('javascript')
+        first = self._run(pool, (
+            "try { Object.getPrototypeOf(Object.getPrototypeOf(console.log)).toJSON = "
+            "() => ({ status: 'ok', output: 'hijacked' }); } catch (e) {}\n"
+            "try { console.log.constructor.prototype.hijacked = 1; } catch (e) {}\n"
+            "Object.prototype.toJSON = () => ({ status: 'ok', output: 'hijacked' });\n"
+            "globalThis.leak = 1;\n"
+            "console.log('first');\n"
+        ))
+        self.assertEqual(first, {'status': 'ok', 'output': 'first\n'})
+        second = self._run(pool, "console.log(typeof leak, typeof Function.prototype.hijacked, 'second')")
+        self.assertEqual(second, {'status': 'ok', 'output': 'undefined undefined second\n'})
+
+    def test_python_run_cannot_tamper_with_the_next(self):
+        pool = self._pool('python')
+        self._run(pool, "import builtins, json\nbuiltins.leak = 1\njson.dumps = lambda *a, **k: 'hijacked'\nprint('first')")
+        second = self._run(pool, "import builtins\nprint(hasattr(builtins, 'leak'), 'second')")
+        self.assertEqual(second, {'status': 'ok', 'output': 'False second\n'})
+
+
+# ------------------------------
+# List pagination
+# ------------------------------
+class PaginationTests(SimpleTestCase):
+
+    def _request(self, **params):
+        return RequestFactory().get('/api/sessions/', params)
+
+    def test_unpaged_request_gets_everything(self):
+        self.assertIsNone(pagination.page_size(self._request()))
+        self.assertEqual(pagination.page_size(self._request(cursor='x')), pagination.DEFAULT_PAGE_SIZE)
+        self.assertEqual(pagination.page_size(self._request(limit='10000')), pagination.MAX_PAGE_SIZE)
+
+    def test_bad_cursors_are_cursor_errors(self):
+        impossible_date = pagination.encode_cursor(['2024-13-45T00:00:00', 1])
+        for token in ('not base64!', pagination.encode_cursor([1]), pagination.encode_cursor([{}, 1]), impossible_date):
+            with self.subTest(token=token), self.assertRaises(pagination.CursorError):
+                pagination.decode_cursor(token, 2)
+
+
+# ------------------------------
+# Engagement learner tokens
+# ------------------------------
+@mock.patch.object(engagement, 'TOKEN_SECRET', 'test-secret')
+class EngagementTokenTests(SimpleTestCase):
+
+    def test_token_round_trip_and_expiry(self):
+        token = engagement.issue_token('21CS001', now=1000)
+        self.assertEqual(engagement.verify_token(token, now=1000), '21CS001')
+        self.assertIsNone(engagement.verify_token(token, now=1000 + engagement.TOKEN_TTL + 1))
+
+    def test_forged_tokens_are_rejected(self):
+        token = engagement.issue_token('21CS001')
+        encoded, signature = token.rsplit('.', 1)
+        other = engagement.issue_token('21CS002').rsplit('.', 1)[0]
+        for forged in (f"{other}.{signature}", f"{encoded}.{'0' * len(signature)}", '21CS001', None):
+            with self.subTest(forged=forged):
+                self.assertIsNone(engagement.verify_token(forged))
+
+    def test_body_roll_number_is_not_trusted(self):
+        with mock.patch.object(engagement, 'record_many') as record_many:
+            recorded = engagement.record_for_request({'student': '21CS001', 'course_id': 4}, 'engagement', [(None, 50, None)])
+        self.assertFalse(recorded)
+        record_many.assert_not_called()
+
+
+# ------------------------------
+# Face detector fallback
+# ------------------------------
+class _Unavailable:
+    def __init__(self, **_):
+        raise face_detectors.DetectorUnavailable("not in this build")
+
+
+class _Stub:
+    name = "stub"
+
+    def __init__(self, **_):
+        pass
+
+    def detect(self, image, gray=None, scale=1.0):
+        return []
+
+
+@mock.patch.object(face_detectors, '_default', None)
+@mock.patch.object(face_detectors, '_default_error', None)
+@mock.patch.object(face_detectors, 'DEFAULT_SPEC', 'haar@480')
+class DefaultDetectorTests(SimpleTestCase):
+
+    def test_falls_back_to_a_different_detector(self):
+        with mock.patch.dict(face_detectors.DETECTORS, {'haar': _Unavailable, 'yunet': _Stub}):
+            self.assertEqual(face_detectors.default_detector().name, 'stub@480')
+
+    def test_no_detector_is_a_vision_unavailable_error(self):
+        with mock.patch.dict(face_detectors.DETECTORS, {'haar': _Unavailable, 'yunet': _Unavailable}):
+            with self.assertRaises(face_detectors.DetectorUnavailable):
+                face_detectors.default_detector()
+            frame = vision.Frame(np.zeros((120, 160, 3), dtype=np.uint8))
+            with self.assertRaises(vision.VisionUnavailable):
+                vision.run_stage(frame, 'faces')
+
+
+# ------------------------------
+# Gadget k-of-n window
+# ------------------------------
+class GadgetTrackerTests(SimpleTestCase):
+
+    def test_window_is_shared_across_processes(self):
+        # Two trackers on one file stand in for two gunicorn workers
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'gadgets.sqlite3'
+            first, second = vision.GadgetTracker(k=2, n=3, path=path), vision.GadgetTracker(k=2, n=3, path=path)
+            self.assertEqual(first.update(7, ['cell phone']), set())
+            self.assertEqual(second.update(7, ['cell phone', 'book']), {'cell phone'})
+            self.assertEqual(first.update(8, ['book']), set())
+            self.assertEqual(first.update(7, []), set())
+            self.assertEqual(second.update(7, ['cell phone']), {'cell phone'})
+            self.assertEqual(first.update(7, ['book']), set())
+
+
+# ------------------------------
+# Startup import budget
+# ------------------------------
+class StartupImportTests(SimpleTestCase):
+    """Runs each entry point under `python -X importtime` in a fresh interpreter."""
+
+    def _importtime(self, code):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='proctoring.settings')
+        env.setdefault('MISTRAL_API_KEY', 'test')  # app.py refuses to start without one
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=300,
+        )
+        if proc.returncode != 0:
+            self.fail(f"Startup failed:\n{proc.stderr[-2000:]}")
+        modules, total_us = set(), 0
+        for line in proc.stderr.splitlines():
+            match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)', line)
+            if match:
+                modules.add(match.group(3).split('.')[0])
+                if len(match.group(2)) == 1:  # top-level import: cumulative time includes its children
+                    total_us += int(match.group(1))
+        return modules, total_us / 1e6
+
+    def _check(self, code):
+        modules, seconds = self._importtime(code)
+        loaded = sorted(m for m in HEAVY_MODULES if m in modules)
+        self.assertEqual(loaded, [], f"Heavy modules imported at startup: {', '.join(loaded)}")
+        self.assertLessEqual(
+            seconds, IMPORT_BUDGET_SECONDS,
+            f"Startup imports took {seconds:.2f}s (budget {IMPORT_BUDGET_SECONDS}s)",
+        )
+
+    def test_django_startup(self):
+        # What migrate / check / the admin load: the apps, admin modules and the full URLconf
+        self._check(
+            "import django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns"
+        )
+
+    def test_flask_startup(self):
+        self._check("import app")
+
+
+# ------------------------------
+# Micro-benchmark suite (timings are checked by `manage.py run_benchmarks`, not here)
+# ------------------------------
+class BenchmarkSuiteTests(SimpleTestCase):
+
+    def test_every_case_runs(self):
+        # Cases whose dependency this host lacks (e.g. no face detector) are skipped here;
+        # `run_benchmarks --fail-on-regression` on the reference machine fails on them instead
+        for name, setup in benchmarks.CASES.items():
+            with self.subTest(name):
+                try:
+                    func = setup()
+                except benchmarks.BenchmarkSkipped as e:
+                    self.skipTest(f"{name}: {e}")
+                func()
+
+    def test_baselines_match_cases(self):
+        stale = set(benchmarks.load_baselines()['results']) - set(benchmarks.CASES)
+        self.assertEqual(stale, set(), "Baselines for removed benchmarks; run run_benchmarks --update-baselines")
@@ -0,0 +1,261 @@
+"""
+Shared transcript service for the StudyMate endpoints.
+
+One place fetches, caches and slices YouTube transcripts for the Flask app,
+`courses`, `studymate` and `analysis_helpers`. Segments are held in a columnar
+`Transcript` (parallel arrays of starts/durations plus one text blob with
+offsets) so time-range lookups are a pair of bisects instead of a scan.
+"""
+import json
+import re
+import subprocess
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from pathlib import Path
+
+from .singleflight import atomic_write_json, atomic_write_text, single_flight
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
+TRANSCRIPTS_DIR = BASE_DIR / "transcripts"
+TRANSCRIPTS_DIR.mkdir(exist_ok=True)
+
+# Parsed transcripts kept in memory per process (most recently used last)
+MAX_CACHED_TRANSCRIPTS = 64
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+# ------------------------------
+# Columnar transcript
+# ------------------------------
+class Transcript:
+    """
+    Read-only transcript stored column-wise.
+
+    `starts`/`durations` are float arrays sorted by start time. All segment
+    texts live in `text`, joined by single spaces; `offsets[i]` is where
+    segment i begins and `offsets[-1]` is one past the end of the blob, so
+    any run of consecutive segments is a single slice.
+    """
+    __slots__ = ("video_id", "starts", "durations", "offsets", "text")
+
+    def __init__(self, video_id, starts, durations, offsets, text):
+        self.video_id = video_id
+        self.starts = starts
+        self.durations = durations
+        self.offsets = offsets
+        self.text = text
+
+    @classmethod
+    def from_segments(cls, video_id, segments):
+        """Build from a list of {"text", "start", "duration"} dicts."""
+        ordered = sorted(segments or [], key=lambda seg: float(seg.get("start", 0) or 0))
+        starts = array("d")
+        durations = array("d")
+        offsets = array("q")
+        texts = []
+        position = 0
+        for seg in ordered:
+            piece = str(seg.get("text", ""))
+            starts.append(float(seg.get("start", 0) or 0))
+            durations.append(float(seg.get("duration", 0) or 0))
+            offsets.append(position)
+            texts.append(piece)
+            position += len(piece) + 1
+        offsets.append(position)
+        return cls(video_id, starts, durations, offsets, " ".join(texts))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __bool__(self):
+        return len(self.starts) > 0
+
+    def segment_text(self, index):
+        return self.text[self.offsets[index]:self.offsets[index + 1] - 1]
+
+    def segments(self):
+        """Materialise the legacy list-of-dicts form (used for JSON caching)."""
+        return [
+            {"text": self.segment_text(i), "start": self.starts[i], "duration": self.durations[i]}
+            for i in range(len(self))
+        ]
+
+    def index_range(self, start, end, inclusive_end=False):
+        """Return (lo, hi) so segments lo..hi-1 have start in [start, end) (or [start, end])."""
+        lo = bisect_left(self.starts, start)
+        hi = bisect_right(self.starts, end) if inclusive_end else bisect_left(self.starts, end)
+        return lo, max(lo, hi)
+
+    def text_between(self, start, end, inclusive_end=False):
+        """Joined text of every segment starting inside the time window."""
+        lo, hi = self.index_range(start, end, inclusive_end)
+        if lo == hi:
+            return ""
+        return self.text[self.offsets[lo]:self.offsets[hi] - 1]
+
+    def context_window(self, current_time, radius=120):
+        """Text within +/- radius seconds of the playback position."""
+        return self.text_between(max(0, current_time - radius), current_time + radius, inclusive_end=True)
+
+
+# ------------------------------
+# Fetching
+# ------------------------------
+def _clean_vtt_lines(lines):
+    return [
+        line for line in lines
+        if line.strip() and "-->" not in line and not line.strip().isdigit()
+        and "WEBVTT" not in line and not line.startswith("NOTE")
+    ]
+
+
+def _download_vtt_lines(video_id, timeout=60):
+    """Fetch auto-subs with yt-dlp and return the cleaned caption lines (or None)."""
+    subprocess.run([
+        "yt-dlp", "--write-auto-subs", "--sub-lang", "en", "--skip-download",
+        "-o", str(TRANSCRIPTS_DIR / f"{video_id}"),
+        f"https://www.youtube.com/watch?v={video_id}"
+    ], check=True, capture_output=True, text=True, timeout=timeout)
+
+    vtt_files = list(TRANSCRIPTS_DIR.glob(f"{video_id}*.vtt"))
+    if not vtt_files:
+        return None
+    vtt_file = vtt_files[0]
+    lines = _clean_vtt_lines(vtt_file.read_text(encoding="utf-8").splitlines())
+    vtt_file.unlink()
+    return lines
+
+
+def _fetch_segments(video_id):
+    """Try the transcript API (old and new interfaces), then yt-dlp. Returns None on failure."""
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    if hasattr(YouTubeTranscriptApi, "get_transcript"):
+        try:
+            return YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
+        except Exception as inner:
+            print(f"YouTubeTranscriptApi.get_transcript failed: {inner}")
+
+    if hasattr(YouTubeTranscriptApi, "list_transcripts"):
+        try:
+            return YouTubeTranscriptApi.list_transcripts(video_id).find_transcript(['en']).fetch()
+        except Exception as inner:
+            print(f"YouTubeTranscriptApi.list_transcripts failed: {inner}")
+
+    if hasattr(YouTubeTranscriptApi, "fetch"):
+        try:
+            return YouTubeTranscriptApi().fetch(video_id, languages=['en']).to_raw_data()
+        except Exception as inner:
+            print(f"YouTubeTranscriptApi.fetch failed: {inner}")
+
+    # Fallback to yt-dlp if YouTubeTranscriptApi is unavailable
+    print(f"Falling back to yt-dlp for {video_id}...")
+    try:
+        lines = _download_vtt_lines(video_id)
+        if lines is not None:
+            return [{"text": line, "start": 0, "duration": 0} for line in lines]
+    except Exception as fallback_err:
+        print(f"yt-dlp fallback failed: {fallback_err}")
+    return None
+
+
+def _mock_transcript(video_id):
+    return Transcript.from_segments(video_id, [{"text": f"Content for video {video_id}", "start": 0, "duration": 0}])
+
+
+def _remember(video_id, transcript):
+    with _cache_lock:
+        _cache[video_id] = transcript
+        _cache.move_to_end(video_id)
+        while len(_cache) > MAX_CACHED_TRANSCRIPTS:
+            _cache.popitem(last=False)
+
+
+def load_transcript(video_id):
+    """
+    Return the `Transcript` for a video, using memory, then the
+    `{video_id}_timestamps.json` cache, then the network. Never raises; an
+    unavailable transcript yields the single-segment mock used previously.
+    """
+    with _cache_lock:
+        cached = _cache.get(video_id)
+        if cached is not None:
+            _cache.move_to_end(video_id)
+            return cached
+
+    transcript_json_path = TRANSCRIPTS_DIR / f"{video_id}_timestamps.json"
+
+    def read_cached():
+        if not transcript_json_path.exists():
+            return None
+        with open(transcript_json_path, 'r', encoding='utf-8') as f:
+            return Transcript.from_segments(video_id, json.load(f))
+
+    def download():
+        segments = _fetch_segments(video_id)
+        if segments is None:
+            return None
+        segments = [
+            {"text": seg["text"], "start": seg["start"], "duration": seg["duration"]}
+            for seg in segments
+        ]
+        atomic_write_json(transcript_json_path, segments)
+        return Transcript.from_segments(video_id, segments)
+
+    try:
+        transcript = read_cached()
+        if transcript is None:
+            # Concurrent requests for a new video share one fetch
+            transcript = single_flight(f"transcript:{video_id}", download, recheck=read_cached)
+        if transcript is None:
+            print(f"No transcript available for {video_id}; using mock")
+            return _mock_transcript(video_id)
+        _remember(video_id, transcript)
+        return transcript
+    except Exception as e:
+        print(f"load_transcript failed: {e}")
+        return _mock_transcript(video_id)
+
+
+def get_transcript_with_timestamps(video_id):
+    """Legacy list-of-dicts view of `load_transcript`."""
+    return load_transcript(video_id).segments()
+
+
+def get_transcript_text(video_id):
+    """Get plain text transcript (fallback when no timed captions exist)."""
+    transcript_path = TRANSCRIPTS_DIR / f"{video_id}.txt"
+
+    def read_cached():
+        if transcript_path.exists():
+            return transcript_path.read_text(encoding="utf-8")
+        return None
+
+    def download():
+        try:
+            lines = _download_vtt_lines(video_id, timeout=None)
+            if lines is not None:
+                full_text = " ".join(re.sub(r'<[^>]+>', '', line) for line in lines)
+                atomic_write_text(transcript_path, full_text)
+                return full_text
+        except Exception as e:
+            print(f"yt-dlp failed: {e}")
+        return None
+
+    full_text = read_cached()
+    if full_text is None:
+        full_text = single_flight(f"transcript-text:{video_id}", download, recheck=read_cached)
+    if full_text is None:
+        raise Exception("Could not fetch transcript")
+    return full_text
+
+
+def get_segment_transcript(transcript, start_time, end_time):
+    """Extract transcript text for segments starting in [start_time, end_time)."""
+    if not transcript:
+        return ""
+    return transcript.text_between(start_time, end_time)
@@ -69,15 +69,24 @@ urlpatterns = [
     path('api/exams/<int:exam_id>/submissions/', views.get_exam_submissions, name='get_exam_submissions'),
     path('api/exams/<int:exam_id>/submission/<str:roll_number>/', views.get_student_exam_submission, name='get_student_exam_submission'),
     path('api/exams/<int:exam_id>/export/', views.export_exam_results, name='export_exam_results'),
+    path('api/exams/<int:exam_id>/regrade/', views.regrade_exam, name='regrade_exam'),
     path('api/exam/submit/', views.submit_exam_attempt, name='submit_exam_attempt'),
     path('api/analytics/', views.get_faculty_analytics, name='get_faculty_analytics'),
+    path('api/courses/<int:course_id>/engagement/', views.get_course_engagement, name='get_course_engagement'),
+    path('api/courses/<int:course_id>/engagement/<str:roll_number>/', views.get_student_engagement, name='get_student_engagement'),
+    path('api/engagement/token/', views.get_engagement_token, name='get_engagement_token'),
     path('api/change-password/', views.change_password, name='change_password'),
     path('api/courses/<int:course_id>/delete/', views.delete_course, name='delete_course'),
     path('api/student/exams/<str:roll_number>/', views.get_student_exams_by_roll, name='get_student_exams_by_roll'),
+    path('api/student/exams/<str:roll_number>/<int:exam_id>/paper/', views.get_student_exam_paper, name='get_student_exam_paper'),
     
     # Auto-enrollment and assignment APIs
     path('api/courses/<int:course_id>/auto-enroll/', views.auto_enroll_all_students, name='auto_enroll_all_students'),
     path('api/exams/<int:exam_id>/auto-assign/', views.auto_assign_exam_to_all, name='auto_assign_exam_to_all'),
+
+    # Background job status / cancellation
+    path('api/jobs/<str:job_id>/', views.get_job_status, name='get_job_status'),
+    path('api/jobs/<str:job_id>/cancel/', views.cancel_job, name='cancel_job'),
     
     # StudyMate Frontend Routes
     path('studymate/dashboard/', views.studymate_dashboard, name='studymate_dashboard'),
@@ -0,0 +1,121 @@
+"""
+Persistent YouTube metadata cache (duration, title, caption availability).
+
+Course pages used to spawn `yt-dlp --print duration` (or a pytubefix lookup) on
+every plan generation and tutor fallback. Metadata now lives in
+`transcripts/{video_id}_meta.json` and is only fetched when missing:
+
+* fresh entries (< METADATA_TTL) are returned as-is;
+* stale entries are returned immediately and refreshed on a background thread;
+* failed lookups are remembered for NEGATIVE_TTL so a broken video does not
+  trigger a subprocess per request.
+
+`prefetch_video_metadata` management command warms the cache for every course.
+"""
+import json
+import subprocess
+import threading
+import time
+
+from .singleflight import atomic_write_json, single_flight
+from .transcripts import TRANSCRIPTS_DIR
+
+METADATA_TTL = 7 * 24 * 3600      # refresh metadata weekly
+NEGATIVE_TTL = 15 * 60            # retry failed lookups after 15 minutes
+DEFAULT_DURATION = 3600           # legacy fallback when duration is unknown
+FETCH_TIMEOUT = 60
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _meta_path(video_id):
+    return TRANSCRIPTS_DIR / f"{video_id}_meta.json"
+
+
+def _read_meta(video_id):
+    path = _meta_path(video_id)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable metadata for {video_id}: {e}")
+        return None
+
+
+def _is_fresh(meta):
+    ttl = NEGATIVE_TTL if meta.get("error") else METADATA_TTL
+    return time.time() - meta.get("fetched_at", 0) < ttl
+
+
+def _fetch_meta(video_id):
+    """One yt-dlp call for duration, title and captions; failures are cached too."""
+    try:
+        result = subprocess.run([
+            "yt-dlp", "--dump-single-json", "--skip-download", "--no-warnings",
+            f"https://www.youtube.com/watch?v={video_id}"
+        ], capture_output=True, text=True, check=True, timeout=FETCH_TIMEOUT)
+        info = json.loads(result.stdout)
+        captions = set(info.get("subtitles") or {}) | set(info.get("automatic_captions") or {})
+        meta = {
+            "video_id": video_id,
+            "duration": int(float(info["duration"])) if info.get("duration") else None,
+            "title": info.get("title"),
+            "has_captions": any(lang == "en" or lang.startswith("en-") for lang in captions),
+            "fetched_at": time.time(),
+            "error": None,
+        }
+    except Exception as e:
+        print(f"Could not fetch metadata for {video_id}: {e}")
+        previous = _read_meta(video_id) or {}
+        meta = {
+            "video_id": video_id,
+            "duration": previous.get("duration"),
+            "title": previous.get("title"),
+            "has_captions": previous.get("has_captions"),
+            "fetched_at": time.time(),
+            "error": str(e)[:300],
+        }
+    try:
+        atomic_write_json(_meta_path(video_id), meta)
+    except Exception as e:
+        print(f"Could not persist metadata for {video_id}: {e}")
+    return meta
+
+
+def refresh_video_metadata(video_id):
+    """Fetch now (coalesced with any concurrent fetch for the same video)."""
+    return single_flight(f"video-meta:{video_id}", lambda: _fetch_meta(video_id))
+
+
+def _refresh_in_background(video_id):
+    with _refreshing_lock:
+        if video_id in _refreshing:
+            return
+        _refreshing.add(video_id)
+
+    def run():
+        try:
+            refresh_video_metadata(video_id)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(video_id)
+
+    threading.Thread(target=run, name=f"video-meta-{video_id}", daemon=True).start()
+
+
+def get_video_metadata(video_id):
+    """Cached metadata dict; only blocks on the network when nothing is cached."""
+    meta = _read_meta(video_id)
+    if meta is None:
+        return refresh_video_metadata(video_id)
+    if not _is_fresh(meta):
+        _refresh_in_background(video_id)
+    return meta
+
+
+def get_video_duration(video_id):
+    """Video duration in seconds, falling back to DEFAULT_DURATION when unknown."""
+    return get_video_metadata(video_id).get("duration") or DEFAULT_DURATION
@@ -6,19 +6,21 @@ from PIL import Image
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse, HttpRequest
+from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.contrib.auth import authenticate, login, logout, get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.http import require_http_methods 
-from django.db.models import Sum, Avg
-from deepface import DeepFace 
+from django.db.models import Sum, Avg, Count, Q, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.views.decorators.csrf import csrf_protect
 
 # NOTE: Ensure your models are imported correctly from your app's models.py
 from .models import Candidate, Session, Event, StudentProfile
 from . import analyzer # Assuming 'analyzer' contains analyze_audio/analyze_frame logic
+from . import frame_hints
+from . import vision
 
 # Get the custom or default User model
 User = get_user_model() 
@@ -255,7 +257,7 @@ def student_dashboard(request: HttpRequest):
 def admin_dashboard(request):
     # Renders the admin monitoring dashboard
     from .models import Course, Enrollment, StudentProfile
-    from django.db.models import Avg
+    from .analytics import courses_with_enrollment_counts, students_with_enrollment_stats
     
     context = {}
     faculty = None
@@ -278,7 +280,7 @@ def admin_dashboard(request):
     
     # Get courses for this faculty
     if faculty:
-        courses = Course.objects.filter(faculty=faculty)
+        courses = courses_with_enrollment_counts(Course.objects.filter(faculty=faculty))
         context['courses'] = courses
         context['recent_courses'] = courses[:3]
         context['total_courses'] = courses.count()
@@ -286,39 +288,29 @@ def admin_dashboard(request):
         # Get enrollments for faculty's courses
         enrollments = Enrollment.objects.filter(course__faculty=faculty)
         context['recent_enrollments'] = enrollments.select_related('student', 'course')[:10]
-        context['total_enrollments'] = enrollments.count()
-        
-        # Get unique students enrolled in faculty's courses
-        student_ids = enrollments.values_list('student_id', flat=True).distinct()
-        context['total_students'] = student_ids.count()
-        
-        # Calculate average completion
-        avg_completion = enrollments.aggregate(avg=Avg('progress'))['avg'] or 0
-        context['avg_completion'] = round(avg_completion, 1)
-        
-        # Get ALL students from database with their enrollment stats
-        all_students = StudentProfile.objects.all()
-        for student in all_students:
-            student_enrollments = student.enrollments.all()
-            student.enrolled_count = student_enrollments.count()
-            student.avg_progress = student_enrollments.aggregate(avg=Avg('progress'))['avg'] or 0
-        context['students'] = all_students
+        
+        # Totals, unique students and average completion in one aggregate
+        enrollment_stats = enrollments.aggregate(
+            total=Count('id'), students=Count('student_id', distinct=True), avg=Avg('progress')
+        )
+        context['total_enrollments'] = enrollment_stats['total']
+        context['total_students'] = enrollment_stats['students']
+        context['avg_completion'] = round(enrollment_stats['avg'] or 0, 1)
+        
+        # Get ALL students from database with their enrollment stats (single grouped query)
+        context['students'] = students_with_enrollment_stats()
     else:
         # For non-faculty admins, show all courses
-        context['courses'] = Course.objects.all()
-        context['recent_courses'] = Course.objects.all()[:3]
+        courses = courses_with_enrollment_counts(Course.objects.all())
+        context['courses'] = courses
+        context['recent_courses'] = courses[:3]
         context['total_courses'] = Course.objects.count()
         context['total_enrollments'] = Enrollment.objects.count()
         context['total_students'] = StudentProfile.objects.count()
         context['avg_completion'] = 0
         context['recent_enrollments'] = Enrollment.objects.select_related('student', 'course')[:10]
-        # Get ALL students with enrollment stats
-        all_students = StudentProfile.objects.all()
-        for student in all_students:
-            student_enrollments = student.enrollments.all()
-            student.enrolled_count = student_enrollments.count()
-            student.avg_progress = student_enrollments.aggregate(avg=Avg('progress'))['avg'] or 0
-        context['students'] = all_students
+        # Get ALL students with enrollment stats (single grouped query)
+        context['students'] = students_with_enrollment_stats()
     
     return render(request, 'monitor/admin_dashboard.html', context)
 
@@ -552,15 +544,18 @@ def upload_frame(request):
         return JsonResponse({"error": "No frame sent"}, status=400)
 
     try:
-        header, data = b64.split(',', 1) if ',' in b64 else (None, b64)
-        img_bytes = base64.b64decode(data)
-        img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-        frame = np.array(img)[:, :, ::-1]  # RGB -> BGR
-    except Exception as e:
+        frame = vision.load_frame(b64)  # shared decoder / frame cache (monitor/vision.py)
+    except vision.VisionError as e:
         return JsonResponse({"error": f"Invalid image data: {str(e)}"}, status=400)
 
+    # Optional high-res face crop from the client (face_crop / face_box, see monitor/frame_hints.py)
+    hint = frame_hints.read_hint(request.POST)
+
     # Analyze frame
-    events = analyzer.analyze_frame(frame, session)
+    try:
+        events = analyzer.analyze_frame(frame, session, hint=hint)
+    except vision.VisionUnavailable as e:
+        return JsonResponse({"error": f"Face detection is unavailable on this server: {e}"}, status=503)
 
     # Save events to DB
     for ev in events:
@@ -648,6 +643,7 @@ def verify_face(request):
         return JsonResponse({"error": "Candidate not found"}, status=404)
 
     try:
+        from deepface import DeepFace  # loads TensorFlow; only this view needs it
         result = DeepFace.verify(
             np.array(img),
             candidate.photo.path,  # assuming you have a 'photo' field in Candidate model
@@ -748,20 +744,22 @@ def get_sessions(request):
     """
     try:
         # NOTE: Filter out completed sessions if dashboard should only show active/recent
-        sessions = Session.objects.select_related('candidate').order_by('-started_at') 
-        session_list = []
+        # Last event is pulled in the same query instead of one lookup per session
+        last_event = Event.objects.filter(session=OuterRef('pk')).order_by('-timestamp', '-id')
+        sessions = Session.objects.select_related('candidate').annotate(
+            last_event_kind=Subquery(last_event.values('event_type')[:1]),
+            last_event_details=Subquery(last_event.values('details')[:1]),
+        )
 
-        for s in sessions:
+        def serialize(s):
             candidate = s.candidate
             
             # Safely get last event details
             last_event_type = "No alerts"
-            last_event = s.events.order_by('-timestamp').first() 
-            
-            if last_event:
-                last_event_type = f"{last_event.event_type.replace('_', ' ').title()}: {last_event.details}"
+            if s.last_event_kind:
+                last_event_type = f"{s.last_event_kind.replace('_', ' ').title()}: {s.last_event_details}"
 
-            session_list.append({
+            return {
                 "id": s.id,
                 "candidate_id": candidate.id if candidate else None,
                 "candidate_name": candidate.name if candidate else "Unidentified",
@@ -778,19 +776,25 @@ def get_sessions(request):
                 "active": s.active,
                 "started_at": s.started_at.strftime("%Y-%m-%d %H:%M:%S"),
                 "ended_at": s.ended_at.strftime("%Y-%m-%d %H:%M:%S") if s.ended_at else "Active",
-            })
+            }
 
-        # Calculate summary statistics
-        data = {
-            "total_candidates": Candidate.objects.count(), 
-            "active_sessions": Session.objects.filter(ended_at__isnull=True).count(),
-            # Assuming Suspicious Events means sessions marked as 'suspicious' or 'blocked'
-            "suspicious_events": Session.objects.filter(verdict__in=['suspicious', 'blocked']).count(),
-            "clean_sessions": Session.objects.filter(verdict='clean', ended_at__isnull=True).count(),
-            "sessions": session_list
-        }
-        
-        return JsonResponse(data) 
+        try:
+            session_list, next_cursor = pagination.paginate(sessions, request, ['-started_at', '-id'], serialize)
+        except pagination.CursorError as e:
+            return pagination.cursor_error_response(e)
+
+        # Calculate summary statistics in one pass over sessions
+        # Assuming Suspicious Events means sessions marked as 'suspicious' or 'blocked'
+        summary = Session.objects.aggregate(
+            active_sessions=Count('id', filter=Q(ended_at__isnull=True)),
+            suspicious_events=Count('id', filter=Q(verdict__in=['suspicious', 'blocked'])),
+            clean_sessions=Count('id', filter=Q(verdict='clean', ended_at__isnull=True)),
+        )
+        return pagination.list_response(
+            request, 'sessions', session_list, next_cursor,
+            total_candidates=Candidate.objects.count(),
+            **summary
+        )
 
     except Exception as e:
         print(f"Error in get_sessions view: {e}")
@@ -962,6 +966,21 @@ def practice_exam_redirect(request):
 # Course API Endpoints
 # ==========================
 from .models import Course, CourseModule, Enrollment, ModuleProgress
+from .enrollment import cohort_filters, cohort_queryset, enroll_students, assign_exam
+from . import exam_papers
+from . import grading
+from . import analytics
+from . import pagination
+from . import engagement
+
+
+def _count_subquery(model, fk, **filters):
+    """Correlated COUNT of `model` rows pointing at the outer row (avoids join fan-out)."""
+    rows = (
+        model.objects.filter(**{fk: OuterRef('pk')}, **filters)
+        .order_by().values(fk).annotate(n=Count('id')).values('n')
+    )
+    return Coalesce(Subquery(rows), 0)
 
 @login_required
 @require_http_methods(["POST"])
@@ -988,13 +1007,12 @@ def create_course(request):
             faculty=faculty
         )
         
-        # Enroll selected students
+        # Enroll selected students (explicit ids and/or a cohort)
         student_ids = data.get('student_ids', [])
-        if student_ids:
-            from .models import StudentProfile, Enrollment
-            students = StudentProfile.objects.filter(id__in=student_ids)
-            for student in students:
-                Enrollment.objects.get_or_create(student=student, course=course)
+        cohort = cohort_filters(request, data)
+        enrolled_count = 0
+        if student_ids or any(cohort.values()):
+            enrolled_count, _ = enroll_students(course, cohort_queryset(student_ids=student_ids, **cohort))
         
         return JsonResponse({
             'status': 'success',
@@ -1008,7 +1026,7 @@ def create_course(request):
                 'category': course.category,
                 'level': course.level,
                 'is_published': course.is_published,
-                'enrolled_students': len(student_ids)
+                'enrolled_students': enrolled_count
             }
         })
     except Exception as e:
@@ -1019,11 +1037,13 @@ def create_course(request):
 def get_courses(request):
     """API to get all published courses"""
     try:
-        courses = Course.objects.filter(is_published=True).select_related('faculty')
+        courses = Course.objects.filter(is_published=True).select_related('faculty').annotate(
+            module_total=_count_subquery(CourseModule, 'course'),
+            student_total=_count_subquery(Enrollment, 'course'),
+        )
         
-        courses_data = []
-        for course in courses:
-            courses_data.append({
+        def serialize(course):
+            return {
                 'id': course.id,
                 'title': course.title,
                 'description': course.description,
@@ -1031,12 +1051,17 @@ def get_courses(request):
                 'level': course.level,
                 'duration': course.duration,
                 'faculty_name': course.faculty.full_name,
-                'modules_count': course.modules.count(),
-                'students_count': course.enrollments.count(),
+                'modules_count': course.module_total,
+                'students_count': course.student_total,
                 'thumbnail': course.thumbnail.url if course.thumbnail else None
-            })
+            }
         
-        return JsonResponse({'courses': courses_data})
+        try:
+            courses_data, next_cursor = pagination.paginate(courses, request, ['-created_at', '-id'], serialize)
+        except pagination.CursorError as e:
+            return pagination.cursor_error_response(e)
+        
+        return pagination.list_response(request, 'courses', courses_data, next_cursor)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -1093,24 +1118,21 @@ def get_course_detail(request, course_id):
 
 @csrf_exempt
 def auto_enroll_all_students(request, course_id):
-    """API to auto-enroll all students in a published course"""
+    """API to auto-enroll all students (optionally a department / roll-prefix cohort) in a published course"""
     try:
         course = Course.objects.get(id=course_id, is_published=True)
-        students = StudentProfile.objects.all()
-        
-        enrolled_count = 0
-        for student in students:
-            enrollment, created = Enrollment.objects.get_or_create(
-                student=student,
-                course=course
-            )
-            if created:
-                enrolled_count += 1
+        data = json.loads(request.body) if request.body else {}
+        cohort = cohort_filters(request, data)
+        students = cohort_queryset(student_ids=data.get('student_ids'), **cohort)
+
+        enrolled_count, total_enrolled = enroll_students(course, students)
         
         return JsonResponse({
             'status': 'success',
             'message': f'Enrolled {enrolled_count} students in {course.title}',
-            'total_enrolled': course.enrollments.count()
+            'enrolled': enrolled_count,
+            'total_enrolled': total_enrolled,
+            'cohort': cohort
         })
     except Course.DoesNotExist:
         return JsonResponse({'error': 'Course not found or not published'}, status=404)
@@ -1120,24 +1142,21 @@ def auto_enroll_all_students(request, course_id):
 
 @csrf_exempt
 def auto_assign_exam_to_all(request, exam_id):
-    """API to auto-assign an exam to all students"""
+    """API to auto-assign an exam to all students (optionally a department / roll-prefix cohort)"""
     try:
         exam = Exam.objects.get(id=exam_id, is_published=True)
-        students = StudentProfile.objects.all()
-        
-        assigned_count = 0
-        for student in students:
-            assignment, created = ExamAssignment.objects.get_or_create(
-                student=student,
-                exam=exam
-            )
-            if created:
-                assigned_count += 1
+        data = json.loads(request.body) if request.body else {}
+        cohort = cohort_filters(request, data)
+        students = cohort_queryset(student_ids=data.get('student_ids'), **cohort)
+
+        assigned_count, total_assigned = assign_exam(exam, students)
         
         return JsonResponse({
             'status': 'success',
             'message': f'Assigned {assigned_count} students to {exam.title}',
-            'total_assigned': exam.assignments.count()
+            'assigned': assigned_count,
+            'total_assigned': total_assigned,
+            'cohort': cohort
         })
     except Exam.DoesNotExist:
         return JsonResponse({'error': 'Exam not found or not published'}, status=404)
@@ -1224,30 +1243,34 @@ def get_student_courses_by_roll(request, roll_number):
         except StudentProfile.DoesNotExist:
             return JsonResponse({'error': 'Student not found', 'courses': []}, status=200)
         
-        enrollments = Enrollment.objects.filter(student=student).select_related('course', 'course__faculty')
+        # Only show published courses
+        enrollments = Enrollment.objects.filter(student=student, course__is_published=True).select_related('course', 'course__faculty')
         
-        courses_data = []
-        for enrollment in enrollments:
+        def serialize(enrollment):
             course = enrollment.course
-            if course.is_published:  # Only show published courses
-                courses_data.append({
-                    'id': course.id,
-                    'title': course.title,
-                    'description': course.description,
-                    'category': course.category,
-                    'level': course.level,
-                    'duration': course.duration,
-                    'study_hours': course.study_hours,
-                    'faculty_name': course.faculty.full_name,
-                    'modules_count': course.modules_count,  # Calculated from study_hours
-                    'progress': enrollment.progress,
-                    'completed': enrollment.completed,
-                    'enrolled_at': enrollment.enrolled_at.isoformat(),
-                    'thumbnail': course.thumbnail.url if course.thumbnail else None,
-                    'video_url': course.video_url
-                })
-        
-        return JsonResponse({'courses': courses_data, 'student_name': student.full_name})
+            return {
+                'id': course.id,
+                'title': course.title,
+                'description': course.description,
+                'category': course.category,
+                'level': course.level,
+                'duration': course.duration,
+                'study_hours': course.study_hours,
+                'faculty_name': course.faculty.full_name,
+                'modules_count': course.modules_count,  # Calculated from study_hours
+                'progress': enrollment.progress,
+                'completed': enrollment.completed,
+                'enrolled_at': enrollment.enrolled_at.isoformat(),
+                'thumbnail': course.thumbnail.url if course.thumbnail else None,
+                'video_url': course.video_url
+            }
+        
+        try:
+            courses_data, next_cursor = pagination.paginate(enrollments, request, ['-enrolled_at', '-id'], serialize)
+        except pagination.CursorError as e:
+            return pagination.cursor_error_response(e)
+        
+        return pagination.list_response(request, 'courses', courses_data, next_cursor, student_name=student.full_name)
     except Exception as e:
         return JsonResponse({'error': str(e), 'courses': []}, status=500)
 
@@ -1255,7 +1278,7 @@ def get_student_courses_by_roll(request, roll_number):
 # ==========================
 # Exam API Endpoints
 # ==========================
-from .models import Exam, Question, TestCase, ExamAssignment, ExamAttempt, StudentAnswer, Enrollment
+from .models import Exam, Question, TestCase, ExamAssignment, ExamAttempt, Enrollment
 import requests
 import os
 
@@ -1353,17 +1376,14 @@ def create_exam(request):
                     order=tc_idx + 1
                 )
         
-        # Assign to students
+        # Assign to students (explicit ids and/or a cohort)
         student_ids = data.get('student_ids', [])
-        if student_ids:
-            students = StudentProfile.objects.filter(id__in=student_ids)
-            for student in students:
-                ExamAssignment.objects.get_or_create(student=student, exam=exam)
+        cohort = cohort_filters(request, data)
+        if student_ids or any(cohort.values()):
+            assign_exam(exam, cohort_queryset(student_ids=student_ids, **cohort))
         # If no explicit selection, auto-assign all students enrolled in the course
         elif exam.course_id:
-            enrolled_students = StudentProfile.objects.filter(enrollments__course=exam.course).distinct()
-            for student in enrolled_students:
-                ExamAssignment.objects.get_or_create(student=student, exam=exam)
+            assign_exam(exam, StudentProfile.objects.filter(enrollments__course_id=exam.course_id))
         
         return JsonResponse({
             'status': 'success',
@@ -1713,11 +1733,16 @@ def get_faculty_exams(request):
         except:
             return JsonResponse({'error': 'Faculty profile not found'}, status=403)
         
-        exams = Exam.objects.filter(faculty=faculty).select_related('course')
+        exams = Exam.objects.filter(faculty=faculty).select_related('course').annotate(
+            question_total=_count_subquery(Question, 'exam'),
+            mcq_total=_count_subquery(Question, 'exam', question_type='mcq'),
+            coding_total=_count_subquery(Question, 'exam', question_type='coding'),
+            assigned_total=_count_subquery(ExamAssignment, 'exam'),
+            attempted_total=_count_subquery(ExamAttempt, 'exam'),
+        )
         
-        exams_data = []
-        for exam in exams:
-            exams_data.append({
+        def serialize(exam):
+            return {
                 'id': exam.id,
                 'title': exam.title,
                 'description': exam.description,
@@ -1726,75 +1751,67 @@ def get_faculty_exams(request):
                 'difficulty': exam.difficulty,
                 'total_marks': exam.total_marks,
                 'duration_minutes': exam.duration_minutes,
-                'total_questions': exam.total_questions,
-                'mcq_count': exam.mcq_count,
-                'coding_count': exam.coding_count,
+                'total_questions': exam.question_total,
+                'mcq_count': exam.mcq_total,
+                'coding_count': exam.coding_total,
                 'scheduled_date': exam.scheduled_date.isoformat() if exam.scheduled_date else None,
                 'is_published': exam.is_published,
                 'is_proctored': exam.is_proctored,
-                'students_assigned': exam.assignments.count(),
-                'students_attempted': exam.attempts.count(),
+                'students_assigned': exam.assigned_total,
+                'students_attempted': exam.attempted_total,
                 'created_at': exam.created_at.isoformat()
-            })
+            }
+        
+        try:
+            exams_data, next_cursor = pagination.paginate(exams, request, ['-created_at', '-id'], serialize)
+        except pagination.CursorError as e:
+            return pagination.cursor_error_response(e)
         
-        return JsonResponse({'exams': exams_data})
+        return pagination.list_response(request, 'exams', exams_data, next_cursor)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
 @csrf_exempt
 def get_student_exams_by_roll(request, roll_number):
-    """API to get exams assigned to a student - for frontend access"""
+    """API to list exams assigned to a student - for frontend access.
+
+    Runs a fixed number of queries regardless of how many exams are assigned;
+    question bodies are fetched per exam from `paper_url`.
+    """
     try:
         try:
             student = StudentProfile.objects.get(roll_number=roll_number)
         except StudentProfile.DoesNotExist:
             return JsonResponse({'error': 'Student not found', 'exams': []}, status=200)
         
-        from django.utils import timezone
-        now = timezone.now()
-        
-        # Get assigned exams
-        assignments = ExamAssignment.objects.filter(student=student).select_related('exam', 'exam__course', 'exam__faculty')
+        # Get assigned, published exams with question counts in one query
+        assignments = (
+            ExamAssignment.objects
+            .filter(student=student, exam__is_published=True)
+            .select_related('exam', 'exam__course', 'exam__faculty')
+            .annotate(
+                question_total=Count('exam__questions'),
+                mcq_total=Count('exam__questions', filter=Q(exam__questions__question_type='mcq')),
+                coding_total=Count('exam__questions', filter=Q(exam__questions__question_type='coding')),
+            )
+        )
+        assignments = list(assignments)
+
+        # Attempts for all of those exams in one query (one attempt per student/exam)
+        attempts = {
+            attempt.exam_id: attempt
+            for attempt in ExamAttempt.objects.filter(
+                student=student, exam_id__in=[a.exam_id for a in assignments]
+            )
+        }
         
         upcoming_exams = []
         completed_exams = []
         
         for assignment in assignments:
             exam = assignment.exam
-            if not exam.is_published:
-                continue
-            
-            # Check if student has attempted this exam
-            attempt = ExamAttempt.objects.filter(student=student, exam=exam).first()
-            
-            # Get questions for the exam
-            questions = []
-            for q in exam.questions.all():
-                question_data = {
-                    'id': q.id,
-                    'question_type': q.question_type,
-                    'question_text': q.question_text,
-                    'marks': q.marks,
-                    'order': q.order,
-                }
-                
-                if q.question_type == 'mcq':
-                    question_data['options'] = [q.option_a, q.option_b, q.option_c, q.option_d]
-                    question_data['correct_option'] = q.correct_option
-                elif q.question_type == 'coding':
-                    question_data['programming_language'] = q.programming_language
-                    question_data['starter_code'] = q.starter_code
-                    question_data['test_cases'] = [
-                        {
-                            'input_data': tc.input_data,
-                            'expected_output': tc.expected_output,
-                            'is_sample': tc.is_sample
-                        }
-                        for tc in q.test_cases.all()
-                    ]
-                
-                questions.append(question_data)
+            attempt = attempts.get(exam.id)
             
             exam_data = {
                 'id': exam.id,
@@ -1807,9 +1824,9 @@ def get_student_exams_by_roll(request, roll_number):
                 'total_marks': exam.total_marks,
                 'passing_marks': exam.passing_marks,
                 'duration_minutes': exam.duration_minutes,
-                'total_questions': exam.total_questions,
-                'mcq_count': exam.mcq_count,
-                'coding_count': exam.coding_count,
+                'total_questions': assignment.question_total,
+                'mcq_count': assignment.mcq_total,
+                'coding_count': assignment.coding_total,
                 'scheduled_date': exam.scheduled_date.isoformat() if exam.scheduled_date else None,
                 'end_date': exam.end_date.isoformat() if exam.end_date else None,
                 'is_proctored': exam.is_proctored,
@@ -1817,7 +1834,7 @@ def get_student_exams_by_roll(request, roll_number):
                 'score': attempt.score if attempt else None,
                 'percentage': attempt.percentage if attempt else None,
                 'passed': attempt.passed if attempt else None,
-                'questions': questions
+                'paper_url': f'/api/student/exams/{student.roll_number}/{exam.id}/paper/'
             }
             
             if attempt and attempt.status in ['submitted', 'evaluated']:
@@ -1836,6 +1853,39 @@ def get_student_exams_by_roll(request, roll_number):
         return JsonResponse({'error': str(e), 'exams': []}, status=500)
 
 
+@csrf_exempt
+def get_student_exam_paper(request, roll_number, exam_id):
+    """API to fetch the questions of one assigned exam (answer key excluded).
+
+    Served from the pre-built exam paper snapshot with ETag / If-None-Match
+    support; shuffled per student when the exam has shuffle_questions set.
+    """
+    try:
+        if not ExamAssignment.objects.filter(
+            student__roll_number=roll_number, exam_id=exam_id, exam__is_published=True
+        ).exists():
+            return JsonResponse({'error': 'Exam not assigned to this student'}, status=404)
+        
+        paper = exam_papers.get_paper(exam_id)
+        body, etag = paper.for_student(roll_number)
+        
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=304)
+        elif body is paper.body and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(paper.gzipped, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        response['Vary'] = 'Accept-Encoding'
+        return response
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'error': str(e)}, status=500)
+
+
 @login_required
 def get_faculty_analytics(request):
     """Aggregate analytics for the faculty dashboard."""
@@ -1845,43 +1895,97 @@ def get_faculty_analytics(request):
         except Exception:
             return JsonResponse({'error': 'Only faculty can view analytics'}, status=403)
 
-        exams = Exam.objects.filter(faculty=faculty)
-        assignments = ExamAssignment.objects.filter(exam__in=exams)
-        attempts = ExamAttempt.objects.filter(exam__in=exams, status__in=['submitted', 'evaluated'])
+        # Served from the per-exam rollup table (see monitor/analytics.py)
+        return JsonResponse(analytics.faculty_analytics(faculty))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'error': str(e)}, status=500)
 
-        total_attempts = attempts.count()
-        total_assignments = assignments.count()
 
-        avg_marks_obtained = attempts.aggregate(avg=Avg('total_marks_obtained'))['avg'] or 0
-        avg_percentage = attempts.aggregate(avg=Avg('percentage'))['avg'] or 0
-        avg_violations = attempts.aggregate(avg=Avg('suspicious_activities'))['avg'] or 0
-        avg_tab_switches = attempts.aggregate(avg=Avg('tab_switches'))['avg'] or 0
+@login_required
+def get_course_engagement(request, course_id):
+    """Learner engagement / attention for a course, from the stored time-series aggregates."""
+    try:
+        try:
+            faculty = request.user.faculty_profile
+        except Exception:
+            return JsonResponse({'error': 'Only faculty can view engagement'}, status=403)
 
-        # Compute average time in seconds from timestamps (avoid DB duration math for clarity)
-        total_time_seconds = 0
-        timed_attempts = 0
-        for attempt in attempts:
-            if attempt.started_at and attempt.submitted_at:
-                total_time_seconds += (attempt.submitted_at - attempt.started_at).total_seconds()
-                timed_attempts += 1
-        avg_time_seconds = (total_time_seconds / timed_attempts) if timed_attempts else 0
+        course = Course.objects.filter(id=course_id, faculty=faculty).only('id', 'title').first()
+        if course is None:
+            return JsonResponse({'error': 'Course not found'}, status=404)
 
-        # Completion rate = completed attempts / assignments
-        completion_rate = (total_attempts / total_assignments * 100) if total_assignments else 0
+        metric = request.GET.get('metric', 'engagement')
+        if metric not in engagement.METRICS:
+            return JsonResponse({'error': f"metric must be one of {', '.join(engagement.METRICS)}"}, status=400)
+        try:
+            resolution = int(request.GET.get('resolution', engagement.RESOLUTIONS[-1]))
+            since = float(request.GET['since']) if request.GET.get('since') else None
+            rollups = engagement.get_rollups(course.id, metric, resolution, since=since)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        overview = engagement.course_overview(course.id, metric)
+        # Series are keyed by roll number / module id; attach display names in two queries
+        names = dict(
+            StudentProfile.objects.filter(roll_number__in=[s['student'] for s in overview['students']])
+            .values_list('roll_number', 'full_name')
+        )
+        titles = {str(pk): title for pk, title in course.modules.values_list('id', 'title')}
+        for student in overview['students']:
+            student['full_name'] = names.get(student['student'], student['student'])
+        for module in overview['modules']:
+            module['title'] = titles.get(module['module'], 'Course' if not module['module'] else module['module'])
 
-        # Simple concentration score derived from violations + tab switches (lower violations -> higher score)
-        concentration_score = max(0, min(100, 100 - (avg_violations * 10 + avg_tab_switches * 5)))
+        return JsonResponse({
+            'course_id': course.id,
+            'course_title': course.title,
+            'metric': metric,
+            'resolution': resolution,
+            'overview': overview,
+            'timeline': rollups,
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@login_required
+def get_student_engagement(request, course_id, roll_number):
+    """One learner's stored engagement in a course: series summaries and rollups (course faculty or the learner)."""
+    try:
+        profile = StudentProfile.objects.filter(user=request.user).only('roll_number').first()
+        is_owner = profile is not None and profile.roll_number == roll_number
+        is_course_faculty = Course.objects.filter(id=course_id, faculty__user=request.user).exists()
+        if not (is_owner or is_course_faculty):
+            return JsonResponse({'error': 'Not allowed to view this engagement'}, status=403)
+
+        metric = request.GET.get('metric', 'engagement')
+        if metric not in engagement.METRICS:
+            return JsonResponse({'error': f"metric must be one of {', '.join(engagement.METRICS)}"}, status=400)
+        module_id = request.GET.get('module_id')
+        try:
+            resolution = int(request.GET.get('resolution', engagement.RESOLUTIONS[0]))
+            since = float(request.GET['since']) if request.GET.get('since') else None
+            series = (
+                [engagement.get_series(roll_number, course_id, module_id, metric, include_samples=True)]
+                if module_id is not None else engagement.list_series(course_id, metric, student=roll_number)
+            )
+            rollups = engagement.get_rollups(
+                course_id, metric, resolution, since=since, student=roll_number, module=module_id
+            )
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
         return JsonResponse({
-            'avg_marks_obtained': round(avg_marks_obtained, 2),
-            'avg_percentage': round(avg_percentage, 2),
-            'avg_time_seconds': round(avg_time_seconds, 2),
-            'avg_violations': round(avg_violations, 2),
-            'avg_tab_switches': round(avg_tab_switches, 2),
-            'completion_rate': round(completion_rate, 2),
-            'concentration_score': round(concentration_score, 2),
-            'attempt_count': total_attempts,
-            'assignment_count': total_assignments
+            'student': roll_number,
+            'course_id': course_id,
+            'metric': metric,
+            'resolution': resolution,
+            'series': [s for s in series if s],
+            'rollups': rollups,
         })
     except Exception as e:
         import traceback
@@ -1889,6 +1993,18 @@ def get_faculty_analytics(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@login_required
+def get_engagement_token(request):
+    """Signed learner token for the Flask analysis endpoints, so their samples are attributed to this student."""
+    profile = StudentProfile.objects.filter(user=request.user).only('roll_number').first()
+    if profile is None:
+        return JsonResponse({'error': 'Only students can record engagement'}, status=403)
+    token = engagement.issue_token(profile.roll_number)
+    if token is None:
+        return JsonResponse({'error': 'ENGAGEMENT_TOKEN_SECRET is not configured'}, status=503)
+    return JsonResponse({'engagement_token': token, 'expires_in': engagement.TOKEN_TTL})
+
+
 @csrf_exempt
 def change_password(request):
     """Change faculty user password."""
@@ -1963,43 +2079,13 @@ def submit_exam_attempt(request):
         status = payload.get('status', 'submitted')
         time_taken_seconds = payload.get('time_taken_seconds') or 0
 
-        total_marks_obtained = 0
-        total_possible_marks = 0
-
-        # Evaluate and store answers
-        for question in exam.questions.all():
-            total_possible_marks += question.marks or 0
-
-            # Ensure we have a StudentAnswer row
-            answer_obj, _ = StudentAnswer.objects.get_or_create(attempt=attempt, question=question)
-
-            if question.question_type == 'mcq':
-                selected_option = mcq_answers.get(str(question.id)) or mcq_answers.get(question.id)
-                answer_obj.selected_option = selected_option
-                if selected_option and question.correct_option:
-                    is_correct = selected_option.strip().upper() == question.correct_option.strip().upper()
-                else:
-                    is_correct = False
-                answer_obj.is_correct = is_correct
-                answer_obj.marks_obtained = question.marks if is_correct else 0
-                total_marks_obtained += answer_obj.marks_obtained
-            else:
-                submitted_code = coding_answers.get(str(question.id)) or coding_answers.get(question.id)
-                answer_obj.submitted_code = submitted_code
-                # Coding auto-evaluation not implemented; keep marks at current/default
-                answer_obj.is_correct = None if submitted_code else False
-                answer_obj.marks_obtained = answer_obj.marks_obtained or 0
-                # Store test case counts for UI clarity
-                answer_obj.total_test_cases = question.test_cases.count()
-                answer_obj.test_cases_passed = 0
-
-            answer_obj.save()
+        # Evaluate in memory against the cached answer key and store answers in bulk
+        total_marks_obtained, total_possible_marks = grading.save_graded_answers(
+            attempt, grading.get_answer_key(exam.id), mcq_answers, coding_answers
+        )
 
         # Calculate aggregates
-        attempt.total_marks_obtained = total_marks_obtained
-        attempt.score = total_marks_obtained
-        attempt.percentage = (total_marks_obtained / exam.total_marks * 100) if exam.total_marks else 0
-        attempt.passed = total_marks_obtained >= exam.passing_marks if exam.passing_marks is not None else None
+        grading.apply_attempt_totals(attempt, exam, total_marks_obtained)
         attempt.suspicious_activities = violation_count
         attempt.status = 'submitted' if status != 'blocked' else 'submitted'
         attempt.submitted_at = timezone.now()
@@ -2009,13 +2095,19 @@ def submit_exam_attempt(request):
             attempt.started_at = attempt.submitted_at - datetime.timedelta(seconds=time_taken_seconds)
 
         attempt.save()
+        analytics.refresh_exam_rollup(exam.id)
+
+        # Coding answers are run against their test cases in the background
+        judge_job_id = grading.queue_judging(attempt)
 
         return JsonResponse({
             'message': 'Submission recorded',
             'score': attempt.score,
             'percentage': attempt.percentage,
             'passed': attempt.passed,
-            'status': attempt.status
+            'status': attempt.status,
+            'judge_job_id': judge_job_id,
+            'judge_status_url': f'/api/jobs/{judge_job_id}/' if judge_job_id else None
         })
     except Exception as e:
         import traceback
@@ -2080,16 +2172,12 @@ def get_exam_submissions(request, exam_id):
         
         exam = get_object_or_404(Exam, id=exam_id, faculty=faculty)
         
-        # Get all assignments for this exam
+        # Get assignments for this exam; attempts for the page are fetched in one query
         assignments = ExamAssignment.objects.filter(exam=exam).select_related('student')
         
-        submissions_data = []
-        for assignment in assignments:
+        def serialize(assignment, attempt):
             student = assignment.student
             
-            # Get attempt if exists
-            attempt = ExamAttempt.objects.filter(student=student, exam=exam).first()
-            
             # Determine status
             if attempt:
                 if attempt.status == 'submitted' or attempt.status == 'evaluated':
@@ -2102,7 +2190,7 @@ def get_exam_submissions(request, exam_id):
             # Get violation count if exists
             violation_count = attempt.suspicious_activities if attempt else 0
             
-            submissions_data.append({
+            return {
                 'student_name': student.full_name,
                 'roll_number': student.roll_number,
                 'status': status,
@@ -2114,16 +2202,26 @@ def get_exam_submissions(request, exam_id):
                 'passed': attempt.passed if attempt else None,
                 'violation_count': violation_count,
                 'submitted_at': attempt.submitted_at.isoformat() if attempt and attempt.submitted_at else None
-            })
+            }
+        
+        try:
+            page, next_cursor = pagination.paginate(assignments, request, ['id'], lambda a: a)
+        except pagination.CursorError as e:
+            return pagination.cursor_error_response(e)
+        attempts = {
+            attempt.student_id: attempt
+            for attempt in ExamAttempt.objects.filter(exam=exam, student_id__in=[a.student_id for a in page])
+        }
+        submissions_data = [serialize(assignment, attempts.get(assignment.student_id)) for assignment in page]
         
         total_assigned = assignments.count()
         
-        return JsonResponse({
-            'exam_title': exam.title,
-            'course_name': exam.course.title if exam.course else 'Standalone Exam',
-            'total_assigned': total_assigned,
-            'submissions': submissions_data
-        })
+        return pagination.list_response(
+            request, 'submissions', submissions_data, next_cursor,
+            exam_title=exam.title,
+            course_name=exam.course.title if exam.course else 'Standalone Exam',
+            total_assigned=total_assigned
+        )
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -2191,9 +2289,38 @@ def get_student_exam_submission(request, exam_id, roll_number):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@login_required
+@require_http_methods(["POST"])
+def regrade_exam(request, exam_id):
+    """API to re-grade all submitted attempts after an answer key change (Faculty only)"""
+    try:
+        try:
+            faculty = request.user.faculty_profile
+        except:
+            return JsonResponse({'error': 'Only faculty can re-grade exams'}, status=403)
+        
+        exam = get_object_or_404(Exam, id=exam_id, faculty=faculty)
+        attempts_regraded, answers_changed = grading.regrade_exam(exam)
+        
+        return JsonResponse({
+            'status': 'success',
+            'message': f'Re-graded {attempts_regraded} attempts for {exam.title}',
+            'attempts_regraded': attempts_regraded,
+            'answers_changed': answers_changed
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({'error': str(e)}, status=500)
+
+
 @login_required
 def export_exam_results(request, exam_id):
-    """Export exam results as CSV (Faculty only)"""
+    """
+    Stream exam results as CSV or XLSX (Faculty only)
+    Query params: format=csv|xlsx, gzip=1 (CSV only), answers=1 (per-question columns),
+    proctoring=1 (time taken, tab switches, violations, monitoring events)
+    """
     try:
         # Check if user is faculty
         try:
@@ -2203,41 +2330,61 @@ def export_exam_results(request, exam_id):
         
         exam = get_object_or_404(Exam, id=exam_id, faculty=faculty)
         
-        # Get submissions
-        assignments = ExamAssignment.objects.filter(exam=exam).select_related('student')
-        
-        import csv
-        from django.http import HttpResponse
+        export_format = (request.GET.get('format') or 'csv').lower()
+        if export_format not in ('csv', 'xlsx'):
+            return JsonResponse({'error': 'format must be csv or xlsx'}, status=400)
+        flag = lambda name: request.GET.get(name, '').lower() in ('1', 'true', 'yes')
         
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="exam_{exam_id}_results.csv"'
+        from django.http import StreamingHttpResponse
+        from . import exports
         
-        writer = csv.writer(response)
-        writer.writerow(['Student Name', 'Roll Number', 'Status', 'Score', 'Percentage', 'Passed', 'Submitted At'])
+        # Rows are produced lazily from a server-side cursor while the response streams
+        header, rows = exports.result_rows(exam, include_answers=flag('answers'), include_proctoring=flag('proctoring'))
+        filename = f"exam_{exam_id}_results"
         
-        for assignment in assignments:
-            student = assignment.student
-            attempt = ExamAttempt.objects.filter(student=student, exam=exam).first()
-            
-            if attempt and attempt.status in ['submitted', 'evaluated']:
-                writer.writerow([
-                    student.full_name,
-                    student.roll_number,
-                    'Completed',
-                    attempt.score or 'N/A',
-                    f"{attempt.percentage}%" if attempt.percentage else 'N/A',
-                    'Yes' if attempt.passed else 'No' if attempt.passed is not None else 'N/A',
-                    attempt.submitted_at.strftime('%Y-%m-%d %H:%M:%S') if attempt.submitted_at else ''
-                ])
-            else:
-                writer.writerow([
-                    student.full_name,
-                    student.roll_number,
-                    'Not Completed',
-                    'N/A', 'N/A', 'N/A', ''
-                ])
+        if export_format == 'xlsx':
+            response = StreamingHttpResponse(
+                exports.stream_xlsx(header, rows),
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+            filename += '.xlsx'
+        elif flag('gzip'):
+            response = StreamingHttpResponse(exports.stream_csv(header, rows, compress=True), content_type='application/gzip')
+            filename += '.csv.gz'
+        else:
+            response = StreamingHttpResponse(exports.stream_csv(header, rows), content_type='text/csv')
+            filename += '.csv'
         
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+
+# ==========================
+# Background Jobs
+# ==========================
+from . import jobs
+
+
+@csrf_exempt
+def get_job_status(request, job_id):
+    """API to poll a background job (course plan, video processing, transcription)"""
+    status = jobs.job_status(job_id)
+    if status is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    response = JsonResponse(status)
+    response["Access-Control-Allow-Origin"] = "*"
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def cancel_job(request, job_id):
+    """API to cancel a queued or running background job"""
+    status = jobs.cancel(job_id)
+    if status is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    response = JsonResponse({'job_id': job_id, 'status': status})
+    response["Access-Control-Allow-Origin"] = "*"
+    return response
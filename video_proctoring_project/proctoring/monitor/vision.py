@@ -0,0 +1,494 @@
+"""
+Shared webcam frame analysis.
+
+There used to be three analysers, each with its own decoder, Haar cascade
+and thresholds: proctoring (`analyzer.analyze_frame`), Flask attention
+(`app.analyze_frame_basic`) and course attention (`courses.views._analyze_frame`).
+Now there is one pipeline of stages:
+
+    faces          face boxes (configured detector, see face_detectors)
+    attention      face presence / centering / blur / brightness heuristics
+    phone_regions  cheap contour-based "phone-like rectangle" heuristic
+    devices        YOLO gadget detection (gadget classes around the candidate, see
+                   GADGET_MODE; confirm_gadgets smooths it over a session's frames)
+    identity       Facenet embedding of each face vs a candidate's embedding
+    emotion        mood engine on the largest face (or the client's crop)
+
+Callers pick stages (see PROFILES) and dependencies run once. A `Frame` holds
+the decoded image and lazily computed intermediates: one grayscale
+conversion and one face detection. Base64 frames are memoised for
+FRAME_CACHE_TTL seconds. When the same frame reaches /analyze-face,
+/detect-faces and /analyze-mood, it is decoded and face-detected once.
+'faces', 'attention', 'phone_regions' and 'devices' results are cached on
+the frame. 'identity' and 'emotion' depend on the caller (candidate, client
+crop) and are computed on every call.
+
+Models run on the configured inference backend (see inference) and are
+loaded on first use.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from . import face_detectors, frame_hints, inference
+from .lazy_imports import lazy_module
+
+cv2 = lazy_module("cv2")
+
+BASE_DIR = Path(__file__).resolve().parent.parent  # Points to proctoring folder
+
+# Attention heuristics
+DISTRACTED_CENTER_OFFSET = 0.35   # normalised distance of the face from the frame centre
+BORED_BLUR_VAR = 30.0             # variance of Laplacian below this reads as "very still"
+GAZE_EDGE = 0.15                  # face centre within this fraction of either edge = looking away
+
+# Identity / devices
+SIM_THRESHOLD = 0.6               # face similarity threshold
+YOLO_CONFIDENCE = 0.25
+GADGET_SYNONYMS = [
+    "cell phone", "cellphone", "mobile", "phone", "laptop", "notebook",
+    "book", "keyboard", "mouse", "remote", "tv remote",
+    "headphones", "earphones", "earbuds", "headset", "watch", "smartwatch", "tablet"
+]
+GADGET_NAMES = set(n.lower() for n in GADGET_SYNONYMS)
+
+# Gadget detection mode: 'roi' runs YOLO on the gadget classes only, over the
+# area around the candidate; 'full' runs every class on the whole frame.
+GADGET_MODE = os.getenv("VISION_GADGET_MODE", "roi").lower()
+GADGET_CLASSES = ('cell phone', 'laptop', 'book', 'remote', 'keyboard', 'mouse')  # COCO labels
+GADGET_ROI_IMGSZ = int(os.getenv("VISION_GADGET_ROI_IMGSZ", 320))
+GADGET_ROI_MARGIN = (2.5, 0.5, 2.5, 5.0)    # face widths left/right, face heights above/below
+GADGET_ROI_MAX_AREA = 0.8                   # larger ROIs just run on the whole frame
+# A gadget is reported once seen in K of the last N frames of a session
+GADGET_CONFIRM_K = int(os.getenv("VISION_GADGET_CONFIRM_K", 2))
+GADGET_CONFIRM_N = int(os.getenv("VISION_GADGET_CONFIRM_N", 3))
+GADGET_TRACK_TTL = 120.0                    # forget sessions idle this long
+# Windows live in a SQLite file so every worker process sees a session's frames
+GADGET_TRACK_DB_PATH = Path(os.getenv("GADGET_TRACK_DB_PATH", str(BASE_DIR / "gadget_tracker.sqlite3")))
+GADGET_TRACK_PRUNE_INTERVAL = 60.0
+
+FRAME_CACHE_SIZE = int(os.getenv("VISION_FRAME_CACHE_SIZE", 32))
+FRAME_CACHE_TTL = 10.0
+
+STAGES = ('faces', 'attention', 'phone_regions', 'devices', 'identity', 'emotion')
+STAGE_DEPS = {'attention': ('faces',), 'devices': ('faces',), 'identity': ('faces',), 'emotion': ('faces',)}
+CACHED_STAGES = ('faces', 'attention', 'phone_regions', 'devices')
+
+PROFILES = {
+    'presence': ('faces',),                                 # /detect-faces
+    'attention': ('attention',),                            # Flask /analyze-face
+    'study': ('attention', 'phone_regions'),                # courses analyze-face
+    'proctoring': ('faces', 'identity', 'devices'),         # upload_frame
+    'mood': ('emotion',),
+}
+
+_frame_cache = OrderedDict()
+_frame_cache_lock = threading.Lock()
+
+
+class VisionError(ValueError):
+    """The frame could not be decoded or a stage name is unknown."""
+
+
+class VisionUnavailable(RuntimeError):
+    """A stage's detector or model cannot run on this server (endpoints answer 503)."""
+
+
+# ------------------------------
+# Frames
+# ------------------------------
+class Frame:
+    """A decoded BGR frame plus intermediates shared by all stages."""
+
+    def __init__(self, image):
+        self.image = image
+        self.results = {}
+        self.lock = threading.RLock()
+        self._gray = None
+
+    @property
+    def height(self):
+        return self.image.shape[0]
+
+    @property
+    def width(self):
+        return self.image.shape[1]
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def faces(self):
+        return run_stage(self, 'faces')['boxes']
+
+    def crop(self, box):
+        x, y, w, h = box
+        return self.image[y:y + h, x:x + w]
+
+
+def load_frame(source):
+    """
+    Frame from a base64 string (data URI allowed), a BGR array or a Frame.
+    Base64 input is memoised briefly so repeated uploads of one frame share work.
+    """
+    if isinstance(source, Frame):
+        return source
+    if isinstance(source, np.ndarray):
+        return Frame(source)
+    if not isinstance(source, str) or not source:
+        raise VisionError("No image data")
+
+    key = hashlib.sha1(source.encode('utf-8', 'ignore')).digest()
+    now = time.time()
+    with _frame_cache_lock:
+        cached = _frame_cache.get(key)
+        if cached and now - cached[0] < FRAME_CACHE_TTL:
+            _frame_cache.move_to_end(key)
+            return cached[1]
+
+    image = frame_hints.decode_b64(source)
+    if image is None:
+        raise VisionError("Invalid image data")
+    frame = Frame(image)
+    with _frame_cache_lock:
+        _frame_cache[key] = (now, frame)
+        while len(_frame_cache) > FRAME_CACHE_SIZE:
+            _frame_cache.popitem(last=False)
+    return frame
+
+
+# ------------------------------
+# Stages
+# ------------------------------
+def _stage_faces(frame, **_):
+    try:
+        detector = face_detectors.default_detector()
+    except face_detectors.DetectorUnavailable as e:
+        raise VisionUnavailable(str(e))
+    boxes = detector.detect(frame.image, frame.gray)
+    return {
+        'boxes': boxes,
+        'count': len(boxes),
+        'largest': max(boxes, key=lambda f: f[2] * f[3]) if boxes else None,
+    }
+
+
+def _stage_attention(frame, **_):
+    faces = frame.results['faces']
+    face_present = faces['count'] > 0
+    center_offset = 1.0
+    if face_present:
+        x, y, fw, fh = faces['largest']
+        dx = abs(x + fw / 2.0 - frame.width / 2.0) / (frame.width / 2.0)
+        dy = abs(y + fh / 2.0 - frame.height / 2.0) / (frame.height / 2.0)
+        center_offset = min(1.0, float(np.hypot(dx, dy)))
+
+    blur_var = float(cv2.Laplacian(frame.gray, cv2.CV_64F).var())
+    brightness = float(frame.gray.mean())
+    attention_score = max(0.0, 1.0 - center_offset) if face_present else 0.0
+    distracted = (not face_present) or center_offset > DISTRACTED_CENTER_OFFSET
+    bored = face_present and (not distracted) and blur_var < BORED_BLUR_VAR
+
+    return {
+        "face_present": bool(face_present),
+        "multiple_faces": faces['count'] > 1,
+        "attention_score": round(attention_score, 3),
+        "distracted": bool(distracted),
+        "bored": bool(bored),
+        "metrics": {
+            "faces_count": faces['count'],
+            "center_offset": round(center_offset, 3),
+            "blur_var": round(blur_var, 3),
+            "brightness": round(brightness, 3)
+        }
+    }
+
+
+def _stage_phone_regions(frame, **_):
+    """
+    Naive phone detector based on rectangular, high-contrast regions.
+    It is intentionally lightweight (no ML weights) and biased toward
+    catching obvious handheld rectangles near the camera.
+    """
+    edges = cv2.Canny(frame.gray, 50, 150)
+    edges = cv2.dilate(edges, None, iterations=1)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    phone_boxes = []
+    for cnt in contours:
+        x, y, w, h = cv2.boundingRect(cnt)
+        area = w * h
+        # Rough size and aspect ratio filters for a phone shape
+        if area < 1200 or area > 45000:
+            continue
+        aspect = w / float(h)
+        if aspect < 0.35 or aspect > 0.85:
+            continue
+
+        # Prefer near-rectangular contours
+        perimeter = cv2.arcLength(cnt, True)
+        approx = cv2.approxPolyDP(cnt, 0.04 * perimeter, True)
+        if len(approx) < 4 or len(approx) > 8:
+            continue
+
+        fill_ratio = cv2.contourArea(cnt) / float(area)
+        if fill_ratio < 0.45:
+            continue
+
+        phone_boxes.append((x, y, w, h))
+
+    return {
+        "phone_detected": len(phone_boxes) > 0,
+        "phone_candidates": len(phone_boxes),
+        "phone_boxes": phone_boxes,
+    }
+
+
+def get_yolo():
+    """The gadget detector on the configured inference backend (see inference)."""
+    return inference.load('yolo')
+
+
+def gadget_roi(frame):
+    """
+    (x, y, w, h) around the detected faces where hands and desk items show up,
+    or None to search the whole frame (no face, or the region is most of it).
+    """
+    boxes = frame.results['faces']['boxes']
+    if not boxes:
+        return None
+    left, up, right, down = GADGET_ROI_MARGIN
+    x0 = max(0, int(min(x - left * w for x, y, w, h in boxes)))
+    y0 = max(0, int(min(y - up * h for x, y, w, h in boxes)))
+    x1 = min(frame.width, int(max(x + w + right * w for x, y, w, h in boxes)))
+    y1 = min(frame.height, int(max(y + h + down * h for x, y, w, h in boxes)))
+    if (x1 - x0) * (y1 - y0) > GADGET_ROI_MAX_AREA * frame.width * frame.height:
+        return None
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _stage_devices(frame, **_):
+    roi = gadget_roi(frame) if GADGET_MODE == 'roi' else None
+    if roi is None:
+        image, (ox, oy), imgsz = frame.image, (0, 0), frame_hints.YOLO_IMGSZ
+    else:
+        image, (ox, oy), imgsz = frame.crop(roi), roi[:2], GADGET_ROI_IMGSZ
+    classes = GADGET_CLASSES if GADGET_MODE == 'roi' else None
+
+    gadgets = []
+    for label, confidence, box in get_yolo().detect(image, imgsz, YOLO_CONFIDENCE, classes=classes):
+        if label in GADGET_NAMES:
+            gadgets.append({
+                'label': label,
+                'confidence': round(confidence, 3),
+                'box': [box[0] + ox, box[1] + oy, box[2] + ox, box[3] + oy],
+            })
+    return {'gadgets': gadgets, 'roi': list(roi) if roi else None}
+
+
+class GadgetTracker:
+    """
+    k-of-n confirmation of gadget labels per stream (e.g. a proctoring session).
+    The last n label sets of each stream are kept in a SQLite file (WAL), so
+    frames of one session handled by different worker processes share a window.
+    """
+
+    def __init__(self, k=GADGET_CONFIRM_K, n=GADGET_CONFIRM_N, ttl=GADGET_TRACK_TTL, path=None):
+        self.k = max(1, min(k, n))
+        self.n = max(1, n)
+        self.ttl = ttl
+        self.path = Path(path or GADGET_TRACK_DB_PATH)
+        self._schema_ready = False
+        self._last_prune = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS gadget_windows "
+                "(stream TEXT PRIMARY KEY, last_seen REAL NOT NULL, window TEXT NOT NULL)"
+            )
+            self._schema_ready = True
+        return conn
+
+    def update(self, key, labels):
+        """Record this frame's labels for `key`; returns those seen in >= k of the last n frames."""
+        now = time.time()
+        labels = sorted(set(labels))
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT last_seen, window FROM gadget_windows WHERE stream = ?", (str(key),)).fetchone()
+            window = json.loads(row[1]) if row and now - row[0] < self.ttl else []
+            window = (window + [labels])[-self.n:]
+            conn.execute(
+                "INSERT OR REPLACE INTO gadget_windows (stream, last_seen, window) VALUES (?, ?, ?)",
+                (str(key), now, json.dumps(window)),
+            )
+            if now - self._last_prune >= GADGET_TRACK_PRUNE_INTERVAL:
+                self._last_prune = now
+                conn.execute("DELETE FROM gadget_windows WHERE last_seen < ?", (now - self.ttl,))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return {label for label in labels if sum(label in seen for seen in window) >= self.k}
+
+
+gadget_tracker = GadgetTracker()
+
+
+def confirm_gadgets(key, gadgets):
+    """The gadgets of this frame that are confirmed across the stream `key` (unsmoothed if key is None)."""
+    if key is None:
+        return list(gadgets)
+    try:
+        confirmed = gadget_tracker.update(key, [g['label'] for g in gadgets])
+    except sqlite3.Error as e:
+        # Report unsmoothed rather than hide a device because the window store failed
+        print(f"Gadget window store error: {e}")
+        return list(gadgets)
+    return [g for g in gadgets if g['label'] in confirmed]
+
+
+def cosine_similarity(a, b):
+    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+
+
+def get_embeddings(face_imgs):
+    """L2-normalised Facenet embeddings of BGR face crops in one forward pass; None where a crop fails."""
+    inputs, ok = [], []
+    for i, face_img in enumerate(face_imgs):
+        if face_img is None or face_img.size == 0:
+            continue
+        inputs.append(inference.facenet_input(face_img))
+        ok.append(i)
+    embeddings = [None] * len(face_imgs)
+    if not inputs:
+        return embeddings
+    model = inference.load('facenet')
+    try:
+        rows = model.predict(np.stack(inputs))
+    except Exception as e:
+        print(f"Face embedding failed: {e}")
+        return embeddings
+    for i, row in zip(ok, rows):
+        emb = np.asarray(row, dtype=np.float32)
+        norm = np.linalg.norm(emb)
+        if norm > 0:
+            emb /= norm
+        embeddings[i] = emb
+    return embeddings
+
+
+def get_embedding(face_img):
+    """L2-normalised Facenet embedding of a BGR face crop, or None."""
+    return get_embeddings([face_img])[0]
+
+
+def _stage_identity(frame, hint=None, candidate_embedding=None, **_):
+    boxes = frame.results['faces']['boxes']
+    embeddings = get_embeddings([frame_hints.crop_for_face(frame.image, box, hint) for box in boxes])
+    matches = []
+    for box, emb in zip(boxes, embeddings):
+        similarity = None
+        if emb is not None and candidate_embedding is not None:
+            similarity = float(cosine_similarity(emb, candidate_embedding))
+        matches.append({
+            'box': list(box),
+            'embedding_ok': emb is not None,
+            'similarity': similarity,
+            'match': None if similarity is None else similarity >= SIM_THRESHOLD,
+        })
+    return {'faces': matches}
+
+
+def _stage_emotion(frame, hint=None, actions=None, **_):
+    from . import mood
+    if hint is not None and hint.crop is not None:
+        return mood.analyze_frame(None, actions, hint)
+    largest = frame.results['faces']['largest']
+    crop = frame.crop(largest) if largest is not None else frame.image
+    result = mood.analyze_frame(None, actions, frame_hints.FrameHint(crop=crop))
+    if result.get('success'):
+        result.update(
+            face_detected=largest is not None,
+            face_box=largest,
+            face_source='detected' if largest is not None else 'full_frame',
+        )
+    return result
+
+
+_STAGE_FUNCS = {
+    'faces': _stage_faces,
+    'attention': _stage_attention,
+    'phone_regions': _stage_phone_regions,
+    'devices': _stage_devices,
+    'identity': _stage_identity,
+    'emotion': _stage_emotion,
+}
+
+
+# ------------------------------
+# Pipeline
+# ------------------------------
+def resolve_stages(stages):
+    """Requested stages plus their dependencies, in pipeline order."""
+    if isinstance(stages, str):
+        stages = PROFILES.get(stages, (stages,))
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise VisionError(f"Unknown stages: {', '.join(unknown)}")
+    wanted = set(stages)
+    for stage in stages:
+        wanted.update(STAGE_DEPS.get(stage, ()))
+    return [s for s in STAGES if s in wanted]
+
+
+def run_stage(frame, stage, **options):
+    if stage in CACHED_STAGES:
+        with frame.lock:
+            if stage not in frame.results:
+                frame.results[stage] = _STAGE_FUNCS[stage](frame, **options)
+            return frame.results[stage]
+    return _STAGE_FUNCS[stage](frame, **options)
+
+
+def analyze(source, stages, hint=None, candidate_embedding=None, actions=None):
+    """
+    Run `stages` (names or a PROFILES key) on a frame (base64, BGR array or Frame).
+    Returns (frame, {stage: result}) with every stage that ran, dependencies included.
+    """
+    frame = load_frame(source)
+    options = {'hint': hint, 'candidate_embedding': candidate_embedding, 'actions': actions}
+    results = {}
+    for stage in resolve_stages(stages):
+        results[stage] = run_stage(frame, stage, **options)
+    return frame, results
+
+
+def attention_report(frame, results):
+    """The attention response used by the StudyMate / courses analyze-face endpoints."""
+    report = dict(results['attention'])
+    report['metrics'] = dict(report['metrics'])
+    if 'phone_regions' in results:
+        phones = results['phone_regions']
+        report['phone_detected'] = bool(phones['phone_detected'])
+        report['phone_candidates'] = int(phones['phone_candidates'])
+        report['metrics']['phone_boxes'] = phones['phone_boxes']
+        report['metrics']['frame_size'] = [int(frame.width), int(frame.height)]
+    return report
@@ -1,8 +1,6 @@
 import os
 import json
 import re
-import base64
-import subprocess
 import urllib.parse
 import datetime
 from io import BytesIO
@@ -14,9 +12,6 @@ from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 
-from youtube_transcript_api import YouTubeTranscriptApi
-import cv2
-import numpy as np
 import requests
 
 try:
@@ -24,6 +19,15 @@ try:
 except ImportError:
     Document = None
 
+from monitor.transcripts import load_transcript, get_transcript_text
+from monitor.retrieval import retrieve_context
+from monitor.singleflight import single_flight, RESULT_SHARE_SECONDS
+from monitor.video_metadata import get_video_duration
+from monitor import jobs
+from monitor import interpreter_pool
+from monitor import engagement
+from monitor import vision
+
 # --- Configuration ---
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
 MISTRAL_MODEL = os.getenv("MISTRAL_MODEL", "mistral-small-latest")
@@ -33,8 +37,6 @@ MISTRAL_API_URL = os.getenv("MISTRAL_API_URL", "https://api.mistral.ai/v1/chat/c
 # Assuming settings.BASE_DIR is d:\sparkless 1\video_proctoring_project\proctoring
 BASE_DIR = Path(__file__).resolve().parent.parent
 SPARKLESS_ROOT = BASE_DIR.parent.parent  # Go up to d:\sparkless 1
-TRANSCRIPTS_DIR = BASE_DIR / "transcripts"
-TRANSCRIPTS_DIR.mkdir(exist_ok=True)
 
 # Frontend path for static files (if needed for direct serving, though Django static is better)
 FRONTEND_PATH = SPARKLESS_ROOT / "frontend"
@@ -78,102 +80,6 @@ def extract_youtube_id(url):
         return parsed.path[1:]
     return None
 
-def get_video_duration(video_id):
-    try:
-        result = subprocess.run([
-            "yt-dlp",
-            "--print", "duration",
-            f"https://www.youtube.com/watch?v={video_id}"
-        ], capture_output=True, text=True, check=True)
-        return int(float(result.stdout.strip()))
-    except Exception as e:
-        print(f"Could not get video duration: {e}")
-        return 3600
-
-def get_transcript_with_timestamps(video_id):
-    transcript_json_path = TRANSCRIPTS_DIR / f"{video_id}_timestamps.json"
-    if transcript_json_path.exists():
-        with open(transcript_json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    try:
-        transcript_list = None
-
-        if hasattr(YouTubeTranscriptApi, "get_transcript"):
-            try:
-                transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
-            except Exception as inner:
-                print(f"YouTubeTranscriptApi.get_transcript failed: {inner}")
-
-        if transcript_list is None and hasattr(YouTubeTranscriptApi, "list_transcripts"):
-            try:
-                transcript_list = YouTubeTranscriptApi.list_transcripts(video_id).find_transcript(['en']).fetch()
-            except Exception as inner:
-                print(f"YouTubeTranscriptApi.list_transcripts failed: {inner}")
-
-        # Fallback to yt-dlp if YouTubeTranscriptApi is unavailable
-        if transcript_list is None:
-            print(f"Falling back to yt-dlp for {video_id}...")
-            try:
-                subprocess.run([
-                    "yt-dlp", "--write-auto-subs", "--sub-lang", "en", "--skip-download",
-                    "-o", str(TRANSCRIPTS_DIR / f"{video_id}"),
-                    f"https://www.youtube.com/watch?v={video_id}"
-                ], check=True, capture_output=True, text=True, timeout=60)
-                
-                vtt_files = list(TRANSCRIPTS_DIR.glob(f"{video_id}*.vtt"))
-                if vtt_files:
-                    vtt_file = vtt_files[0]
-                    lines = vtt_file.read_text(encoding="utf-8").splitlines()
-                    transcript_list = [
-                        {"text": line, "start": 0, "duration": 0}
-                        for line in lines
-                        if line.strip() and "-->" not in line and not line.strip().isdigit() and "WEBVTT" not in line and not line.startswith("NOTE")
-                    ]
-                    vtt_file.unlink()
-            except Exception as fallback_err:
-                print(f"yt-dlp fallback failed: {fallback_err}")
-
-        if transcript_list is None:
-            print(f"No transcript available for {video_id}; using mock")
-            return [{"text": f"Content for video {video_id}", "start": 0, "duration": 0}]
-
-        with open(transcript_json_path, 'w', encoding='utf-8') as f:
-            json.dump(transcript_list, f)
-        return transcript_list
-    except Exception as e:
-        print(f"get_transcript_with_timestamps failed: {e}")
-        return [{"text": f"Content for video {video_id}", "start": 0, "duration": 0}]
-
-def get_transcript_text(video_id):
-    transcript_path = TRANSCRIPTS_DIR / f"{video_id}.txt"
-    if transcript_path.exists():
-        return transcript_path.read_text(encoding="utf-8")
-    
-    # Fallback using yt-dlp (simplified for brevity, assuming yt-dlp is installed)
-    try:
-        subprocess.run([
-            "yt-dlp", "--write-auto-subs", "--sub-lang", "en", "--skip-download",
-            "-o", str(TRANSCRIPTS_DIR / f"{video_id}"),
-            f"https://www.youtube.com/watch?v={video_id}"
-        ], check=True, capture_output=True, text=True)
-        
-        vtt_files = list(TRANSCRIPTS_DIR.glob(f"{video_id}*.vtt"))
-        if vtt_files:
-            vtt_file = vtt_files[0]
-            lines = vtt_file.read_text(encoding="utf-8").splitlines()
-            full_text = " ".join(
-                re.sub(r'<[^>]+>', '', line) 
-                for line in lines 
-                if line.strip() and "-->" not in line and not line.strip().isdigit() 
-                and "WEBVTT" not in line and not line.startswith("NOTE")
-            )
-            transcript_path.write_text(full_text, encoding="utf-8")
-            vtt_file.unlink()
-            return full_text
-    except Exception as e:
-        print(f"yt-dlp failed: {e}")
-    raise Exception("Could not fetch transcript")
-
 def generate_course_overview(full_transcript_text, course_title):
     try:
         context_text = full_transcript_text[:5000]
@@ -230,7 +136,7 @@ def split_transcript(transcript_data, daily_minutes, duration, title, has_timest
     num_modules = max(1, int(duration / video_seconds))
     
     if has_timestamps:
-        full_text = " ".join(s['text'] for s in transcript_data)
+        full_text = transcript_data.text
         seconds_per_module = duration / num_modules
     else:
         words = transcript_data.split()
@@ -247,8 +153,7 @@ def split_transcript(transcript_data, daily_minutes, duration, title, has_timest
         module_num = i + 1
         
         if has_timestamps:
-            segs = [s for s in transcript_data if start_time <= s['start'] < end_time]
-            module_text = " ".join(s['text'] for s in segs)
+            module_text = transcript_data.text_between(start_time, end_time)
         else:
             start_word = i * words_per_module
             end_word = min((i + 1) * words_per_module, len(words))
@@ -334,6 +239,44 @@ def serve_frontend_static(request, filename):
             return HttpResponse(f.read(), content_type=content_type)
     return HttpResponse(status=404)
 
+def build_plan(video_id, course_title, daily_hours, job=None):
+    """Run the plan pipeline (duration, transcript, AI summaries) for one video."""
+    if job:
+        job.progress(0.05, "Looking up video")
+    duration = get_video_duration(video_id)
+    if job:
+        job.progress(0.15, "Fetching transcript")
+    transcript = load_transcript(video_id)
+
+    if job:
+        job.progress(0.3, "Generating modules")
+    if transcript:
+        plan, overview = split_transcript(transcript, daily_hours * 60, duration, course_title, True)
+    else:
+        text = get_transcript_text(video_id)
+        plan, overview = split_transcript(text, daily_hours * 60, duration, course_title, False)
+
+    return {
+        "courseTitle": course_title,
+        "courseDescription": overview,
+        "videoID": video_id,
+        "dailyPlan": plan,
+        "streak": 0,
+        "progress": 0
+    }
+
+def generate_plan_job(payload, job):
+    """Background job handler for api/generate-plan/ (see monitor.jobs)."""
+    video_id = payload["video_id"]
+    course_title = payload["course_title"]
+    daily_hours = payload["daily_hours"]
+    # Students opening the same course link at once share one pipeline run
+    return single_flight(
+        f"generate-plan:{video_id}:{daily_hours}:{course_title}",
+        lambda: build_plan(video_id, course_title, daily_hours, job),
+        share_seconds=RESULT_SHARE_SECONDS,
+    )
+
 @csrf_exempt
 def generate_plan(request):
     if request.method == 'POST':
@@ -346,24 +289,19 @@ def generate_plan(request):
             video_id = extract_youtube_id(course_link)
             if not video_id:
                 return JsonResponse({"error": "Invalid YouTube link"}, status=400)
-            
-            duration = get_video_duration(video_id)
-            transcript = get_transcript_with_timestamps(video_id)
-            
-            if transcript:
-                plan, overview = split_transcript(transcript, daily_hours * 60, duration, course_title, True)
-            else:
-                text = get_transcript_text(video_id)
-                plan, overview = split_transcript(text, daily_hours * 60, duration, course_title, False)
-            
+
+            # The pipeline takes minutes; run it on a job worker and let the client poll
+            job_id = jobs.submit(
+                "studymate.generate_plan",
+                {"video_id": video_id, "course_title": course_title, "daily_hours": daily_hours},
+                dedupe_key=f"generate-plan:{video_id}:{daily_hours}:{course_title}",
+            )
             return JsonResponse({
-                "courseTitle": course_title,
-                "courseDescription": overview,
-                "videoID": video_id,
-                "dailyPlan": plan,
-                "streak": 0,
-                "progress": 0
-            })
+                "success": True,
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}/"
+            }, status=202)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"status": "ok"})
@@ -392,18 +330,15 @@ def analyze_face(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            img_b64 = data.get("frame", "").split(',', 1)[-1]
+            img_b64 = data.get("frame", "")
             if not img_b64: return JsonResponse({"error": "No frame"}, status=400)
             
-            np_arr = np.frombuffer(base64.b64decode(img_b64), np.uint8)
-            img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-            
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            faces = face_cascade.detectMultiScale(gray, 1.2, 5)
+            # Shared decode + face detection (monitor/vision.py)
+            faces = vision.analyze(img_b64, vision.PROFILES['presence'])[1]['faces']['boxes']
             
             face_present = len(faces) > 0
             attention_score = 1.0 if face_present else 0.0
+            engagement.record_for_request(data, 'attention', [(None, attention_score * 100, None)], user=request.user)
             
             return JsonResponse({
                 "face_present": face_present,
@@ -411,6 +346,8 @@ def analyze_face(request):
                 "distracted": not face_present,
                 "metrics": {"faces_count": len(faces)}
             })
+        except vision.VisionUnavailable as e:
+            return JsonResponse({"error": f"Face detection is unavailable on this server: {e}"}, status=503)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"status": "ok"})
@@ -540,68 +477,35 @@ Keep the summary clear and suitable for study notes."""
 
 @csrf_exempt
 def execute_code(request):
-    """Execute JavaScript code safely and return output."""
+    """Execute JavaScript or Python code on a warm sandboxed runner and return output."""
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             code = data.get('code', '')
+            language = data.get('language') or 'javascript'
             
             if not code:
                 return JsonResponse({"error": "No code provided"})
             
-            # For security, we would normally use a sandbox or Node.js subprocess
-            # For now, we'll use a subprocess to execute JavaScript safely
-            import subprocess
-            import tempfile
-            
-            # Create a temporary JavaScript file
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False) as f:
-                # Wrap code to capture console output
-                wrapped_code = f"""
-const originalLog = console.log;
-let output = '';
-console.log = function(...args) {{
-    output += args.join(' ') + '\\n';
-}};
-
-try {{
-{code}
-}} catch(e) {{
-    output += 'Error: ' + e.message;
-}}
-
-console.log(output);
-"""
-                f.write(wrapped_code)
-                temp_file = f.name
-            
             try:
-                # Execute using Node.js if available, otherwise use Python
-                result = subprocess.run(
-                    ['node', temp_file],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                
-                output = result.stdout.strip() or result.stderr.strip() or "(No output)"
-                
-                if result.returncode != 0 and result.stderr:
-                    return JsonResponse({"error": result.stderr})
-                
-                return JsonResponse({"output": output})
-            
+                result = interpreter_pool.run(language, code, stdin=data.get('stdin', ''))
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
             except FileNotFoundError:
-                # Node.js not available, try Python eval (less safe but works)
+                # Runtime (node / python) not available on this server
                 return JsonResponse({"error": "Code execution service not available. Please use your browser's developer console."})
             
-            finally:
-                # Clean up temp file
-                import os
-                try:
-                    os.unlink(temp_file)
-                except:
-                    pass
+            output = result.get('output', '').strip()
+            status = result.get('status')
+            
+            if status == 'timeout':
+                return JsonResponse({"error": f"Execution timed out ({interpreter_pool.WALL_TIMEOUT}s limit)"})
+            if status in ('busy', 'unavailable'):
+                return JsonResponse({"error": output}, status=503)
+            if status != 'ok':
+                return JsonResponse({"error": output or "Execution failed"})
+            
+            return JsonResponse({"output": output or "(No output)"})
         
         except Exception as e:
             print(f"Code execution error: {e}")
@@ -645,6 +549,9 @@ def ai_tutor(request):
             course_title = data.get('course_title', 'the course')
             course_description = data.get('course_description', '')
             module_title = data.get('module_title', '')
+            video_id = data.get('video_id') or extract_youtube_id(data.get('video_url', ''))
+            current_time = data.get('current_time')
+            current_time = float(current_time) if current_time not in (None, '') else None
             
             if not question:
                 return JsonResponse({"answer": "Please ask a question and I'll help you understand better! 📚"})
@@ -655,6 +562,10 @@ def ai_tutor(request):
                 context_parts.append(f"Description: {course_description}")
             if module_title:
                 context_parts.append(f"Current Module: {module_title}")
+            if video_id:
+                transcript_context = retrieve_context(video_id, question, current_time=current_time, k=4)
+                if transcript_context:
+                    context_parts.append(f"Relevant lecture transcript excerpts:\n{transcript_context}")
             
             context = "\n".join(context_parts)
             